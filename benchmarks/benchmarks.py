@@ -0,0 +1,144 @@
+"""benchmarks.py: asv benchmarks of loading, summarising and writing hyb files."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import os
+import time
+
+from hybtools import commands, hyb_io, summarise, synthetic, writers
+
+
+# Sizes of the synthetic hyb files, in rows. 100000000 rows can be added, but the file takes about 15 GB.
+SIZES = [int(size) for size in os.environ.get('HYBTOOLS_BENCHMARK_SIZES', '1000000,10000000').split(',')]
+N_TRANSCRIPTS = int(os.environ.get('HYBTOOLS_BENCHMARK_TRANSCRIPTS', '10000'))
+SEED = 0
+
+
+def setup_hyb_files():
+    """Write the synthetic hyb files used by the benchmarks, and return their paths by size."""
+
+    hyb_filepaths = {}
+
+    for size in SIZES:
+        hyb_filepath = os.path.abspath('synthetic.%d.%d.%d.hyb' % (size, N_TRANSCRIPTS, SEED))
+        if not os.path.exists(hyb_filepath):
+            synthetic.write_hyb_file(hyb_filepath, size, jobs = os.cpu_count() or 1, n_transcripts = N_TRANSCRIPTS,
+                                     seed = SEED)
+        hyb_filepaths[size] = hyb_filepath
+
+    return(hyb_filepaths)
+
+
+class _HybFileBenchmark(object):
+    """Base class of benchmarks reading a synthetic hyb file, with one throughput track per benchmark."""
+
+    timeout = 3600
+
+    def setup_cache(self):
+        return(setup_hyb_files())
+
+    def track_throughput(self, hyb_filepaths, size, *params):
+        start = time.time()
+        self.run(hyb_filepaths[size], *params)
+        return(size / (time.time() - start))
+
+    track_throughput.unit = 'rows/s'
+
+
+class LoadHybFile(_HybFileBenchmark):
+    params = (SIZES, [False, True], hyb_io.ENGINES)
+    param_names = ['rows', 'compact', 'engine']
+
+    def setup(self, hyb_filepaths, size, compact, engine):
+        if engine == 'pyarrow':
+            try:
+                import pyarrow.csv  # noqa: F401
+            except ImportError:
+                raise NotImplementedError('pyarrow is not installed')
+
+    def run(self, hyb_filepath, compact, engine):
+        hyb_io.load_hyb_dataframe(hyb_filepath, compact = compact, engine = engine)
+
+    def time_load(self, hyb_filepaths, size, compact, engine):
+        self.run(hyb_filepaths[size], compact, engine)
+
+    def peakmem_load(self, hyb_filepaths, size, compact, engine):
+        self.run(hyb_filepaths[size], compact, engine)
+
+
+class SummariseHybFile(_HybFileBenchmark):
+    params = (SIZES, [None, 1000000])
+    param_names = ['rows', 'chunksize']
+
+    def run(self, hyb_filepath, chunksize):
+        commands.summarise(hyb_filepath, chunksize = chunksize)
+
+    def time_summarise(self, hyb_filepaths, size, chunksize):
+        self.run(hyb_filepaths[size], chunksize)
+
+    def peakmem_summarise(self, hyb_filepaths, size, chunksize):
+        self.run(hyb_filepaths[size], chunksize)
+
+
+class CreateSummaryDataframe(object):
+    """Summarising a hyb dataframe that is already loaded, without the cost of parsing."""
+
+    params = ([1000000], [False, True])
+    param_names = ['rows', 'compact']
+
+    def setup(self, size, compact):
+        self.hyb_df = synthetic.generate_hyb_dataframe(size, n_transcripts = N_TRANSCRIPTS, seed = SEED)
+        if compact:
+            self.hyb_df = self.hyb_df.astype({column: dtype for column, dtype in hyb_io.hyb_df_dtypes.items()
+                                              if dtype == 'category'})
+
+    def time_create_summary_dataframe(self, size, compact):
+        summarise.create_summary_dataframe(self.hyb_df)
+
+
+class WriteSummary(object):
+    """Writing a summary with many distinct hybrids in each output format."""
+
+    params = writers.OUTPUT_FORMATS
+    param_names = ['output_format']
+    timeout = 600
+
+    def setup(self, output_format):
+        if output_format in ['parquet', 'arrow']:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise NotImplementedError('pyarrow is not installed')
+        hyb_df = synthetic.generate_hyb_dataframe(1000000, n_transcripts = 100000, seed = SEED, skew = 0.5)
+        self.summary_hyb_df = summarise.create_summary_dataframe(hyb_df)
+        self.output = os.path.abspath('summary.%s' % output_format)
+
+    def teardown(self, output_format):
+        if os.path.exists(self.output):
+            os.remove(self.output)
+
+    def time_write(self, output_format):
+        writers.write_dataframe(self.summary_hyb_df, output = self.output, output_format = output_format)
+
+    def peakmem_write(self, output_format):
+        writers.write_dataframe(self.summary_hyb_df, output = self.output, output_format = output_format)
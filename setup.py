@@ -62,7 +62,7 @@ setup(
         'click',
         'pandas'
     ],
-    extras_require={'test': ['pytest', 'tox']},
+    extras_require={'test': ['pytest', 'tox'], 'zstd': ['zstandard'], 'arrow': ['pyarrow']},
     entry_points={
         'console_scripts': [
             'hybtools = hybtools.cli:main',
@@ -22,33 +22,469 @@
 
 
 import click
+import contextlib
+import re
 import sys
 
 from hybtools import __about__
-from hybtools import commands
+from hybtools import profiling
+from hybtools import writers
+
+# hybtools.commands and hybtools.hyb_cache import numpy and pandas, which take far longer to import than the rest
+# of the program, so they are only imported once a command runs. This keeps --help, --version and shell completion
+# fast.
 
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 FULL_FILEPATH = click.Path(exists=True, dir_okay=False, allow_dash=True, readable=True, resolve_path=True)
+OUTPUT_FILEPATH = click.Path(dir_okay=False, allow_dash=True, writable=True, resolve_path=True)
+
+
+def output_options(f):
+    """Decorator adding the options for the output file and format to a command."""
+    f = click.option('--output-format', type=click.Choice(writers.OUTPUT_FORMATS), default='tsv', show_default=True,
+                     help='Format of the output. parquet and arrow require pyarrow.')(f)
+    f = click.option('--output', '-o', type=OUTPUT_FILEPATH, default='-', help='Output file. Defaults to stdout.')(f)
+    return f
+
+
+def dedup_options(f):
+    """Decorator adding the options for deduplicating reads to a command."""
+    f = click.option('--spill-dir', type=click.Path(exists=True, file_okay=False, writable=True),
+                     help='Directory for the spilled read hashes. Defaults to the system temporary directory.')(f)
+    f = click.option('--dedup-memory', type=click.IntRange(min=1), default=256, show_default=True,
+                     help='MiB of read hashes to hold in memory before spilling them to disk.')(f)
+    f = click.option('--hash-bits', type=click.Choice(['64', '128']), default='64', show_default=True,
+                     help='Width of the read hashes. 128 bits makes hash collisions negligible at twice the memory.')(f)
+    f = click.option('--dedup-key', type=click.Choice(['sequence', 'coordinates']), default='sequence',
+                     show_default=True,
+                     help='Treat reads as duplicates if they have the same read sequence, or the same read sequence '
+                          'and bit coordinates.')(f)
+    return f
 
 
-def write_tsv(df):
-    """Helper function to write a dataframe to stdout as a tsv file."""
-    tsv = df.to_csv(sep='\t', header=False, index=False)
-    click.echo(tsv)
+def get_dedup_options(dedup_key, hash_bits, dedup_memory, spill_dir):
+    """Get the arguments of dedup.ReadDeduplicator from the values of the dedup_options."""
+    hash_bits = int(hash_bits)
+    return {'key': dedup_key, 'hash_bits': hash_bits, 'max_hashes': dedup_memory * 2 ** 20 // (hash_bits // 8),
+            'spill_dir': spill_dir}
 
 
 @click.group(context_settings=CONTEXT_SETTINGS)
 @click.version_option(version=__about__.__version__)
-def main():
+@click.option('--cache/--no-cache', default=False, envvar='HYBTOOLS_CACHE', show_default=True,
+              help='Cache parsed hyb files on disk, and reuse the cache while the hyb files are unchanged.')
+@click.option('--rebuild-cache', is_flag=True, help='Rebuild the cache of any hyb file that is read.')
+@click.option('--cache-dir', type=click.Path(file_okay=False, writable=True, resolve_path=True),
+              envvar='HYBTOOLS_CACHE_DIR', help='Directory for cache files. Defaults to next to each hyb file.')
+@click.option('--profile', is_flag=True,
+              help='Write the wall time, CPU time, rows per second and peak memory of each stage to stderr.')
+@click.option('--profile-json', type=OUTPUT_FILEPATH, envvar='HYBTOOLS_PROFILE_JSON',
+              help='Write the --profile measurements as JSON to this file.')
+@click.option('--daemon/--no-daemon', default=True, envvar='HYBTOOLS_DAEMON', show_default=True,
+              help='Send commands to the hybtools serve daemon when one is running.')
+@click.option('--socket', 'socket_path', type=click.Path(dir_okay=False, resolve_path=True), envvar='HYBTOOLS_SOCKET',
+              help='Unix socket of the hybtools serve daemon. Defaults to one in $XDG_RUNTIME_DIR, or in a private '
+                   'directory in the temporary directory.')
+@click.pass_context
+def main(ctx, cache, rebuild_cache, cache_dir, profile, profile_json, daemon, socket_path):
     """A suite of command line tools for working with hyb and viennad files."""
-    pass
+    if socket_path is None:
+        from hybtools.client import get_socket_path
+        socket_path = get_socket_path()
+    ctx.obj = {'cache': None, 'profiler': None, 'daemon': daemon and not rebuild_cache, 'socket': socket_path}
+    if profile or profile_json:
+        profiler = ctx.obj['profiler'] = profiling.Profiler()
+        ctx.call_on_close(profiler.write_summary if profile_json is None else
+                          lambda: profiler.write_json(profile_json))
+    if cache or rebuild_cache:
+        from hybtools.hyb_cache import HybCache
+        ctx.obj['cache'] = HybCache(cache_dir=cache_dir, rebuild=rebuild_cache)
+
+
+@main.command()
+@click.argument('hyb_filepaths', metavar='[HYB_FILEPATH]...', type=FULL_FILEPATH, nargs=-1)
+@click.option('--chunksize', type=click.IntRange(min=1), default=1000000, show_default=True,
+              help='Number of hyb file lines to read and count at a time.')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of processes used to count the hybrids.')
+@click.option('--input-format', type=click.Choice(['auto', 'hyb', 'viennad']), default='auto', show_default=True,
+              help='Format of the input files. auto reads files with a .viennad extension as viennad, others as hyb.')
+@click.option('--engine', type=click.Choice(['pandas', 'pyarrow', 'threads']), default='pandas', show_default=True,
+              help='Parser for hyb files. pyarrow and threads parse blocks of the file in parallel threads; pyarrow '
+                   'requires pyarrow.')
+@click.option('--level', type=click.Choice(['transcript', 'gene', 'biotype']), default='transcript', show_default=True,
+              help='Count hybrids by the transcripts, genes or biotypes of their bits.')
+@click.option('--unordered', is_flag=True, help='Count hybrids A:::B and B:::A together.')
+@click.option('--orientations', is_flag=True,
+              help='With --unordered, also count the reads in each orientation of each hybrid.')
+@click.option('--state', 'state_filepath', type=OUTPUT_FILEPATH,
+              help='Save the counts in this file, and on later runs only read the lines appended to the hyb file since.')
+@click.option('--top', type=click.IntRange(min=1), help='Only report this many of the most frequent hybrids.')
+@click.option('--approximate', is_flag=True,
+              help='With --top, count hybrids with a fixed-size sketch, and report the error of each count.')
+@click.option('--sketch-size', type=click.IntRange(min=1),
+              help='Number of hybrids monitored by the --approximate sketch. Defaults to ten times --top.')
+@click.option('--dedup', is_flag=True,
+              help='Also count each read only once, in a hybrid-count-unique column. Uses a single process.')
+@dedup_options
+@output_options
+@click.pass_obj
+def summarise(obj, hyb_filepaths, chunksize, jobs, input_format, engine, level, unordered, orientations, state_filepath,
+              top, approximate, sketch_size, dedup, dedup_key, hash_bits, dedup_memory, spill_dir, output,
+              output_format):
+    """Summarise hybrids in one or more hyb or viennad files.
+
+    Given several files, writes a matrix with a header line, one row per hybrid and one count column per file.
+
+    A single hyb file is summarised by the hybtools serve daemon if one is running, unless --state or --profile
+    is given. The daemon loads the whole file, so --chunksize, --jobs and --engine do not apply.
+    """
+    if orientations and not unordered:
+        raise click.UsageError('--orientations can only be used with --unordered')
+    if approximate and top is None:
+        raise click.UsageError('--approximate can only be used with --top')
+    if orientations and top is not None:
+        raise click.UsageError('--orientations cannot be used with --top')
+    if state_filepath is not None and (top is not None or len(hyb_filepaths) != 1):
+        raise click.UsageError('--state can only be used with a single hyb file, and not with --top')
+    if state_filepath is not None:
+        from hybtools.compression import detect_compression
+        from hybtools.viennad_io import is_viennad_filepath
+        if hyb_filepaths[0] == '-' or detect_compression(hyb_filepaths[0]) is not None or \
+                is_viennad_filepath(hyb_filepaths[0]):
+            raise click.UsageError('--state can only be used with an uncompressed hyb file')
+    if dedup and (top is not None or orientations or state_filepath is not None or len(hyb_filepaths) > 1):
+        raise click.UsageError('--dedup cannot be used with --top, --orientations, --state or several hyb files')
+
+    dedup_options = get_dedup_options(dedup_key, hash_bits, dedup_memory, spill_dir) if dedup else None
+
+    if obj['daemon'] and len(hyb_filepaths) == 1 and hyb_filepaths[0] != '-' and state_filepath is None and \
+            obj['profiler'] is None:
+        from hybtools import client
+        try:
+            summary = client.send_request(obj['socket'], 'summarise', hyb_filepath=hyb_filepaths[0],
+                                          output_format=output_format, top=top, approximate=approximate,
+                                          sketch_size=sketch_size, input_format=input_format, unordered=unordered,
+                                          orientations=orientations, level=level, dedup_options=dedup_options)
+        except client.ServerError as error:
+            raise click.ClickException(str(error))
+        if summary is not None:
+            with click.open_file(output, 'wb') as f:
+                f.write(summary)
+            return
+
+    from hybtools import commands
+
+    if len(hyb_filepaths) > 1:
+        if orientations or approximate:
+            raise click.UsageError('--orientations and --approximate cannot be used with several hyb files')
+        summary_df = commands.summarise_samples(hyb_filepaths=hyb_filepaths, chunksize=chunksize, jobs=jobs,
+                                                cache=obj['cache'], unordered=unordered, input_format=input_format,
+                                                level=level, engine=engine).iloc[:top]
+    elif top is not None:
+        hyb_filepath = hyb_filepaths[0] if hyb_filepaths else '-'
+        summary_df = commands.summarise_top(hyb_filepath=hyb_filepath, top=top, approximate=approximate,
+                                            capacity=sketch_size, chunksize=chunksize, jobs=jobs, cache=obj['cache'],
+                                            unordered=unordered, input_format=input_format,
+                                            profiler=obj['profiler'], level=level, engine=engine)
+    else:
+        hyb_filepath = hyb_filepaths[0] if hyb_filepaths else '-'
+        summary_df = commands.summarise(hyb_filepath=hyb_filepath, chunksize=chunksize, jobs=jobs, cache=obj['cache'],
+                                        unordered=unordered, orientations=orientations, input_format=input_format,
+                                        profiler=obj['profiler'], state_filepath=state_filepath, level=level,
+                                        engine=engine, dedup_options=dedup_options)
+
+    with profiling.stage(obj['profiler'], 'write', rows=len(summary_df)):
+        writers.write_dataframe(summary_df, output=output, output_format=output_format,
+                                header=len(hyb_filepaths) > 1)
+
+
+@main.command()
+@click.option('--memory-budget', type=click.IntRange(min=1), default=4096, show_default=True,
+              help='MiB of parsed hyb files and summaries to keep in memory.')
+@click.option('--status', is_flag=True, help='Report the status of the running daemon, instead of starting one.')
+@click.option('--stop', is_flag=True, help='Stop the running daemon, instead of starting one.')
+@click.pass_obj
+def serve(obj, memory_budget, status, stop):
+    """Run a daemon that keeps parsed hyb files in memory for other hybtools commands.
+
+    The daemon listens on a Unix socket (see --socket) until it is stopped. While it is running, hybtools summarise
+    sends its work to the daemon, so that summarising a file that has not changed since it was last loaded does not
+    parse it again. The least recently used files are dropped to keep within --memory-budget, and changed files are
+    reloaded.
+    """
+    from hybtools import client
+
+    if status or stop:
+        try:
+            response = client.send_request(obj['socket'], 'shutdown' if stop else 'status')
+        except client.ServerError as error:
+            raise click.ClickException(str(error))
+        if response is None:
+            raise click.ClickException('No hybtools daemon is listening on %s' % obj['socket'])
+        click.echo(response.decode('utf-8'), nl=False)
+        return
+
+    from hybtools import server
+
+    try:
+        server.serve(obj['socket'], memory_budget * 2 ** 20)
+    except ValueError as error:
+        raise click.ClickException(str(error))
 
 
 @main.command()
 @click.argument('hyb_filepath', type=FULL_FILEPATH, default='-')
-def summarise(hyb_filepath):
-    """Summarise hybrids in a hyb file."""
-    commands.summarise(hyb_filepath=hyb_filepath).pipe(write_tsv)
+@click.option('--bin-size', type=click.IntRange(min=1), default=10, show_default=True,
+              help='Number of transcript positions in each bin.')
+@click.option('--span', is_flag=True,
+              help='Count each hybrid in every pair of bins its bits cover, instead of at the midpoints of its bits.')
+@click.option('--transcript', 'transcripts', multiple=True,
+              help='Only count hybrids on this transcript description. May be repeated.')
+@click.option('--chunksize', type=click.IntRange(min=1), default=1000000, show_default=True,
+              help='Number of hyb file lines to read and count at a time.')
+@click.option('--output-format', type=click.Choice(['npz'] + writers.OUTPUT_FORMATS), default='npz',
+              show_default=True, help='Format of the output. npz is a compressed numpy archive of sparse arrays.')
+@click.option('--output', '-o', type=OUTPUT_FILEPATH, default='-', help='Output file. Defaults to stdout.')
+@click.pass_obj
+def contacts(obj, hyb_filepath, bin_size, span, transcripts, chunksize, output_format, output):
+    """Count contacts between bins of transcripts in intramolecular hybrids, as a sparse table.
+
+    Bin i of a transcript covers positions i * BIN_SIZE + 1 to (i + 1) * BIN_SIZE.
+    """
+    from hybtools import commands
+    from hybtools.contacts import write_contacts_npz
+
+    contacts_df = commands.contacts(hyb_filepath=hyb_filepath, bin_size=bin_size, span=span,
+                                    transcripts=transcripts or None, chunksize=chunksize, cache=obj['cache'])
+
+    if output_format == 'npz':
+        write_contacts_npz(contacts_df, output, bin_size)
+    else:
+        writers.write_dataframe(contacts_df, output=output, output_format=output_format, header=True)
+
+
+def parse_region(ctx, param, values):
+    """Parse DESCRIPTION:START-STOP region options into (description, start, stop) tuples."""
+    regions = []
+    for value in values:
+        match = re.match(r'^(.+):(\d+)-(\d+)$', value)
+        if match is None:
+            raise click.BadParameter('%r is not of the form DESCRIPTION:START-STOP' % value)
+        regions.append((match.group(1), int(match.group(2)), int(match.group(3))))
+    return regions
+
+
+def filter_options(f):
+    """Decorator adding the options for the predicates of a hyb_filter.HybFilter to a command."""
+    f = click.option('--region', 'regions', multiple=True, callback=parse_region,
+                     help='Keep hybrids with a bit on DESCRIPTION overlapping transcript coordinates START to STOP, '
+                          'given as DESCRIPTION:START-STOP. May be repeated.')(f)
+    f = click.option('--bit', type=click.Choice(['1', '2']), help='Only match --description against this bit.')(f)
+    f = click.option('--description', callback=check_regular_expression,
+                     help='Keep hybrids with a bit description matching this regular expression.')(f)
+    f = click.option('--max-mapping-score', type=float, help='Keep hybrids with both mapping scores at most this.')(f)
+    f = click.option('--max-energy', type=float, help='Keep hybrids with at most this predicted binding energy.')(f)
+    f = click.option('--min-energy', type=float, help='Keep hybrids with at least this predicted binding energy.')(f)
+    return f
+
+
+def check_regular_expression(ctx, param, value):
+    """Check that an option is a valid regular expression."""
+    try:
+        re.compile(value or '')
+    except re.error as error:
+        raise click.BadParameter('invalid regular expression: %s' % error)
+    return value
+
+
+def get_filter_options(min_energy, max_energy, max_mapping_score, description, bit, regions):
+    """Get the arguments of hyb_filter.HybFilter from the values of the filter_options."""
+    return {'min_energy': min_energy, 'max_energy': max_energy, 'max_mapping_score': max_mapping_score,
+            'description': description, 'bit': int(bit) if bit else None, 'regions': regions}
+
+
+@main.command(name='filter')
+@click.argument('hyb_filepath', type=FULL_FILEPATH, default='-')
+@click.option('--chunksize', type=click.IntRange(min=1), default=100000, show_default=True,
+              help='Number of hyb file lines to read and filter at a time.')
+@filter_options
+@click.option('--output', '-o', type=OUTPUT_FILEPATH, default='-', help='Output file. Defaults to stdout.')
+def filter_hyb_file(hyb_filepath, chunksize, min_energy, max_energy, max_mapping_score, description, bit, regions,
+                    output):
+    """Write the lines of a hyb file that pass all of the given filters, unchanged."""
+    from hybtools import commands
+
+    with click.open_file(output, 'wb') as f:
+        commands.filter_hyb_file(hyb_filepath=hyb_filepath, output_file=f, chunksize=chunksize,
+                                 **get_filter_options(min_energy, max_energy, max_mapping_score, description, bit,
+                                                      regions))
+
+
+@main.command()
+@click.argument('hyb_filepath', type=FULL_FILEPATH, default='-')
+@click.option('--chunksize', type=click.IntRange(min=1), default=1000000, show_default=True,
+              help='Number of hyb file lines to read at a time.')
+@click.option('--level', type=click.Choice(['transcript', 'gene', 'biotype']), default='transcript', show_default=True,
+              help='Count hybrids and bits by the transcripts, genes or biotypes of their descriptions.')
+@click.option('--unordered', is_flag=True,
+              help='Count hybrids A:::B and B:::A together in the summary and the energy statistics.')
+@click.option('--summary', 'summary_output', type=OUTPUT_FILEPATH,
+              help='Write the summary of the hybrids, as written by summarise, to this file.')
+@click.option('--bit1-counts', 'bit1_counts_output', type=OUTPUT_FILEPATH,
+              help='Write the number of reads with each bit 1 description, with a header line, to this file.')
+@click.option('--bit2-counts', 'bit2_counts_output', type=OUTPUT_FILEPATH,
+              help='Write the number of reads with each bit 2 description, with a header line, to this file.')
+@click.option('--energy-stats', 'energy_stats_output', type=OUTPUT_FILEPATH,
+              help='Write the number of reads and the mean, minimum and maximum predicted binding energy of each '
+                   'hybrid, with a header line, to this file.')
+@click.option('--filtered', 'filtered_output', type=OUTPUT_FILEPATH,
+              help='Write the hyb lines that pass all of the filters below, unchanged, to this file, with the '
+                   'comment lines.')
+@filter_options
+@click.option('--output-format', type=click.Choice(writers.OUTPUT_FORMATS), default='tsv', show_default=True,
+              help='Format of the summary, counts and statistics. parquet and arrow require pyarrow.')
+@click.pass_obj
+def run(obj, hyb_filepath, chunksize, level, unordered, summary_output, bit1_counts_output, bit2_counts_output,
+        energy_stats_output, filtered_output, min_energy, max_energy, max_mapping_score, description, bit, regions,
+        output_format):
+    """Run several analyses of a hyb file in a single pass over the file.
+
+    Each analysis is enabled by giving the file to write its output to, which may be - for stdout for one of them.
+    Each chunk of the hyb file is parsed once and passed to every analysis.
+    """
+    outputs = [summary_output, bit1_counts_output, bit2_counts_output, energy_stats_output, filtered_output]
+    if all(output is None for output in outputs):
+        raise click.UsageError('Give at least one of --summary, --bit1-counts, --bit2-counts, --energy-stats and '
+                               '--filtered')
+    if outputs.count('-') > 1:
+        raise click.UsageError('Only one output can be written to stdout')
+
+    from hybtools import pipeline
+    from hybtools.hyb_filter import HybFilter
+
+    hyb_pipeline = pipeline.Pipeline()
+    table_outputs = {}
+    if summary_output is not None:
+        hyb_pipeline.add('summary', pipeline.HybridSummary(unordered=unordered, level=level))
+        table_outputs['summary'] = (summary_output, False)
+    for counts_bit, output in [(1, bit1_counts_output), (2, bit2_counts_output)]:
+        if output is not None:
+            hyb_pipeline.add('bit%d-counts' % counts_bit, pipeline.DescriptionCounts(bit=counts_bit, level=level))
+            table_outputs['bit%d-counts' % counts_bit] = (output, True)
+    if energy_stats_output is not None:
+        hyb_pipeline.add('energy-stats', pipeline.EnergyStatistics(unordered=unordered, level=level))
+        table_outputs['energy-stats'] = (energy_stats_output, True)
+
+    with contextlib.ExitStack() as stack:
+        if filtered_output is not None:
+            filtered_file = stack.enter_context(click.open_file(filtered_output, 'wb'))
+            hyb_filter = HybFilter(**get_filter_options(min_energy, max_energy, max_mapping_score, description, bit,
+                                                        regions))
+            hyb_pipeline.add('filtered', pipeline.FilteredLines(hyb_filter, filtered_file))
+
+        results = hyb_pipeline.run(hyb_filepath, chunksize=chunksize, profiler=obj['profiler'])
+
+    for name, (output, header) in table_outputs.items():
+        with profiling.stage(obj['profiler'], 'write', rows=len(results[name])):
+            writers.write_dataframe(results[name], output=output, output_format=output_format, header=header)
+
+
+@main.command()
+@click.argument('hyb_filepath', type=FULL_FILEPATH, default='-')
+@click.option('--chunksize', type=click.IntRange(min=1), default=100000, show_default=True,
+              help='Number of hyb file lines to read and deduplicate at a time.')
+@dedup_options
+@click.option('--output', '-o', type=OUTPUT_FILEPATH, default='-', help='Output file. Defaults to stdout.')
+def dedup(hyb_filepath, chunksize, dedup_key, hash_bits, dedup_memory, spill_dir, output):
+    """Write the first line of each read in a hyb file, unchanged, dropping later duplicates.
+
+    The numbers of reads read and written are reported on stderr.
+    """
+    from hybtools import commands
+
+    with click.open_file(output, 'wb') as f:
+        raw_count, unique_count = commands.dedup_hyb_file(hyb_filepath=hyb_filepath, output_file=f,
+                                                          chunksize=chunksize,
+                                                          **get_dedup_options(dedup_key, hash_bits, dedup_memory,
+                                                                              spill_dir))
+
+    click.echo('%d reads, %d unique' % (raw_count, unique_count), err=True)
+
+
+@main.command()
+@click.argument('hyb_filepath', type=FULL_FILEPATH, default='-')
+@click.option('--size', '-n', type=click.IntRange(min=0), help='Sample this many reads.')
+@click.option('--fraction', type=click.FloatRange(0, 1), help='Sample each read with this probability instead.')
+@click.option('--per-hybrid', is_flag=True, help='Sample up to --size reads of each hybrid-description.')
+@click.option('--unordered', is_flag=True, help='With --per-hybrid, sample hybrids A:::B and B:::A together.')
+@click.option('--seed', type=click.IntRange(min=0), default=0, show_default=True,
+              help='Seed of the sample. The same seed gives the same sample of the same file.')
+@click.option('--chunksize', type=click.IntRange(min=1), default=100000, show_default=True,
+              help='Number of hyb file lines to read and sample at a time.')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of processes used to sample an uncompressed file with --size.')
+@click.option('--output', '-o', type=OUTPUT_FILEPATH, default='-', help='Output file. Defaults to stdout.')
+def sample(hyb_filepath, size, fraction, per_hybrid, unordered, seed, chunksize, jobs, output):
+    """Write a random sample of the reads in a hyb file, unchanged and in file order.
+
+    With --size, a fixed number of reads is sampled in one pass, keeping only the sample in memory. With
+    --fraction, each read is kept with that probability. The numbers of reads read and written are reported on
+    stderr.
+    """
+    from hybtools import commands
+
+    if (size is None) == (fraction is None):
+        raise click.UsageError('Give one of --size and --fraction.')
+    if per_hybrid and size is None:
+        raise click.UsageError('--per-hybrid needs --size.')
+
+    with click.open_file(output, 'wb') as f:
+        n_reads, n_sampled = commands.sample_hyb_file(hyb_filepath=hyb_filepath, output_file=f, size=size,
+                                                      fraction=fraction, per_hybrid=per_hybrid, unordered=unordered,
+                                                      seed=seed, chunksize=chunksize, jobs=jobs)
+
+    click.echo('%d reads, %d sampled' % (n_reads, n_sampled), err=True)
+
+
+@main.command()
+@click.argument('hyb_filepath', type=FULL_FILEPATH)
+@click.option('--index', 'index_filepath', type=click.Path(writable=True, resolve_path=True),
+              help='Index directory. Defaults to the hyb file path with a .hybidx extension.')
+def index(hyb_filepath, index_filepath):
+    """Index an uncompressed hyb file for hybtools query."""
+    from hybtools import commands
+
+    try:
+        n_lines = commands.index(hyb_filepath=hyb_filepath, index_filepath=index_filepath)
+    except ValueError as error:
+        raise click.UsageError(str(error))
+    click.echo('Indexed %d lines' % n_lines, err=True)
+
+
+@main.command()
+@click.argument('hyb_filepath', type=FULL_FILEPATH)
+@click.option('--id', 'unique_sequence_ids', multiple=True, help='Read id to look up. May be repeated.')
+@click.option('--description', 'descriptions', multiple=True, help='Bit description to look up. May be repeated.')
+@click.option('--hybrid', 'hybrids', multiple=True, help='Hybrid to look up, as BIT1:::BIT2. May be repeated.')
+@click.option('--bit', type=click.Choice(['1', '2']), help='Only match --description against this bit.')
+@click.option('--index', 'index_filepath', type=click.Path(exists=True, file_okay=False, resolve_path=True),
+              help='Index directory. Defaults to the hyb file path with a .hybidx extension.')
+@click.option('--output', '-o', type=OUTPUT_FILEPATH, default='-', help='Output file. Defaults to stdout.')
+def query(hyb_filepath, unique_sequence_ids, descriptions, hybrids, bit, index_filepath, output):
+    """Write the lines of an indexed hyb file with the given read ids, bit descriptions or hybrids."""
+    from hybtools import commands
 
+    try:
+        lines = commands.query(hyb_filepath=hyb_filepath, unique_sequence_ids=unique_sequence_ids,
+                               descriptions=descriptions, hybrids=hybrids, bit=int(bit) if bit else None,
+                               index_filepath=index_filepath)
+    except (IOError, OSError) as error:
+        raise click.UsageError('Could not open the index of %s. Run hybtools index first (%s)' % (hyb_filepath, error))
+    except ValueError as error:
+        raise click.UsageError(str(error))
 
+    with click.open_file(output, 'wb') as f:
+        for line in lines:
+            f.write(line + b'\n')
@@ -0,0 +1,93 @@
+"""client.py: Requests to a running hybtools serve daemon."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import json
+import os
+import socket
+import tempfile
+
+
+PROTOCOL_VERSION = 1
+
+
+class ServerError(Exception):
+    """An error reported by the daemon while handling a request."""
+
+
+def get_socket_path():
+    """Get the default path of the daemon's Unix socket, in a directory that is private to the user.
+
+    This is $XDG_RUNTIME_DIR if it is set, and otherwise a hybtools-<uid> directory in the temporary directory, which
+    the daemon creates with mode 0700.
+    """
+
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return(os.path.join(runtime_dir, 'hybtools.sock'))
+
+    return(os.path.join(tempfile.gettempdir(), 'hybtools-%d' % os.getuid(), 'hybtools.sock'))
+
+
+def check_socket_owner(socket_path):
+    """Raise ServerError if the Unix socket at socket_path belongs to another user.
+
+    A daemon run by another user could otherwise answer requests with its own output, and see the paths sent to it.
+    """
+
+    if os.stat(socket_path).st_uid != os.getuid():
+        raise ServerError('%s belongs to another user, so it will not be used' % socket_path)
+
+
+def send_request(socket_path, command, **options):
+    """Send a request to the daemon listening on a Unix socket, and return its output as bytes.
+
+    Returns None if no daemon is listening, so that the caller can do the work itself. Raises ServerError if the
+    socket belongs to another user, or if the daemon could not handle the request. This module only uses the
+    standard library, so that commands sent to the daemon do not pay for importing pandas.
+    """
+
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return(None)
+    check_socket_owner(socket_path)
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            client.connect(socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return(None)
+
+        request = {'version': PROTOCOL_VERSION, 'command': command, 'options': options}
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+
+        with client.makefile('rb') as response:
+            header = json.loads(response.readline().decode('utf-8') or '{}')
+            output = response.read()
+    finally:
+        client.close()
+
+    if header.get('status') != 'ok':
+        raise ServerError(header.get('message', 'The daemon closed the connection without a response'))
+
+    return(output)
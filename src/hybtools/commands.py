@@ -21,15 +21,406 @@
 # ______________________________________________________________________________
 
 
-from hybtools.hyb_io import load_hyb_dataframe
-from hybtools.summarise import create_summary_dataframe
+import functools
+import numpy as np
+import os
 
+from concurrent.futures import ProcessPoolExecutor
+from pandas.errors import EmptyDataError
 
-def summarise(hyb_filepath):
-    """Summarise a hyb file."""
+from hybtools.compression import detect_compression
+from hybtools.contacts import count_contacts_in_chunks
+from hybtools.dedup import ReadDeduplicator
+from hybtools.hyb_filter import HybFilter, filter_hyb_lines
+from hybtools.hyb_index import HybIndex, build_hyb_index
+from hybtools.hyb_io import find_hyb_file_ranges, load_hyb_dataframe, load_hyb_dataframe_range
+from hybtools.profiling import iterate, stage
+from hybtools.sampling import BernoulliSampler, ReservoirSampler, sample_hyb_lines
+from hybtools.sketches import SpaceSaving
+from hybtools.summarise import count_hybrids_in_chunks, count_top_hybrids_in_chunks, create_summary_matrix, \
+    merge_hybrid_counts, summarise_hybrid_counts, summarise_top_hybrids
+from hybtools.summary_state import find_last_line_end, load_summary_state, save_summary_state
+from hybtools.viennad_io import is_viennad_filepath, load_viennad_dataframe
 
-    hyb_df = load_hyb_dataframe(hyb_filepath)
 
-    summary_hyb_df = create_summary_dataframe(hyb_df)
+def summarise(hyb_filepath, chunksize=None, jobs=1, cache=None, unordered=False, orientations=False,
+              input_format='auto', profiler=None, state_filepath=None, level='transcript', dedup_options=None,
+              engine='pandas'):
+    """Summarise a hyb file.
+
+    If chunksize is given, the hyb file is read and counted chunksize rows at a time, so that memory use depends
+    on the number of distinct hybrids rather than on the size of the file. The hyb file is always loaded with
+    compact dtypes, in which missing coordinates are kept as NaN, so they do not affect the summary.
+
+    If jobs is greater than 1, the hyb file is split into that many byte ranges, which are counted in parallel by
+    a pool of processes. The result is identical to that of a single process. Standard input and compressed hyb
+    files are always read by a single process.
+
+    If cache is a hyb_cache.HybCache, the hyb file is loaded whole through the cache, and chunksize and jobs are
+    ignored.
+
+    The unordered, orientations and level arguments are as for summarise.create_summary_dataframe.
+
+    If input_format is 'viennad', or 'auto' and the file has a viennad extension, the input is read as a viennad
+    file, by a single process and without the cache. Otherwise the hyb file is parsed with engine, as described
+    for hyb_io.load_hyb_dataframe.
+
+    If profiler is a profiling.Profiler, the read, count and summarise stages are timed with it. When the file is
+    counted by several processes, reading and counting are timed together as the count stage.
+
+    If state_filepath is given, the counts of the hyb file up to its last complete line are saved to that file,
+    and the next summary of the same hyb file only reads the lines appended since, as long as the lines already
+    counted are unchanged. Otherwise the whole file is counted again. The state file can only be used with
+    uncompressed hyb files, which are counted by a single process without the cache.
+
+    If dedup_options is given, as a dict of the arguments of dedup.ReadDeduplicator, the summary has a
+    hybrid-count-unique column counting only the first occurrence of each read, as well as the hybrid-count column
+    counting all reads. Reads must be seen in file order, so the file is counted by a single process. It cannot be
+    used with orientations or a state file.
+    """
+
+    if dedup_options is not None:
+        if orientations or state_filepath is not None:
+            raise ValueError('Reads cannot be deduplicated with orientations or a summary state file')
+        with ReadDeduplicator(**dedup_options) as deduplicator:
+            hybrid_counts = _count_hybrids_in_file(hyb_filepath, chunksize, 1, cache, input_format,
+                                                   profiler = profiler, engine = engine, unordered = unordered,
+                                                   level = level, deduplicator = deduplicator)
+        with stage(profiler, 'summarise', rows = len(hybrid_counts)):
+            return(summarise_hybrid_counts(hybrid_counts))
+
+    if state_filepath is not None:
+        with stage(profiler, 'count'):
+            hybrid_counts = _count_hybrids_incrementally(hyb_filepath, state_filepath, chunksize,
+                                                         unordered = unordered, orientations = orientations,
+                                                         level = level)
+        return(summarise_hybrid_counts(hybrid_counts))
+
+    hybrid_counts = _count_hybrids_in_file(hyb_filepath, chunksize, jobs, cache, input_format, profiler = profiler,
+                                           engine = engine, unordered = unordered, orientations = orientations,
+                                           level = level)
+
+    with stage(profiler, 'summarise', rows = len(hybrid_counts)):
+        summary_hyb_df = summarise_hybrid_counts(hybrid_counts)
 
     return(summary_hyb_df)
+
+
+def summarise_top(hyb_filepath, top, approximate=False, capacity=None, chunksize=None, jobs=1, cache=None,
+                  unordered=False, input_format='auto', profiler=None, level='transcript', engine='pandas'):
+    """Summarise the top hybrids in a hyb file.
+
+    If approximate is True, the hybrids are counted with a Space-Saving sketch monitoring capacity hybrids (by
+    default ten times top), as described for summarise.create_top_summary_dataframe_from_chunks, and the summary
+    has a hybrid-count-error column. Otherwise the summary is the first top rows of the exact summary. The other
+    arguments are as for summarise; with a sketch, each of the jobs processes keeps its own sketch, and the
+    sketches are merged.
+    """
+
+    if not approximate:
+        return(summarise(hyb_filepath, chunksize = chunksize, jobs = jobs, cache = cache, unordered = unordered,
+                         input_format = input_format, profiler = profiler, level = level,
+                         engine = engine).iloc[:top])
+
+    sketch = _count_hybrids_in_file(hyb_filepath, chunksize, jobs, cache, input_format, profiler = profiler,
+                                    engine = engine, unordered = unordered, level = level,
+                                    capacity = capacity or 10 * top)
+
+    with stage(profiler, 'summarise', rows = len(sketch.table)):
+        return(summarise_top_hybrids(sketch, top))
+
+
+def summarise_samples(hyb_filepaths, chunksize=None, jobs=1, sample_names=None, cache=None, unordered=False,
+                      input_format='auto', level='transcript', engine='pandas'):
+    """Summarise several hyb files as a matrix with one row per hybrid and one count column per hyb file.
+
+    Up to jobs hyb files are counted at the same time, each by its own process. The columns are named after the
+    hyb files, or after sample_names if given. The chunksize, cache, unordered, input_format, level and engine
+    arguments are as for summarise.
+    """
+
+    if sample_names is None:
+        sample_names = _get_sample_names(hyb_filepaths)
+
+    hybrid_counts_list = [None] * len(hyb_filepaths)
+
+    with ProcessPoolExecutor(max_workers = jobs) as executor:
+        futures = {i: executor.submit(_count_hybrids_in_file, hyb_filepath, chunksize, 1, cache, input_format,
+                                      engine = engine, unordered = unordered, level = level)
+                   for i, hyb_filepath in enumerate(hyb_filepaths) if hyb_filepath != '-'}
+        for i, hyb_filepath in enumerate(hyb_filepaths):
+            if hyb_filepath == '-':
+                hybrid_counts_list[i] = _count_hybrids_in_file(hyb_filepath, chunksize, 1, cache, input_format,
+                                                               engine = engine, unordered = unordered, level = level)
+        for i, future in futures.items():
+            hybrid_counts_list[i] = future.result()
+
+    return(create_summary_matrix(hybrid_counts_list, sample_names))
+
+
+def contacts(hyb_filepath, bin_size=10, span=False, transcripts=None, chunksize=1000000, cache=None):
+    """Count the contacts between bins of the transcripts of the intramolecular hybrids in a hyb file.
+
+    The hyb file is read chunksize rows at a time, or whole through the cache if cache is a hyb_cache.HybCache.
+    The other arguments and the sparse contact table returned are as for contacts.count_contacts.
+    """
+
+    if cache is not None and hyb_filepath != '-':
+        hyb_df_chunks = _load_whole_hyb_file(hyb_filepath, cache = cache)
+    else:
+        hyb_df_chunks = load_hyb_dataframe(hyb_filepath, chunksize = chunksize, compact = True)
+
+    return(count_contacts_in_chunks(hyb_df_chunks, bin_size = bin_size, span = span, transcripts = transcripts))
+
+
+def filter_hyb_file(hyb_filepath, output_file, chunksize=100000, **filter_options):
+    """Write the lines of a hyb file that pass a filter to a binary file object, and return the number of bytes.
+
+    The filter_options are the arguments of hyb_filter.HybFilter. The hyb file is streamed chunksize lines at a
+    time, as described for hyb_filter.filter_hyb_lines.
+    """
+
+    n_bytes = 0
+
+    for block in filter_hyb_lines(hyb_filepath, HybFilter(**filter_options), chunksize = chunksize):
+        output_file.write(block)
+        n_bytes += len(block)
+
+    return(n_bytes)
+
+
+def dedup_hyb_file(hyb_filepath, output_file, chunksize=100000, **dedup_options):
+    """Write the first occurrence of each read in a hyb file to a binary file object.
+
+    The dedup_options are the arguments of dedup.ReadDeduplicator. The hyb file is streamed chunksize lines at a
+    time, as described for hyb_filter.filter_hyb_lines. Returns the number of reads read and the number written.
+    """
+
+    with ReadDeduplicator(**dedup_options) as deduplicator:
+        for block in filter_hyb_lines(hyb_filepath, deduplicator, chunksize = chunksize):
+            output_file.write(block)
+
+    return(deduplicator.raw_count, deduplicator.unique_count)
+
+
+def sample_hyb_file(hyb_filepath, output_file, size=None, fraction=None, per_hybrid=False, unordered=False, seed=0,
+                    chunksize=100000, jobs=1):
+    """Write a seeded random sample of the reads of a hyb file to a binary file object.
+
+    Give either fraction, to keep each read with that probability, or size, to keep size reads chosen uniformly
+    at random, or size reads of each hybrid if per_hybrid is True, as described for sampling.ReservoirSampler.
+    The sampled lines are written unchanged and in file order. Sampling by fraction streams the file as for
+    filter_hyb_file, keeping comment lines. Sampling by size keeps only the sample in memory, and with jobs > 1
+    samples byte ranges of an uncompressed file in parallel and merges their samples. The same seed gives the same
+    sample whatever the chunksize or number of jobs. Returns the number of reads read and the number written.
+    """
+
+    if (size is None) == (fraction is None):
+        raise ValueError('Give either the size or the fraction of the sample')
+
+    if fraction is not None:
+        sampler = BernoulliSampler(fraction, seed = seed)
+        for block in filter_hyb_lines(hyb_filepath, sampler, chunksize = chunksize):
+            output_file.write(block)
+        return(sampler.n_reads, sampler.n_sampled)
+
+    sampler_options = {'size': size, 'seed': seed, 'per_hybrid': per_hybrid, 'unordered': unordered}
+
+    if jobs > 1 and hyb_filepath != '-' and detect_compression(hyb_filepath) is None:
+        sample_range = functools.partial(_sample_hyb_range, hyb_filepath = hyb_filepath, chunksize = chunksize,
+                                         sampler_options = sampler_options)
+        with ProcessPoolExecutor(max_workers = jobs) as executor:
+            range_samplers = list(executor.map(sample_range, find_hyb_file_ranges(hyb_filepath, jobs)))
+        sampler = range_samplers[0]
+        for range_sampler in range_samplers[1:]:
+            sampler.merge(range_sampler)
+    else:
+        sampler = sample_hyb_lines(hyb_filepath, ReservoirSampler(**sampler_options), chunksize = chunksize)
+
+    lines = sampler.get_lines()
+    output_file.write(b''.join(lines))
+
+    return(sampler.n_reads, len(lines))
+
+
+def index(hyb_filepath, index_filepath=None):
+    """Index the lines of an uncompressed hyb file by read id and bit description, and return the number of lines.
+
+    The index is written to index_filepath, or next to the hyb file with a .hybidx extension.
+    """
+
+    return(build_hyb_index(hyb_filepath, index_filepath).n_lines)
+
+
+def query(hyb_filepath, unique_sequence_ids=(), descriptions=(), hybrids=(), bit=None, index_filepath=None):
+    """Look up lines of an indexed hyb file, and yield them in file order as bytes without line endings.
+
+    Lines are yielded if they match any of the read ids, bit descriptions or hybrids (given as 'bit1:::bit2').
+    If bit is 1 or 2, descriptions only match that bit. The hyb file must have been indexed with index.
+    """
+
+    hyb_index = HybIndex(hyb_filepath, index_filepath)
+
+    rows = np.union1d(hyb_index.find_sequence_ids(unique_sequence_ids),
+                      np.union1d(hyb_index.find_descriptions(descriptions, bit = bit),
+                                 hyb_index.find_hybrids(hybrids)))
+
+    return(hyb_index.read_lines(rows))
+
+
+def _get_sample_names(hyb_filepaths):
+    """Name samples after the base names of their hyb files, or the full paths if the base names are not unique."""
+
+    sample_names = [os.path.basename(hyb_filepath) if hyb_filepath != '-' else 'stdin'
+                    for hyb_filepath in hyb_filepaths]
+
+    if len(set(sample_names)) < len(sample_names):
+        sample_names = list(hyb_filepaths)
+
+    return(sample_names)
+
+
+def _count_hybrids_in_file(hyb_filepath, chunksize, jobs, cache, input_format, profiler=None, engine='pandas',
+                           **count_options):
+    """Count the hybrids in a hyb file, as described for summarise. May run in a worker process."""
+
+    if input_format == 'viennad' or (input_format == 'auto' and is_viennad_filepath(hyb_filepath)):
+        hyb_df_chunks = load_viennad_dataframe(hyb_filepath, chunksize = chunksize or 100000, compact = True)
+
+    elif cache is not None and hyb_filepath != '-':
+        hyb_df_chunks = _load_whole_hyb_file(hyb_filepath, cache = cache, engine = engine)
+
+    elif jobs > 1 and hyb_filepath != '-' and detect_compression(hyb_filepath) is None:
+        with stage(profiler, 'count'):
+            hybrid_counts = _count_hybrids_in_ranges(hyb_filepath, chunksize, jobs, count_options, engine = engine)
+        if profiler is not None:
+            profiler.add_rows('count', _get_total_count(hybrid_counts))
+        return(hybrid_counts)
+
+    elif chunksize is None:
+        hyb_df_chunks = _load_whole_hyb_file(hyb_filepath, engine = engine)
+
+    else:
+        hyb_df_chunks = load_hyb_dataframe(hyb_filepath, chunksize = chunksize, compact = True, engine = engine)
+
+    with stage(profiler, 'count'):
+        hybrid_counts = _count_hybrids_in_chunks(iterate(profiler, hyb_df_chunks, 'read'), **count_options)
+
+    if profiler is not None:
+        profiler.add_rows('count', profiler.stages['read']['rows'])
+
+    return(hybrid_counts)
+
+
+def _count_hybrids_incrementally(hyb_filepath, state_filepath, chunksize, **count_options):
+    """Count the hybrids in a hyb file, starting from the counts saved in a state file, as described for summarise."""
+
+    if hyb_filepath == '-' or detect_compression(hyb_filepath) is not None or is_viennad_filepath(hyb_filepath):
+        raise ValueError('Summary state files can only be used with uncompressed hyb files')
+
+    saved_hybrid_counts, offset = load_summary_state(state_filepath, hyb_filepath, **count_options)
+
+    line_end = find_last_line_end(hyb_filepath)
+    hybrid_counts = merge_hybrid_counts([saved_hybrid_counts,
+                                         _count_hybrids_between(hyb_filepath, offset, line_end, chunksize,
+                                                                count_options)])
+    save_summary_state(state_filepath, hyb_filepath, hybrid_counts, line_end, **count_options)
+
+    # A last line without a newline may still be being written. It is never saved in the state, and is only
+    # counted if it already has all the fields of a hyb line.
+    with open(hyb_filepath, 'rb') as hyb_file:
+        hyb_file.seek(line_end)
+        last_line = hyb_file.read()
+
+    if not 15 <= len(last_line.split(b'\t')) <= 17:
+        return(hybrid_counts)
+
+    return(merge_hybrid_counts([hybrid_counts,
+                                _count_hybrids_between(hyb_filepath, line_end, line_end + len(last_line), chunksize,
+                                                       count_options)]))
+
+
+def _count_hybrids_between(hyb_filepath, start, stop, chunksize, count_options):
+    """Count the hybrids in a byte range of a hyb file, or return None if the range has no hyb lines."""
+
+    if start >= stop:
+        return(None)
+
+    return(_count_hybrids_in_range((start, stop), hyb_filepath, chunksize, count_options))
+
+
+def _load_whole_hyb_file(hyb_filepath, cache=None, engine='pandas'):
+    """Yield a whole hyb file as a single chunk. The file is only loaded once the chunk is requested."""
+
+    yield load_hyb_dataframe(hyb_filepath, compact = True, cache = cache, engine = engine)
+
+
+def _count_hybrids_in_ranges(hyb_filepath, chunksize, jobs, count_options, engine='pandas'):
+    """Count the hybrids in an uncompressed hyb file, with byte ranges of the file counted in parallel."""
+
+    hyb_file_ranges = find_hyb_file_ranges(hyb_filepath, jobs)
+    count_hybrids_in_range = functools.partial(_count_hybrids_in_range, hyb_filepath = hyb_filepath,
+                                               chunksize = chunksize, count_options = count_options,
+                                               engine = engine)
+    with ProcessPoolExecutor(max_workers = jobs) as executor:
+        range_hybrid_counts = list(executor.map(count_hybrids_in_range, hyb_file_ranges))
+
+    if 'capacity' in count_options:
+        sketches = [sketch for sketch in range_hybrid_counts if sketch is not None]
+        if not sketches:
+            return(SpaceSaving(count_options['capacity']))
+        for sketch in sketches[1:]:
+            sketches[0].merge(sketch)
+        return(sketches[0])
+
+    return(merge_hybrid_counts(range_hybrid_counts))
+
+
+def _get_total_count(hybrid_counts):
+    """Get the number of reads counted in hybrid counts, a count table or a sketch."""
+
+    if hasattr(hybrid_counts, 'total'):
+        return(hybrid_counts.total)
+
+    if hasattr(hybrid_counts, 'columns'):
+        return(int(hybrid_counts['hybrid-count'].sum()))
+
+    return(int(hybrid_counts.sum()))
+
+
+def _count_hybrids_in_chunks(hyb_df_chunks, capacity=None, **count_options):
+    """Count the hybrids in hyb dataframe chunks, with a Space-Saving sketch if a capacity is given."""
+
+    if capacity is not None:
+        return(count_top_hybrids_in_chunks(hyb_df_chunks, capacity, **count_options))
+
+    return(count_hybrids_in_chunks(hyb_df_chunks, **count_options))
+
+
+def _sample_hyb_range(hyb_file_range, hyb_filepath, chunksize, sampler_options):
+    """Sample the reads in a byte range of a hyb file. Runs in a worker process."""
+
+    start, stop = hyb_file_range
+
+    return(sample_hyb_lines(hyb_filepath, ReservoirSampler(**sampler_options), chunksize = chunksize, start = start,
+                            stop = stop))
+
+
+def _count_hybrids_in_range(hyb_file_range, hyb_filepath, chunksize, count_options, engine='pandas'):
+    """Count the hybrids in a byte range of a hyb file, or return None if the range has no hyb lines.
+
+    Runs in a worker process.
+    """
+
+    start, stop = hyb_file_range
+
+    try:
+        if chunksize is None:
+            hyb_df_chunks = [load_hyb_dataframe_range(hyb_filepath, start, stop, compact = True, engine = engine)]
+        else:
+            hyb_df_chunks = load_hyb_dataframe_range(hyb_filepath, start, stop, chunksize = chunksize,
+                                                     compact = True, engine = engine)
+
+        return(_count_hybrids_in_chunks(hyb_df_chunks, **count_options))
+    except EmptyDataError:
+        return(None)
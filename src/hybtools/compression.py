@@ -0,0 +1,268 @@
+"""compression.py: Reading of compressed input files."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import collections
+import io
+import os
+import queue
+import struct
+import sys
+import threading
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+GZIP_MAGIC = b'\x1f\x8b\x08'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+READ_SIZE = 1 << 20
+
+
+def detect_compression(filepath):
+    """Detect the compression of a file from its magic bytes. Returns 'bgzf', 'gzip', 'zstd' or None."""
+
+    with open(filepath, 'rb') as f:
+        return(_detect_compression(f.read(18)))
+
+
+def open_file(filepath, threads=None):
+    """Open a file, or stdin if filepath is '-', for reading as bytes, decompressing it if necessary.
+
+    gzip, BGZF and zstd compression are detected from the magic bytes at the start of the file. Decompression runs
+    in a background thread, so that it overlaps with parsing, and the blocks of BGZF files are decompressed in
+    parallel by a pool of threads (by default one per CPU). Reading zstd files requires the zstandard package.
+    Closing the returned file object does not close stdin.
+    """
+
+    if filepath == '-':
+        raw_file = _get_stdin()
+        compression = _detect_compression(raw_file.peek(18))
+        if compression is None:
+            return(io.BufferedReader(_UnclosedReader(raw_file), READ_SIZE))
+    else:
+        raw_file = open(filepath, 'rb')
+        compression = _detect_compression(raw_file.peek(18))
+        if compression is None:
+            return(raw_file)
+
+    if compression == 'bgzf':
+        blocks = _iter_bgzf_blocks(raw_file, threads or os.cpu_count() or 1)
+    elif compression == 'gzip':
+        blocks = _iter_gzip_blocks(raw_file)
+    else:
+        blocks = _iter_zstd_blocks(raw_file)
+
+    return(io.BufferedReader(_DecompressedReader(blocks, raw_file if filepath != '-' else None), READ_SIZE))
+
+
+def _get_stdin():
+    """Get a peekable binary stream for stdin."""
+
+    stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+
+    if not hasattr(stdin, 'peek'):
+        stdin = io.BufferedReader(stdin)
+
+    return(stdin)
+
+
+def _detect_compression(magic):
+    """Detect the compression of a file from its first 18 bytes."""
+
+    if magic.startswith(GZIP_MAGIC):
+        if len(magic) >= 16 and ord(magic[3:4]) & 4 and magic[12:14] == b'BC':
+            return('bgzf')
+        return('gzip')
+
+    if magic.startswith(ZSTD_MAGIC):
+        return('zstd')
+
+    return(None)
+
+
+def _iter_gzip_blocks(raw_file):
+    """Yield the decompressed contents of a gzip file, which may have several members, a block at a time.
+
+    Raises IOError if the file ends part of the way through a member, as it does when it has been truncated.
+    """
+
+    decompressor = zlib.decompressobj(31)
+    in_member = False
+
+    while True:
+        data = raw_file.read(READ_SIZE)
+        if not data:
+            break
+        while data:
+            in_member = True
+            yield decompressor.decompress(data)
+            if not decompressor.eof:
+                break
+            data = decompressor.unused_data
+            decompressor = zlib.decompressobj(31)
+            in_member = False
+
+    yield decompressor.flush()
+
+    if in_member and not decompressor.eof:
+        raise IOError('Compressed file ended before the end-of-stream marker was reached')
+
+
+def _iter_bgzf_blocks(raw_file, threads):
+    """Yield the decompressed BGZF blocks of a file in order, decompressing several blocks at a time in threads."""
+
+    pending = collections.deque()
+
+    with ThreadPoolExecutor(max_workers = threads) as executor:
+        for block in _iter_compressed_bgzf_blocks(raw_file):
+            pending.append(executor.submit(zlib.decompress, block, 31))
+            if len(pending) >= 4 * threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _iter_compressed_bgzf_blocks(raw_file):
+    """Yield the compressed blocks of a BGZF file, using the block sizes stored in their gzip headers."""
+
+    while True:
+        header = raw_file.read(12)
+        if not header:
+            return
+        if len(header) < 12:
+            raise IOError('Compressed file ended before the end of its last BGZF block')
+        extra_length = struct.unpack('<H', header[10:12])[0]
+        extra = raw_file.read(extra_length)
+
+        block_size = None
+        position = 0
+        while position + 4 <= len(extra):
+            subfield_id = extra[position:position + 2]
+            subfield_length = struct.unpack('<H', extra[position + 2:position + 4])[0]
+            if subfield_id == b'BC':
+                block_size = struct.unpack('<H', extra[position + 4:position + 6])[0] + 1
+            position += 4 + subfield_length
+
+        if block_size is None:
+            raise IOError('Invalid BGZF block: no block size in the gzip header')
+
+        block = header + extra + raw_file.read(block_size - 12 - extra_length)
+        if len(block) != block_size:
+            raise IOError('Compressed file ended before the end of its last BGZF block')
+
+        yield block
+
+
+def _iter_zstd_blocks(raw_file):
+    """Yield the decompressed contents of a zstd file a block at a time."""
+
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('Reading zstd compressed files requires the zstandard package')
+
+    reader = zstandard.ZstdDecompressor().stream_reader(raw_file, read_across_frames=True)
+
+    while True:
+        data = reader.read(READ_SIZE)
+        if not data:
+            return
+        yield data
+
+
+class _UnclosedReader(io.RawIOBase):
+    """Binary file object reading from another one, which is left open when this one is closed."""
+
+    def __init__(self, raw_file):
+        super(_UnclosedReader, self).__init__()
+        self._raw_file = raw_file
+
+    def readable(self):
+        return(True)
+
+    def readinto(self, buffer):
+        data = self._raw_file.read(len(buffer))
+        buffer[:len(data)] = data
+        return(len(data))
+
+
+class _DecompressedReader(io.RawIOBase):
+    """Binary file object reading from an iterator of decompressed blocks, which runs in a background thread."""
+
+    def __init__(self, blocks, raw_file=None):
+        super(_DecompressedReader, self).__init__()
+        self._raw_file = raw_file
+        self._queue = queue.Queue(maxsize = 16)
+        self._stop = threading.Event()
+        self._data = b''
+        self._position = 0
+        self._finished = False
+        self._thread = threading.Thread(target = self._produce, args = (blocks,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _produce(self, blocks):
+        try:
+            for block in blocks:
+                if self._stop.is_set():
+                    return
+                if block:
+                    self._queue.put(block)
+            self._queue.put(None)
+        except Exception as error:
+            self._queue.put(error)
+
+    def readable(self):
+        return(True)
+
+    def readinto(self, buffer):
+        while self._position >= len(self._data):
+            if self._finished:
+                return(0)
+            block = self._queue.get()
+            if block is None:
+                self._finished = True
+                return(0)
+            if isinstance(block, Exception):
+                self._finished = True
+                raise block
+            self._data = block
+            self._position = 0
+
+        size = min(len(buffer), len(self._data) - self._position)
+        buffer[:size] = memoryview(self._data)[self._position:self._position + size]
+        self._position += size
+        return(size)
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout = 0.1)
+                except queue.Empty:
+                    pass
+            if self._raw_file is not None:
+                self._raw_file.close()
+        super(_DecompressedReader, self).close()
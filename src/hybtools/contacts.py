@@ -0,0 +1,155 @@
+"""contacts.py: Binned contact maps of intramolecular hybrids."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import numpy as np
+import pandas as pd
+import sys
+
+from hybtools.hyb_io import hyb_df_columns
+from hybtools.summarise import _factorize_descriptions, _share_codes
+
+
+contacts_df_columns = ['transcript', 'bit1-bin', 'bit2-bin', 'count']
+
+_coordinate_columns = ['%s-transcript_coordinates_%s' % (bit, end) for bit in ['bit1', 'bit2']
+                       for end in ['start', 'stop']]
+
+
+def count_contacts(hyb_df, bin_size=10, span=False, transcripts=None):
+    """Count the contacts between bins of the transcripts of the intramolecular hybrids in a hyb dataframe.
+
+    Hybrids whose bits are on the same transcript are binned by the transcript coordinates of each bit, with bin i
+    covering coordinates i * bin_size + 1 to (i + 1) * bin_size. By default each hybrid is counted once, in the
+    bins of the midpoints of its bits. If span is True, it is counted once in every pair of bins that the two bits
+    cover. If transcripts is given, only hybrids on those transcripts are counted. Hybrids with a missing
+    transcript coordinate are not counted.
+
+    Returns a sparse contact table with the columns transcript, bit1-bin, bit2-bin and count, with one row per
+    pair of bins with a non-zero count, sorted by transcript and bins.
+    """
+
+    bit1_codes, bit1_descriptions = _factorize_descriptions(hyb_df['bit1-description'])
+    bit2_codes, bit2_descriptions = _factorize_descriptions(hyb_df['bit2-description'])
+    bit1_codes, bit2_codes, descriptions = _share_codes(bit1_codes, bit1_descriptions, bit2_codes, bit2_descriptions)
+
+    intramolecular = (bit1_codes == bit2_codes) & (bit1_codes >= 0)
+    for column in _coordinate_columns:
+        intramolecular &= hyb_df[column].notnull().values
+    if transcripts is not None:
+        intramolecular &= np.isin(bit1_codes, np.flatnonzero(np.isin(descriptions, list(transcripts))))
+
+    codes = bit1_codes[intramolecular].astype('int64')
+    bit1_bins, bit1_n_bins = _get_bins(hyb_df, 'bit1', intramolecular, bin_size, span)
+    bit2_bins, bit2_n_bins = _get_bins(hyb_df, 'bit2', intramolecular, bin_size, span)
+
+    if span:
+        # Repeat each hybrid once per pair of bins that it covers, and step through the pairs of each hybrid.
+        n_pairs = bit1_n_bins * bit2_n_bins
+        pair_offsets = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+        codes = np.repeat(codes, n_pairs)
+        bit1_bins = np.repeat(bit1_bins, n_pairs) + pair_offsets // np.repeat(bit2_n_bins, n_pairs)
+        bit2_bins = np.repeat(bit2_bins, n_pairs) + pair_offsets % np.repeat(bit2_n_bins, n_pairs)
+
+    # Count each (transcript, bin, bin) triple by linearising it into a single integer.
+    n_bins = int(max(bit1_bins.max(), bit2_bins.max())) + 1 if len(codes) else 1
+    keys = (codes * n_bins + bit1_bins) * n_bins + bit2_bins
+    unique_keys, counts = np.unique(keys, return_counts = True)
+
+    contacts_df = pd.DataFrame({
+        'transcript': descriptions[unique_keys // (n_bins * n_bins)],
+        'bit1-bin': (unique_keys // n_bins) % n_bins,
+        'bit2-bin': unique_keys % n_bins,
+        'count': counts.astype('int64'),
+    }, columns = contacts_df_columns)
+
+    return(contacts_df)
+
+
+def count_contacts_in_chunks(hyb_df_chunks, bin_size=10, span=False, transcripts=None):
+    """Count contacts, as described for count_contacts, in an iterable of hyb dataframe chunks.
+
+    Only the sparse contact table is kept between chunks, so memory use depends on the number of pairs of bins
+    with contacts rather than on the number of reads.
+    """
+
+    contacts_df = None
+
+    for hyb_df in hyb_df_chunks:
+        chunk_contacts_df = count_contacts(hyb_df, bin_size, span, transcripts)
+        contacts_df = chunk_contacts_df if contacts_df is None else merge_contacts([contacts_df, chunk_contacts_df])
+
+    if contacts_df is None:
+        contacts_df = count_contacts(pd.DataFrame({column: [] for column in hyb_df_columns[:15]}), bin_size)
+
+    return(contacts_df)
+
+
+def merge_contacts(contacts_dfs):
+    """Merge several sparse contact tables into one, adding up the counts of the same pairs of bins."""
+
+    contacts_df = pd.concat(contacts_dfs, ignore_index = True)
+
+    return(contacts_df.groupby(contacts_df_columns[:3], sort = True)['count'].sum().reset_index())
+
+
+def write_contacts_npz(contacts_df, output, bin_size):
+    """Write a sparse contact table to a compressed npz file, or to stdout if output is '-'.
+
+    The file holds the transcript names in transcripts, and one entry per pair of bins in the arrays transcript
+    (an index into transcripts), bit1_bin, bit2_bin and count, as well as bin_size. The entries of one
+    transcript can be loaded as a sparse matrix with, for example, scipy.sparse.coo_matrix((count, (bit1_bin,
+    bit2_bin))).
+    """
+
+    codes, transcripts = pd.factorize(contacts_df['transcript'], sort = True)
+
+    arrays = {
+        'transcripts': np.asarray(transcripts, dtype = str),
+        'transcript': codes.astype('int32'),
+        'bit1_bin': contacts_df['bit1-bin'].values.astype('int32'),
+        'bit2_bin': contacts_df['bit2-bin'].values.astype('int32'),
+        'count': contacts_df['count'].values.astype('int64'),
+        'bin_size': np.array(bin_size),
+    }
+
+    if output == '-':
+        np.savez_compressed(sys.stdout.buffer, **arrays)
+    else:
+        with open(output, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+
+
+def _get_bins(hyb_df, bit, rows, bin_size, span):
+    """Get the first bin of one bit of the selected rows, and the number of bins it covers if span is True."""
+
+    starts = hyb_df[bit + '-transcript_coordinates_start'].values[rows].astype('int64')
+    stops = hyb_df[bit + '-transcript_coordinates_stop'].values[rows].astype('int64')
+
+    if not span:
+        midpoints = (starts + stops) // 2
+        return((midpoints - 1) // bin_size, None)
+
+    start_bins = (np.minimum(starts, stops) - 1) // bin_size
+    stop_bins = (np.maximum(starts, stops) - 1) // bin_size
+
+    return(start_bins, stop_bins - start_bins + 1)
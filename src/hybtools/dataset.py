@@ -0,0 +1,190 @@
+"""dataset.py: Lazy queries over hyb files, run in one streaming pass."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import copy
+
+from hybtools.hyb_filter import HybFilter
+from hybtools.hyb_io import _concat_hyb_dataframes, hyb_df_columns, load_hyb_dataframe
+from hybtools.summarise import count_hybrids_in_chunks, summarise_hybrid_counts
+
+
+class HybDataset(object):
+    """A lazy query over the reads of a hyb file.
+
+    The filter, select, group_by_hybrid and count methods do not read the file. Each returns a new dataset with
+    one more step in its plan, so that queries can be built up a step at a time, for example:
+
+        HybDataset('sample.hyb').filter(max_energy = -20).group_by_hybrid(unordered = True).count().collect()
+
+    collect then runs the whole plan in a single pass over the file, chunksize lines at a time, parsing only the
+    columns listed in columns. Filtering, counting and summarising never need read_sequence, the widest column,
+    so it is skipped by the parser. The hyb_filepath, chunksize, compact and engine arguments are as for
+    hyb_io.load_hyb_dataframe.
+    """
+
+    def __init__(self, hyb_filepath, chunksize=1000000, compact=False, engine='pandas'):
+        self.hyb_filepath = hyb_filepath
+        self.chunksize = chunksize
+        self.compact = compact
+        self.engine = engine
+        self.filters = ()
+        self.selected_columns = None
+        self.count_options = None
+        self.counted = False
+
+    def __repr__(self):
+        steps = ['HybDataset(%r)' % self.hyb_filepath]
+
+        for hyb_filter in self.filters:
+            steps.append('filter(%s)' % ', '.join(hyb_filter.columns))
+        if self.selected_columns is not None:
+            steps.append('select(%s)' % ', '.join(self.selected_columns))
+        if self.count_options is not None:
+            steps.append('group_by_hybrid(%s)' % ', '.join('%s=%r' % option
+                                                             for option in sorted(self.count_options.items())))
+        if self.counted:
+            steps.append('count()')
+
+        return('.'.join(steps))
+
+    @property
+    def columns(self):
+        """The names of the hyb dataframe columns that collect parses, in file order, or None for every column."""
+
+        if self.count_options is not None:
+            columns = ['bit1-description', 'bit2-description']
+        elif self.counted:
+            columns = []
+        elif self.selected_columns is not None:
+            columns = list(self.selected_columns)
+        else:
+            return(None)
+
+        for hyb_filter in self.filters:
+            columns += hyb_filter.columns
+
+        # Counting reads needs at least one column, so parse a narrow one.
+        if not columns:
+            columns = ['predicted_binding_energy']
+
+        return([column for column in hyb_df_columns if column in columns])
+
+    def filter(self, hyb_filter=None, **filter_options):
+        """Keep only the reads that pass a hyb_filter.HybFilter, or one made from the keyword arguments.
+
+        Filters may use columns that are not selected.
+        """
+
+        self._check_not_grouped('filter')
+
+        if hyb_filter is None:
+            hyb_filter = HybFilter(**filter_options)
+        elif filter_options:
+            raise ValueError('Give either a HybFilter or filter options, not both')
+
+        return(self._add_step(filters = self.filters + (hyb_filter,)))
+
+    def select(self, *columns):
+        """Keep only the given columns of the reads, in the given order."""
+
+        self._check_not_grouped('select')
+
+        unknown_columns = [column for column in columns if column not in hyb_df_columns]
+        if unknown_columns:
+            raise ValueError('Unknown hyb columns %s' % ', '.join(unknown_columns))
+        if self.selected_columns is not None:
+            unselected_columns = [column for column in columns if column not in self.selected_columns]
+            if unselected_columns:
+                raise ValueError('Columns %s were not selected' % ', '.join(unselected_columns))
+
+        return(self._add_step(selected_columns = list(columns)))
+
+    def group_by_hybrid(self, unordered=False, orientations=False, level='transcript'):
+        """Group the reads by hybrid, so that count gives the summary of the hybrids.
+
+        The arguments are as for summarise.create_summary_dataframe.
+        """
+
+        self._check_not_grouped('group_by_hybrid')
+
+        return(self._add_step(count_options = {'unordered': unordered, 'orientations': orientations,
+                                               'level': level}))
+
+    def count(self):
+        """Count the reads, or the reads of each hybrid if the dataset is grouped by hybrid.
+
+        collect then returns the number of reads, or the summary dataframe given by
+        summarise.create_summary_dataframe.
+        """
+
+        if self.counted:
+            raise ValueError('The dataset is already counted')
+
+        return(self._add_step(counted = True))
+
+    def collect(self):
+        """Run the plan in one pass over the hyb file and return its result.
+
+        This is a dataframe of the selected columns of the reads that pass the filters, unless the dataset is
+        counted.
+        """
+
+        if self.count_options is not None and not self.counted:
+            raise ValueError('A dataset grouped by hybrid must be counted before it is collected')
+
+        hyb_df_chunks = self._iter_filtered_chunks()
+
+        if self.count_options is not None:
+            return(summarise_hybrid_counts(count_hybrids_in_chunks(hyb_df_chunks, **self.count_options)))
+
+        if self.counted:
+            return(sum(len(hyb_df) for hyb_df in hyb_df_chunks))
+
+        if self.selected_columns is not None:
+            hyb_df_chunks = (hyb_df[self.selected_columns] for hyb_df in hyb_df_chunks)
+        hyb_df = _concat_hyb_dataframes(list(hyb_df_chunks))
+
+        return(hyb_df.reset_index(drop = True))
+
+    def _iter_filtered_chunks(self):
+        """Yield the chunks of the hyb file, with only the columns of the plan and the reads that pass its filters."""
+
+        compact = self.compact or self.counted
+        hyb_df_chunks = load_hyb_dataframe(self.hyb_filepath, chunksize = self.chunksize, compact = compact,
+                                           engine = self.engine, columns = self.columns)
+
+        for hyb_df in hyb_df_chunks:
+            for hyb_filter in self.filters:
+                hyb_df = hyb_df[hyb_filter.mask(hyb_df)]
+            yield hyb_df
+
+    def _check_not_grouped(self, method):
+        if self.count_options is not None or self.counted:
+            raise ValueError('%s cannot follow group_by_hybrid or count' % method)
+
+    def _add_step(self, **changes):
+        dataset = copy.copy(self)
+        dataset.__dict__.update(changes)
+
+        return(dataset)
@@ -0,0 +1,233 @@
+"""dedup.py: Deduplication of hyb file reads by hashes of their sequences."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import tempfile
+
+
+DEDUP_KEYS = ['sequence', 'coordinates']
+
+HASH_BITS = [64, 128]
+
+# The columns hashed for each deduplication key. With 'coordinates', reads with the same sequence are only
+# duplicates if their bits also map to the same places.
+dedup_columns = {
+    'sequence': ['read_sequence'],
+    'coordinates': ['read_sequence',
+                    'bit1-description', 'bit1-transcript_coordinates_start', 'bit1-transcript_coordinates_stop',
+                    'bit2-description', 'bit2-transcript_coordinates_start', 'bit2-transcript_coordinates_stop'],
+}
+
+# Each 64 bits of a hash come from hashing the columns with a different key.
+hash_keys = ['hybtools.dedup.0', 'hybtools.dedup.1']
+
+hash_128_dtype = np.dtype([('high', 'u8'), ('low', 'u8')])
+
+
+class ReadDeduplicator(object):
+    """A set of the hashes of the reads seen so far, used to find the first occurrence of each read.
+
+    Reads are hashed to 64 or 128 bit digests of the columns of the deduplication key, as described for
+    hash_reads, and the digests are kept in a sorted NumPy array. With 64 bit hashes, two of a billion distinct
+    reads have about a 3% chance of sharing a hash, and one of them being dropped; 128 bit hashes make this
+    negligible at twice the memory.
+
+    Once more than max_hashes digests are held in memory, they are spilled to n_partitions sorted files in a
+    temporary directory in spill_dir (by default the system temporary directory), partitioned by their leading
+    bits. Later reads are looked up in the partition files, which are memory mapped, so memory use is bounded by
+    max_hashes whatever the number of distinct reads. The spill files are removed by close, or at the end of a
+    with block.
+
+    The deduplicator can be passed to hyb_filter.filter_hyb_lines in place of a hyb_filter.HybFilter, to keep the
+    first occurrence of each read. raw_count and unique_count are the numbers of reads seen and kept so far.
+    """
+
+    def __init__(self, key='sequence', hash_bits=64, max_hashes=1 << 24, spill_dir=None, n_partitions=64):
+        if key not in DEDUP_KEYS:
+            raise ValueError('Unknown deduplication key %r. Choose from %s' % (key, ', '.join(DEDUP_KEYS)))
+        if hash_bits not in HASH_BITS:
+            raise ValueError('Hashes must have 64 or 128 bits, not %r' % hash_bits)
+
+        self.key = key
+        self.hash_bits = hash_bits
+        self.max_hashes = max_hashes
+        self.spill_dir = spill_dir
+        self.n_partitions = n_partitions
+        self.raw_count = 0
+        self.unique_count = 0
+        self._hashes = np.zeros(0, dtype = _get_hash_dtype(hash_bits))
+        self._spill_directory = None
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def columns(self):
+        """The names of the hyb dataframe columns that are hashed."""
+
+        return(dedup_columns[self.key])
+
+    @property
+    def spilled(self):
+        """Whether the hashes have been spilled to disk."""
+
+        return(self._spill_directory is not None)
+
+    def mask(self, hyb_df):
+        """Get a boolean array that is True for the rows of a hyb dataframe whose reads have not been seen before.
+
+        Within the dataframe, only the first row of each read is True. The reads are added to the set, so the
+        chunks of a hyb file must be passed in order.
+        """
+
+        return(self.add(hash_reads(hyb_df, self.key, self.hash_bits)))
+
+    def add(self, hashes):
+        """Add an array of read hashes to the set, and get a boolean array that is True for the first occurrence of
+        each hash that was not already in the set."""
+
+        unique_hashes, first_rows = np.unique(hashes, return_index = True)
+
+        seen = _contains(self._hashes, unique_hashes)
+        if self.spilled:
+            seen |= self._contains_spilled(unique_hashes)
+
+        mask = np.zeros(len(hashes), dtype=bool)
+        mask[first_rows[~seen]] = True
+
+        new_hashes = unique_hashes[~seen]
+        self._hashes = np.concatenate([self._hashes, new_hashes])
+        self._hashes.sort(kind = 'mergesort')
+
+        self.raw_count += len(hashes)
+        self.unique_count += len(new_hashes)
+
+        if len(self._hashes) > self.max_hashes:
+            self._spill()
+
+        return(mask)
+
+    def close(self):
+        """Remove the spill files, if any."""
+
+        if self._spill_directory is not None:
+            shutil.rmtree(self._spill_directory, ignore_errors = True)
+            self._spill_directory = None
+
+    def _spill(self):
+        """Merge the hashes held in memory into the partition files, one partition at a time."""
+
+        if self._spill_directory is None:
+            self._spill_directory = tempfile.mkdtemp(prefix = 'hybtools-dedup-', dir = self.spill_dir)
+
+        partitions = self._get_partitions(self._hashes)
+        bounds = np.searchsorted(partitions, np.arange(self.n_partitions + 1))
+
+        for partition in np.flatnonzero(np.diff(bounds)):
+            partition_hashes = np.concatenate([self._load_partition(partition),
+                                               self._hashes[bounds[partition]:bounds[partition + 1]]])
+            partition_hashes.sort(kind = 'mergesort')
+            np.save(self._get_partition_filepath(partition), partition_hashes)
+
+        self._hashes = self._hashes[:0]
+
+    def _contains_spilled(self, unique_hashes):
+        """Look up sorted hashes in the partition files."""
+
+        seen = np.zeros(len(unique_hashes), dtype=bool)
+
+        partitions = self._get_partitions(unique_hashes)
+        bounds = np.searchsorted(partitions, np.arange(self.n_partitions + 1))
+
+        for partition in np.flatnonzero(np.diff(bounds)):
+            start, stop = bounds[partition], bounds[partition + 1]
+            seen[start:stop] = _contains(self._load_partition(partition, mmap_mode = 'r'), unique_hashes[start:stop])
+
+        return(seen)
+
+    def _get_partitions(self, hashes):
+        """Get the partition of each hash from its leading bits. Sorted hashes have sorted partitions."""
+
+        leading_bits = hashes['high'] if self.hash_bits == 128 else hashes
+
+        return((leading_bits // np.uint64(-(-(1 << 64) // self.n_partitions))).astype('int64'))
+
+    def _get_partition_filepath(self, partition):
+        return(os.path.join(self._spill_directory, 'partition-%04d.npy' % partition))
+
+    def _load_partition(self, partition, mmap_mode=None):
+        partition_filepath = self._get_partition_filepath(partition)
+
+        if not os.path.exists(partition_filepath):
+            return(self._hashes[:0])
+
+        return(np.load(partition_filepath, mmap_mode = mmap_mode))
+
+
+def hash_reads(hyb_df, key='sequence', hash_bits=64):
+    """Hash the reads of a hyb dataframe to fixed-width digests of the columns of a deduplication key.
+
+    Returns an array of uint64 hashes, or with hash_bits=128 a structured array with the uint64 fields high and
+    low. Reads with equal values in the columns of the key have equal hashes, whether the dataframe was loaded
+    with compact dtypes or not.
+    """
+
+    key_df = hyb_df[dedup_columns[key]].copy()
+
+    for column in key_df.columns:
+        if column.endswith('coordinates_start') or column.endswith('coordinates_stop'):
+            # Missing coordinates are float NaN, which cannot be cast to int64, so they are given the coordinate -1.
+            key_df[column] = key_df[column].fillna(-1).astype('int64')
+
+    hashes = [pd.util.hash_pandas_object(key_df, index = False, hash_key = hash_key).values
+              for hash_key in hash_keys[:hash_bits // 64]]
+
+    if hash_bits == 64:
+        return(hashes[0])
+
+    hashes_128 = np.empty(len(key_df), dtype = hash_128_dtype)
+    hashes_128['high'], hashes_128['low'] = hashes
+
+    return(hashes_128)
+
+
+def _get_hash_dtype(hash_bits):
+    return(np.dtype('uint64') if hash_bits == 64 else hash_128_dtype)
+
+
+def _contains(sorted_hashes, hashes):
+    """Get a boolean array that is True for the hashes that are in a sorted array of hashes."""
+
+    if len(sorted_hashes) == 0:
+        return(np.zeros(len(hashes), dtype=bool))
+
+    positions = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+
+    return(np.asarray(sorted_hashes[positions] == hashes))
@@ -0,0 +1,64 @@
+"""descriptions.py: Parsing of the bit descriptions of hyb files."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import collections
+import functools
+import numpy as np
+
+
+LEVELS = ['transcript', 'gene', 'biotype']
+
+Description = collections.namedtuple('Description', ['id', 'transcript', 'gene', 'biotype'])
+
+
+@functools.lru_cache(maxsize=1 << 20)
+def parse_description(description):
+    """Split a bit description of the form id_transcript_gene_biotype into its fields.
+
+    For example, snoID0273_UnsplicedGene_SNORD3A_snoRNA has the gene SNORD3A and the biotype snoRNA. Any extra
+    underscores are taken to be part of the gene name. A description with fewer than four fields is used whole as
+    the gene name, with its last field as the biotype. Results are cached, as each description is parsed once for
+    every chunk of a hyb file.
+    """
+
+    fields = description.split('_')
+
+    if len(fields) < 4:
+        return(Description(description, description, description, fields[-1]))
+
+    return(Description(fields[0], fields[1], '_'.join(fields[2:-1]), fields[-1]))
+
+
+def get_description_levels(descriptions, level):
+    """Get the transcript, gene or biotype of each of an array of distinct descriptions.
+
+    At the transcript level the descriptions are returned unchanged.
+    """
+
+    if level not in LEVELS:
+        raise ValueError('Unknown level %r. Choose from %s' % (level, ', '.join(LEVELS)))
+
+    if level == 'transcript':
+        return(descriptions)
+
+    return(np.array([getattr(parse_description(description), level) for description in descriptions], dtype=object))
@@ -0,0 +1,259 @@
+"""hyb_cache.py: On-disk cache of parsed hyb dataframes."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import collections
+import hashlib
+import numpy as np
+import os
+import pandas as pd
+
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = '.hybcache.npz'
+
+# The content hash covers this many evenly spaced blocks of the hyb file, including the first and last blocks,
+# so that checking the cache does not mean reading the whole file.
+FINGERPRINT_BLOCKS = 16
+FINGERPRINT_BLOCK_SIZE = 1 << 16
+
+
+class HybCache(object):
+    """Settings for the cache of parsed hyb dataframes.
+
+    Each hyb file is cached in an npz column store, which is written the first time the file is loaded and reused
+    for as long as the size, modification time and content hash of the file are unchanged. Cache files are
+    written next to the hyb files, or in cache_dir if given. If rebuild is True, existing cache files are ignored
+    and overwritten. Strings are stored as UTF-8 bytes rather than pickled objects, and cache files are loaded
+    without unpickling, so a cache file written by someone else cannot run code.
+    """
+
+    def __init__(self, cache_dir=None, rebuild=False):
+        self.cache_dir = cache_dir
+        self.rebuild = rebuild
+
+    def get_cache_filepath(self, hyb_filepath):
+        """Get the path of the cache file for a hyb file."""
+
+        hyb_filepath = os.path.abspath(hyb_filepath)
+
+        if self.cache_dir is None:
+            return(hyb_filepath + CACHE_SUFFIX)
+
+        path_hash = hashlib.sha1(hyb_filepath.encode('utf-8')).hexdigest()[:16]
+        return(os.path.join(self.cache_dir, '%s.%s%s' % (os.path.basename(hyb_filepath), path_hash, CACHE_SUFFIX)))
+
+    def load(self, hyb_filepath, compact):
+        """Load the cached dataframe for a hyb file, or return None if there is no valid cache file."""
+
+        cache_filepath = self.get_cache_filepath(hyb_filepath)
+
+        if self.rebuild or not os.path.exists(cache_filepath):
+            return(None)
+
+        try:
+            with np.load(cache_filepath, allow_pickle=False) as cache:
+                if int(cache['version']) != CACHE_VERSION or bool(cache['compact']) != compact or \
+                        str(cache['fingerprint']) != fingerprint_hyb_file(hyb_filepath):
+                    return(None)
+                return(_read_columns(cache))
+        except (IOError, OSError, KeyError, ValueError):
+            return(None)
+
+    def save(self, hyb_filepath, compact, hyb_df):
+        """Save the parsed dataframe for a hyb file to its cache file."""
+
+        cache_filepath = self.get_cache_filepath(hyb_filepath)
+
+        if self.cache_dir is not None and not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        arrays = _write_columns(hyb_df)
+        arrays['version'] = np.array(CACHE_VERSION)
+        arrays['compact'] = np.array(compact)
+        arrays['fingerprint'] = np.array(fingerprint_hyb_file(hyb_filepath))
+
+        temporary_filepath = '%s.%d.tmp' % (cache_filepath, os.getpid())
+        with open(temporary_filepath, 'wb') as cache_file:
+            np.savez(cache_file, **arrays)
+        os.replace(temporary_filepath, cache_filepath)
+
+
+class MemoryHybCache(object):
+    """An in-memory cache of parsed hyb dataframes, used by the hybtools serve daemon.
+
+    It has the load and save methods of HybCache, so it can be passed as the cache of load_hyb_dataframe and the
+    commands. Other values derived from a hyb file, such as rendered summaries, can be kept with get and put.
+    Each entry is checked against the fingerprint of its hyb file when it is used, and dropped if the file has
+    changed. When the entries take up more than memory_budget bytes, the least recently used entries are evicted.
+    """
+
+    def __init__(self, memory_budget):
+        self.memory_budget = memory_budget
+        self.nbytes = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return(len(self._entries))
+
+    def load(self, hyb_filepath, compact):
+        """Get the cached dataframe for a hyb file, or return None if it is not cached or the file has changed."""
+
+        return(self.get(('dataframe', compact), hyb_filepath))
+
+    def save(self, hyb_filepath, compact, hyb_df):
+        """Cache the parsed dataframe for a hyb file."""
+
+        self.put(('dataframe', compact), hyb_filepath, hyb_df, int(hyb_df.memory_usage(deep = True).sum()))
+
+    def get(self, key, hyb_filepath):
+        """Get the value cached under key for a hyb file, or return None if there is none or the file has changed."""
+
+        entry_key = (os.path.abspath(hyb_filepath), key)
+
+        if entry_key not in self._entries:
+            return(None)
+
+        fingerprint, value, nbytes = self._entries[entry_key]
+        if fingerprint != fingerprint_hyb_file(hyb_filepath):
+            self._remove(entry_key)
+            return(None)
+
+        self._entries.move_to_end(entry_key)
+
+        return(value)
+
+    def put(self, key, hyb_filepath, value, nbytes):
+        """Cache a value of nbytes bytes under key for a hyb file, evicting least recently used entries to make room.
+
+        Values larger than the memory budget are not cached.
+        """
+
+        entry_key = (os.path.abspath(hyb_filepath), key)
+
+        if entry_key in self._entries:
+            self._remove(entry_key)
+
+        if nbytes > self.memory_budget:
+            return
+
+        while self.nbytes + nbytes > self.memory_budget:
+            self._remove(next(iter(self._entries)))
+
+        self._entries[entry_key] = (fingerprint_hyb_file(hyb_filepath), value, nbytes)
+        self.nbytes += nbytes
+
+    def _remove(self, entry_key):
+        self.nbytes -= self._entries.pop(entry_key)[2]
+
+
+def fingerprint_hyb_file(hyb_filepath):
+    """Hash the size, modification time and a sample of the content of a hyb file."""
+
+    stat = os.stat(hyb_filepath)
+
+    fingerprint = hashlib.sha1(('%d:%d' % (stat.st_size, stat.st_mtime_ns)).encode('ascii'))
+
+    with open(hyb_filepath, 'rb') as hyb_file:
+        last_block_start = max(stat.st_size - FINGERPRINT_BLOCK_SIZE, 0)
+        for i in range(FINGERPRINT_BLOCKS):
+            hyb_file.seek(last_block_start * i // (FINGERPRINT_BLOCKS - 1))
+            fingerprint.update(hyb_file.read(FINGERPRINT_BLOCK_SIZE))
+
+    return(fingerprint.hexdigest())
+
+
+def _write_columns(hyb_df):
+    """Convert the columns of a dataframe to a dict of arrays for an npz file.
+
+    Categoricals are stored as codes and categories, and string columns as described for _write_strings.
+    """
+
+    arrays = {}
+    _write_strings(arrays, 'columns', hyb_df.columns)
+
+    for i, column in enumerate(hyb_df.columns):
+        values = hyb_df[column]
+        if values.dtype.name == 'category':
+            arrays['%d.codes' % i] = values.cat.codes.values
+            _write_strings(arrays, '%d.categories' % i, values.cat.categories)
+        elif values.dtype == object:
+            _write_strings(arrays, '%d.strings' % i, values.values)
+        else:
+            arrays['%d.values' % i] = values.values
+
+    return(arrays)
+
+
+def _read_columns(cache):
+    """Rebuild a dataframe from the arrays of an npz file."""
+
+    columns = list(_read_strings(cache, 'columns'))
+
+    data = {}
+
+    for i, column in enumerate(columns):
+        if '%d.codes' % i in cache.files:
+            data[column] = pd.Categorical.from_codes(cache['%d.codes' % i], _read_strings(cache, '%d.categories' % i))
+        elif '%d.strings.offsets' % i in cache.files:
+            data[column] = _read_strings(cache, '%d.strings' % i)
+        else:
+            data[column] = cache['%d.values' % i]
+
+    return(pd.DataFrame(data, columns=columns))
+
+
+def _write_strings(arrays, name, strings):
+    """Add an array of strings, which may be missing, to a dict of arrays for an npz file, without pickling.
+
+    The strings are stored as the arrays name.data, their UTF-8 bytes joined together, name.offsets, the byte
+    offset of the start of each string followed by the total length, and name.missing, which is True for missing
+    values. Other values are stored as their str.
+    """
+
+    missing = np.asarray(pd.isnull(strings), dtype=bool)
+    encoded = [b'' if is_missing else str(string).encode('utf-8') for string, is_missing in zip(strings, missing)]
+
+    offsets = np.zeros(len(encoded) + 1, dtype='int64')
+    offsets[1:] = np.cumsum([len(string) for string in encoded])
+
+    arrays[name + '.data'] = np.frombuffer(b''.join(encoded), dtype='uint8')
+    arrays[name + '.offsets'] = offsets
+    arrays[name + '.missing'] = missing
+
+
+def _read_strings(arrays, name):
+    """Get an object array of the strings written by _write_strings, with NaN for missing values."""
+
+    data = arrays[name + '.data'].tobytes()
+    offsets = arrays[name + '.offsets'].tolist()
+    text = data.decode('utf-8')
+
+    strings = np.empty(len(offsets) - 1, dtype=object)
+    if len(text) == len(data):
+        # Byte offsets are character offsets in ASCII text, so the text is only decoded once.
+        strings[:] = [text[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+    else:
+        strings[:] = [data[start:stop].decode('utf-8') for start, stop in zip(offsets[:-1], offsets[1:])]
+    strings[arrays[name + '.missing']] = np.nan
+
+    return(strings)
@@ -0,0 +1,159 @@
+"""hyb_filter.py: Streaming filters of the lines of hyb files."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import io
+import itertools
+import numpy as np
+import pandas as pd
+import re
+
+from hybtools.compression import open_file
+from hybtools.hyb_io import hyb_df_columns
+
+
+class HybFilter(object):
+    """Predicates on the hybrids of a hyb file, all of which must hold for a hybrid to be kept.
+
+    * min_energy and max_energy bound predicted_binding_energy.
+    * max_mapping_score bounds the mapping scores of both bits.
+    * description is a regular expression searched for in the bit descriptions. It must match bit 1 or bit 2, or
+      only the given bit if bit is 1 or 2.
+    * regions is a list of (description, start, stop) tuples. A hybrid is kept if either bit is on one of the
+      descriptions with transcript coordinates overlapping start to stop.
+
+    Only the columns that the predicates use are parsed.
+    """
+
+    def __init__(self, min_energy=None, max_energy=None, max_mapping_score=None, description=None, bit=None,
+                 regions=()):
+        self.min_energy = min_energy
+        self.max_energy = max_energy
+        self.max_mapping_score = max_mapping_score
+        self.description = re.compile(description) if description is not None else None
+        self.bits = [1, 2] if bit is None else [bit]
+        self.regions = list(regions)
+
+    @property
+    def columns(self):
+        """The names of the hyb dataframe columns that the predicates use."""
+
+        columns = []
+
+        if self.min_energy is not None or self.max_energy is not None:
+            columns.append('predicted_binding_energy')
+        for bit in [1, 2]:
+            if self.max_mapping_score is not None:
+                columns.append('bit%d-mapping_score' % bit)
+            if (self.description is not None and bit in self.bits) or self.regions:
+                columns.append('bit%d-description' % bit)
+            if self.regions:
+                columns += ['bit%d-transcript_coordinates_start' % bit, 'bit%d-transcript_coordinates_stop' % bit]
+
+        return([column for column in hyb_df_columns if column in columns])
+
+    def mask(self, hyb_df):
+        """Get a boolean array that is True for the rows of a hyb dataframe that pass the predicates.
+
+        The dataframe only needs the columns listed in columns.
+        """
+
+        mask = np.ones(len(hyb_df), dtype=bool)
+
+        if self.min_energy is not None:
+            mask &= hyb_df['predicted_binding_energy'].values >= self.min_energy
+        if self.max_energy is not None:
+            mask &= hyb_df['predicted_binding_energy'].values <= self.max_energy
+
+        if self.max_mapping_score is not None:
+            for bit in [1, 2]:
+                mask &= hyb_df['bit%d-mapping_score' % bit].values <= self.max_mapping_score
+
+        if self.description is not None:
+            mask &= np.logical_or.reduce([self._match_descriptions(hyb_df['bit%d-description' % bit])
+                                          for bit in self.bits])
+
+        if self.regions:
+            mask &= np.logical_or.reduce([self._overlap_region(hyb_df, bit, *region)
+                                          for bit in [1, 2] for region in self.regions])
+
+        return(mask)
+
+    def _match_descriptions(self, descriptions):
+        """Match the description pattern against each distinct description once."""
+
+        codes, uniques = pd.factorize(descriptions)
+        matches = np.array([self.description.search(str(unique)) is not None for unique in uniques], dtype=bool)
+
+        return(matches[codes] & (codes >= 0))
+
+    def _overlap_region(self, hyb_df, bit, description, start, stop):
+        return((hyb_df['bit%d-description' % bit].values == description) &
+               (hyb_df['bit%d-transcript_coordinates_start' % bit].values <= stop) &
+               (hyb_df['bit%d-transcript_coordinates_stop' % bit].values >= start))
+
+
+def filter_hyb_lines(hyb_filepath, hyb_filter, chunksize=100000):
+    """Yield blocks of the lines of a hyb file, or stdin if hyb_filepath is '-', that pass a HybFilter.
+
+    The file is read chunksize lines at a time, and only the columns that the filter uses are parsed, so memory
+    use does not depend on the size of the file. The lines that pass are yielded as bytes, exactly as they are in
+    the file. Comment lines are kept and blank lines are dropped. Compressed files are decompressed as they are
+    read.
+    """
+
+    columns = hyb_filter.columns
+    column_positions = [hyb_df_columns.index(column) for column in columns]
+
+    with open_file(hyb_filepath) as hyb_file:
+        while True:
+            lines = list(itertools.islice(hyb_file, chunksize))
+            if not lines:
+                return
+
+            is_data = [bool(line.strip()) and not line.startswith(b'#') for line in lines]
+            data_lines = list(itertools.compress(lines, is_data))
+
+            if columns and data_lines:
+                mask = iter(hyb_filter.mask(_read_hyb_columns(data_lines, columns, column_positions)))
+            else:
+                mask = itertools.repeat(True)
+
+            keep = [next(mask) if data else line.startswith(b'#') for line, data in zip(lines, is_data)]
+            block = b''.join(itertools.compress(lines, keep))
+
+            if block:
+                yield block
+
+
+def _read_hyb_columns(data_lines, columns, column_positions):
+    """Parse some of the columns of a list of hyb file lines."""
+
+    data = b''.join(line if line.endswith(b'\n') else line + b'\n' for line in data_lines)
+
+    hyb_df = pd.read_csv(io.BytesIO(data), sep='\t', header=None, comment='#', usecols=column_positions)
+    hyb_df.columns = [hyb_df_columns[position] for position in hyb_df.columns]
+
+    assert len(hyb_df) == len(data_lines), \
+        "Could not filter the hyb file: read %d rows from %d lines" % (len(hyb_df), len(data_lines))
+
+    return(hyb_df[columns])
@@ -0,0 +1,284 @@
+"""hyb_index.py: Sidecar indexes of the lines of hyb files, for random access by read id or bit description."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import io
+import json
+import numpy as np
+import os
+import pandas as pd
+import shutil
+
+from hybtools.compression import detect_compression
+from hybtools.hyb_cache import fingerprint_hyb_file
+
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.hybidx'
+
+READ_SIZE = 1 << 26
+
+# Columns of a hyb file that are indexed: unique_sequence_id, bit1-description and bit2-description.
+INDEXED_COLUMNS = [0, 3, 9]
+
+
+class HybIndex(object):
+    """Index of the lines of a hyb file, loaded from an index directory written by build_hyb_index.
+
+    The index directory holds one .npy file per array, which are memory mapped, so that opening the index and
+    looking up a few keys only reads the pages of the arrays that the lookups touch:
+
+    * offsets: the byte offset of each data line of the hyb file, in file order.
+    * id_hashes and id_rows: the sorted 64-bit hashes of the read ids, and the line number of each hash.
+    * descriptions: the sorted distinct bit descriptions.
+    * bit1_rows and bit1_row_ptr: the line numbers of each description in bit 1, grouped by description, with
+      those of descriptions[i] in bit1_rows[bit1_row_ptr[i]:bit1_row_ptr[i + 1]]. bit2_rows and bit2_row_ptr are
+      the same for bit 2.
+    """
+
+    def __init__(self, hyb_filepath, index_filepath=None):
+        self.hyb_filepath = hyb_filepath
+        self.index_filepath = index_filepath or get_index_filepath(hyb_filepath)
+
+        with open(os.path.join(self.index_filepath, 'index.json')) as info_file:
+            info = json.load(info_file)
+
+        if info['version'] != INDEX_VERSION or info['fingerprint'] != fingerprint_hyb_file(hyb_filepath):
+            raise ValueError('The index %s is out of date. Rebuild it with hybtools index' % self.index_filepath)
+
+        self.n_lines = info['n_lines']
+        self._arrays = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.index_filepath, name + '.npy'), mmap_mode='r')
+        return(self._arrays[name])
+
+    def find_sequence_ids(self, unique_sequence_ids):
+        """Get the sorted line numbers of the hyb file lines with any of the given read ids.
+
+        Hash collisions are resolved by checking the read id of each candidate line.
+        """
+
+        unique_sequence_ids = list(unique_sequence_ids)
+        if not unique_sequence_ids:
+            return(np.zeros(0, dtype='int64'))
+
+        hashes = _hash_strings(unique_sequence_ids)
+        starts = np.searchsorted(self.id_hashes, hashes, side='left')
+        stops = np.searchsorted(self.id_hashes, hashes, side='right')
+        rows = np.concatenate([self.id_rows[start:stop] for start, stop in zip(starts, stops)]).astype('int64')
+        rows = np.unique(rows)
+
+        wanted = set(unique_sequence_ids)
+        keep = [line.split(b'\t', 1)[0].decode('utf-8') in wanted for line in self.read_lines(rows)]
+        return(rows[np.array(keep, dtype=bool)])
+
+    def find_descriptions(self, descriptions, bit=None):
+        """Get the sorted line numbers of the hyb file lines with any of the given descriptions.
+
+        If bit is 1 or 2, only that bit is matched, otherwise either bit is.
+        """
+
+        bits = [1, 2] if bit is None else [bit]
+
+        # Descriptions longer than the widest indexed description cannot match, and would be truncated to it.
+        encoded_descriptions = [description.encode('utf-8') for description in descriptions]
+        encoded_descriptions = np.array([description for description in encoded_descriptions
+                                         if len(description) <= self.descriptions.dtype.itemsize],
+                                        dtype=self.descriptions.dtype)
+
+        rows = [np.zeros(0, dtype='int64')]
+
+        positions = np.searchsorted(self.descriptions, encoded_descriptions)
+        for description, position in zip(encoded_descriptions, positions):
+            if position == len(self.descriptions) or self.descriptions[position] != description:
+                continue
+            for bit in bits:
+                row_ptr = getattr(self, 'bit%d_row_ptr' % bit)
+                rows.append(getattr(self, 'bit%d_rows' % bit)[row_ptr[position]:row_ptr[position + 1]])
+
+        return(np.unique(np.concatenate(rows).astype('int64')))
+
+    def find_hybrids(self, hybrid_descriptions):
+        """Get the sorted line numbers of the hyb file lines of any of the given hybrids, given as 'bit1:::bit2'."""
+
+        rows = [np.zeros(0, dtype='int64')]
+
+        for hybrid_description in hybrid_descriptions:
+            bit1_description, separator, bit2_description = hybrid_description.partition(':::')
+            if not separator:
+                raise ValueError('Hybrid descriptions must have the form bit1:::bit2, not %r' % hybrid_description)
+            rows.append(np.intersect1d(self.find_descriptions([bit1_description], bit=1),
+                                       self.find_descriptions([bit2_description], bit=2), assume_unique=True))
+
+        return(np.unique(np.concatenate(rows)))
+
+    def read_lines(self, rows):
+        """Yield the lines of the hyb file with the given line numbers, as bytes without the line ending."""
+
+        with open(self.hyb_filepath, 'rb') as hyb_file:
+            for row in rows:
+                hyb_file.seek(int(self.offsets[row]))
+                yield hyb_file.readline().rstrip(b'\r\n')
+
+
+def get_index_filepath(hyb_filepath):
+    """Get the path of the index directory of a hyb file, which is next to the hyb file."""
+
+    return(os.path.abspath(hyb_filepath) + INDEX_SUFFIX)
+
+
+def build_hyb_index(hyb_filepath, index_filepath=None):
+    """Index the lines of an uncompressed hyb file in a single pass, and return the index.
+
+    The index is written to index_filepath, which defaults to the hyb file path followed by .hybidx. The hyb file is
+    read a block at a time, so memory use depends on the number of lines rather than the size of the file.
+    """
+
+    if hyb_filepath == '-' or detect_compression(hyb_filepath) is not None:
+        raise ValueError('Only uncompressed hyb files can be indexed, as lines are looked up by their byte offsets')
+
+    index_filepath = index_filepath or get_index_filepath(hyb_filepath)
+
+    offsets = []
+    id_hashes = []
+    bit_codes = {1: [], 2: []}
+    description_codes = {}
+
+    for block_offset, block in _iter_hyb_file_blocks(hyb_filepath):
+        line_starts = _find_data_line_starts(block)
+        if len(line_starts) == 0:
+            continue
+
+        hyb_df = pd.read_csv(io.BytesIO(block), sep='\t', header=None, comment='#', skip_blank_lines=True,
+                             usecols=INDEXED_COLUMNS, dtype=str, na_filter=False, encoding='utf-8')
+        assert len(hyb_df) == len(line_starts), \
+            "Could not index the hyb file lines from byte %d: found %d lines but read %d rows" % \
+            (block_offset, len(line_starts), len(hyb_df))
+
+        offsets.append(line_starts + block_offset)
+        id_hashes.append(_hash_strings(hyb_df[INDEXED_COLUMNS[0]].values))
+
+        # Map the descriptions of each block to codes that are shared by all blocks.
+        for bit, column in [(1, INDEXED_COLUMNS[1]), (2, INDEXED_COLUMNS[2])]:
+            codes, uniques = pd.factorize(hyb_df[column].values)
+            unique_codes = np.array([description_codes.setdefault(description, len(description_codes))
+                                     for description in uniques], dtype='int64')
+            bit_codes[bit].append(unique_codes[codes])
+
+    offsets = np.concatenate(offsets or [np.zeros(0, dtype='int64')]).astype('uint64')
+    id_hashes = np.concatenate(id_hashes or [np.zeros(0, dtype='uint64')])
+    row_dtype = 'uint32' if len(offsets) < 2 ** 32 else 'uint64'
+
+    descriptions = np.array(list(description_codes), dtype=object)
+    description_order = np.argsort(descriptions, kind='mergesort')
+    description_ranks = np.empty(len(descriptions), dtype='int64')
+    description_ranks[description_order] = np.arange(len(descriptions))
+
+    id_rows = np.argsort(id_hashes, kind='mergesort')
+    arrays = {
+        'offsets': offsets,
+        'id_hashes': id_hashes[id_rows],
+        'id_rows': id_rows.astype(row_dtype),
+        'descriptions': np.array([description.encode('utf-8') for description in descriptions[description_order]],
+                                 dtype=bytes),
+    }
+
+    for bit in [1, 2]:
+        codes = description_ranks[np.concatenate(bit_codes[bit] or [np.zeros(0, dtype='int64')])]
+        arrays['bit%d_rows' % bit] = np.argsort(codes, kind='mergesort').astype(row_dtype)
+        arrays['bit%d_row_ptr' % bit] = np.concatenate([[0], np.cumsum(np.bincount(codes,
+                                                                                   minlength=len(descriptions)))])
+
+    info = {'version': INDEX_VERSION, 'fingerprint': fingerprint_hyb_file(hyb_filepath), 'n_lines': len(offsets)}
+
+    _write_index(index_filepath, arrays, info)
+
+    return(HybIndex(hyb_filepath, index_filepath))
+
+
+def _iter_hyb_file_blocks(hyb_filepath):
+    """Yield the byte offset and contents of successive blocks of a hyb file, each ending at a line end."""
+
+    with open(hyb_filepath, 'rb') as hyb_file:
+        block_offset = 0
+        remainder = b''
+        while True:
+            data = hyb_file.read(READ_SIZE)
+            if not data:
+                break
+            block = remainder + data
+            end = block.rfind(b'\n') + 1
+            if end == 0:
+                remainder = block
+                continue
+            yield block_offset, block[:end]
+            block_offset += end
+            remainder = block[end:]
+
+        if remainder:
+            yield block_offset, remainder
+
+
+def _find_data_line_starts(block):
+    """Get the offsets in a block of the lines that are neither blank nor comments, as read by hyb_io."""
+
+    data = np.frombuffer(block, dtype='uint8')
+    line_ends = np.flatnonzero(data == ord('\n'))
+    line_starts = np.concatenate([[0], line_ends + 1])
+    if len(data) and data[-1] == ord('\n'):
+        line_starts = line_starts[:-1]
+    else:
+        line_ends = np.concatenate([line_ends, [len(data)]])
+
+    content_ends = line_ends - ((line_ends > line_starts) & (data[np.maximum(line_ends - 1, 0)] == ord('\r')))
+    first_bytes = data[np.minimum(line_starts, max(len(data) - 1, 0))]
+    keep = (content_ends > line_starts) & (first_bytes != ord('#'))
+
+    return(line_starts[keep].astype('int64'))
+
+
+def _hash_strings(strings):
+    """Hash strings to 64-bit integers, in the same way in every process and version."""
+
+    return(pd.util.hash_array(np.asarray(strings, dtype=object), categorize=False))
+
+
+def _write_index(index_filepath, arrays, info):
+    """Write the arrays of an index to a new directory, and then move it into place."""
+
+    temporary_filepath = '%s.%d.tmp' % (index_filepath, os.getpid())
+    if os.path.exists(temporary_filepath):
+        shutil.rmtree(temporary_filepath)
+    os.makedirs(temporary_filepath)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(temporary_filepath, name + '.npy'), array)
+    with open(os.path.join(temporary_filepath, 'index.json'), 'w') as info_file:
+        json.dump(info, info_file)
+
+    if os.path.exists(index_filepath):
+        shutil.rmtree(index_filepath)
+    os.replace(temporary_filepath, index_filepath)
@@ -21,8 +21,15 @@
 # ______________________________________________________________________________
 
 
+import collections
+import io
+import os
 import pandas as pd
-import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from pandas.errors import EmptyDataError
+
+from hybtools.compression import detect_compression, open_file
 
 
 hyb_df_columns = ['unique_sequence_id', 'read_sequence', 'predicted_binding_energy', 'bit1-description',
@@ -31,18 +38,405 @@ hyb_df_columns = ['unique_sequence_id', 'read_sequence', 'predicted_binding_ener
               'bit2-read_coordinates_start', 'bit2-read_coordinates_stop', 'bit2-transcript_coordinates_start',
               'bit2-transcript_coordinates_stop', 'bit2-mapping_score', 'annotations', 'comment']
 
+# Compact dtypes used when a hyb file is loaded with compact=True. Descriptions are drawn from a small set of
+# transcript names, so they are stored as categoricals. Coordinates are downcast to the smallest integer type
+# that holds them, unless a chunk has missing coordinates, which are left as float64 NaN. Energies and mapping
+# scores are stored as float32, so mapping scores below about 1e-45 are stored as 0. The remaining columns are left
+# for pandas to infer.
+hyb_df_dtypes = {
+    'predicted_binding_energy': 'float32',
+    'bit1-description': 'category',
+    'bit1-read_coordinates_start': 'int32',
+    'bit1-read_coordinates_stop': 'int32',
+    'bit1-transcript_coordinates_start': 'int32',
+    'bit1-transcript_coordinates_stop': 'int32',
+    'bit1-mapping_score': 'float32',
+    'bit2-description': 'category',
+    'bit2-read_coordinates_start': 'int32',
+    'bit2-read_coordinates_stop': 'int32',
+    'bit2-transcript_coordinates_start': 'int32',
+    'bit2-transcript_coordinates_stop': 'int32',
+    'bit2-mapping_score': 'float32',
+}
+
+# The compact dtypes given to the parser. Coordinates are parsed with the dtype pandas infers, so that a missing
+# coordinate does not abort the parse, and are downcast afterwards by _prepare_hyb_dataframe.
+_parse_dtypes = {column: dtype for column, dtype in hyb_df_dtypes.items() if dtype != 'int32'}
+
+# The parsers that load_hyb_dataframe can use. pandas is the reference implementation.
+ENGINES = ['pandas', 'pyarrow', 'threads']
+
+# Size of the blocks of a hyb file parsed by each thread of the threads and pyarrow engines.
+BLOCK_SIZE = 1 << 24
+
+
+def load_hyb_dataframe(hyb_filepath, chunksize=None, compact=False, cache=None, engine='pandas', columns=None):
+    """Import a hyb file as a dataframe.
+
+    If chunksize is given, an iterator over dataframes of at most chunksize rows is returned instead, so that
+    files which are too large to hold in memory can be processed a chunk at a time.
+
+    If compact is True, the columns are given the dtypes in hyb_df_dtypes rather than the dtypes inferred by
+    pandas. For 100,000 reads drawn from a few dozen transcript names, this halves the memory used by the
+    dataframe (as measured by ``DataFrame.memory_usage(deep=True)``), and shrinks the columns other than
+    unique_sequence_id and read_sequence about sevenfold. The saving grows with the number of reads per distinct
+    transcript name.
+
+    If cache is a hyb_cache.HybCache, the parsed dataframe is saved to an on-disk cache, which is used instead of
+    parsing the hyb file on later loads for as long as the file is unchanged. The cache is not used when reading
+    from stdin or in chunks, or when columns is given.
+
+    If columns is a list of names from hyb_df_columns, the dataframe only has those columns, in that order, and
+    the other columns are skipped by the parser rather than converted into values. Skipping read_sequence and
+    unique_sequence_id, the widest columns, roughly halves the time taken to parse a file. The annotations and
+    comment columns are optional in hyb files, so if either is requested the whole file is parsed.
+
+    gzip, BGZF and zstd compressed hyb files are decompressed as they are read; see compression.open_file.
+
+    engine chooses the parser, from ENGINES:
+
+    * 'pandas' parses the file with the single-threaded C parser of pandas.read_csv.
+    * 'pyarrow' parses blocks of the file in parallel with pyarrow.csv, which must be installed.
+    * 'threads' splits the file into blocks at line ends and parses them with pandas.read_csv in a pool of one
+      thread per CPU, as the pandas parser releases the GIL while it tokenizes.
+
+    All engines give the same dataframe, except that with chunksize the pyarrow and threads engines may split the
+    file into smaller chunks than the pandas engine, as their chunks do not span blocks, and that pyarrow parses
+    some floats, such as 4e-32, exactly where pandas' fast parser is one unit in the last place out.
+    """
+
+    if engine not in ENGINES:
+        raise ValueError('Unknown engine %r. Choose from %s' % (engine, ', '.join(ENGINES)))
+
+    if(hyb_filepath == "-" or columns is not None):
+        cache = None
+
+    usecols = _get_usecols(columns)
+
+    if chunksize is not None:
+        hyb_file = _open_hyb_file(hyb_filepath)
+        return(_iter_hyb_dataframe_chunks(hyb_file, chunksize, compact, close = hyb_file is not hyb_filepath,
+                                          engine = engine, columns = columns))
+
+    if cache is not None:
+        hyb_df = cache.load(hyb_filepath, compact)
+        if hyb_df is not None:
+            return(hyb_df)
+
+    hyb_file = _open_hyb_file(hyb_filepath)
+    try:
+        hyb_df = _read_hyb_csv(hyb_file, compact, engine = engine, usecols = usecols)
+    finally:
+        if hyb_file is not hyb_filepath:
+            hyb_file.close()
+
+    hyb_df = _prepare_hyb_dataframe(hyb_df, compact, columns)
+
+    if cache is not None:
+        cache.save(hyb_filepath, compact, hyb_df)
+
+    return(hyb_df)
+
+
+def find_hyb_file_ranges(hyb_filepath, n_ranges):
+    """Split a hyb file into at most n_ranges byte ranges of similar size, each starting at the start of a line.
+
+    Returns a list of (start, stop) byte offsets covering the whole file. The hyb file must not be compressed.
+    """
+
+    file_size = os.path.getsize(hyb_filepath)
+
+    boundaries = [0]
+
+    with open(hyb_filepath, 'rb') as hyb_file:
+        for i in range(1, n_ranges):
+            position = file_size * i // n_ranges
+            if position <= boundaries[-1]:
+                continue
+            hyb_file.seek(position - 1)
+            hyb_file.readline()
+            boundary = hyb_file.tell()
+            if boundaries[-1] < boundary < file_size:
+                boundaries.append(boundary)
+
+    boundaries.append(file_size)
+
+    return(list(zip(boundaries[:-1], boundaries[1:])))
+
+
+def load_hyb_dataframe_range(hyb_filepath, start, stop, chunksize=None, compact=False, engine='pandas',
+                             columns=None):
+    """Import the lines of a hyb file between two byte offsets as a dataframe.
+
+    The offsets should fall at the start of a line, as returned by find_hyb_file_ranges. The chunksize, compact,
+    engine and columns arguments are as for load_hyb_dataframe.
+    """
+
+    hyb_file = _HybFileRange(hyb_filepath, start, stop)
+
+    if chunksize is not None:
+        return(_iter_hyb_dataframe_chunks(hyb_file, chunksize, compact, close = True, engine = engine,
+                                          columns = columns))
+
+    with hyb_file:
+        hyb_df = _read_hyb_csv(hyb_file, compact, engine = engine, usecols = _get_usecols(columns))
+
+    return(_prepare_hyb_dataframe(hyb_df, compact, columns))
+
+
+class _HybFileRange(io.RawIOBase):
+    """Read-only binary file object exposing the bytes of a file between two offsets."""
+
+    def __init__(self, filepath, start, stop):
+        super(_HybFileRange, self).__init__()
+        self._file = open(filepath, 'rb')
+        self._file.seek(start)
+        self._remaining = stop - start
+
+    def readable(self):
+        return(True)
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        n_read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= n_read
+        return(n_read)
+
+    def close(self):
+        self._file.close()
+        super(_HybFileRange, self).close()
+
+
+def _open_hyb_file(hyb_filepath):
+    """Get the path of an uncompressed hyb file, or a binary file object for stdin or a compressed hyb file."""
+
+    if hyb_filepath != '-' and detect_compression(hyb_filepath) is None:
+        return(hyb_filepath)
+
+    return(open_file(hyb_filepath))
+
+
+def _iter_hyb_dataframe_chunks(hyb_filepath, chunksize, compact, close=False, engine='pandas', columns=None):
+    """Yield successive chunks of a hyb file as dataframes, closing the file afterwards if close is True."""
+
+    usecols = _get_usecols(columns)
+
+    try:
+        if engine == 'pandas':
+            reader = _read_hyb_csv(hyb_filepath, compact, chunksize = chunksize, usecols = usecols)
+        else:
+            reader = _iter_hyb_block_dataframes(hyb_filepath, compact, engine, chunksize, usecols)
+
+        for hyb_df in reader:
+            yield _prepare_hyb_dataframe(hyb_df, compact, columns)
+    finally:
+        if close:
+            hyb_filepath.close()
+
+
+def _read_hyb_csv(hyb_filepath, compact, engine='pandas', usecols=None, **kwargs):
+    """Call pandas.read_csv with the settings used for hyb files, or parse the file in blocks with another engine.
+
+    If usecols is a list of column positions, only those columns are parsed, and the columns of the dataframe are
+    labelled with their positions.
+    """
+
+    if engine != 'pandas':
+        return(_concat_hyb_dataframes(list(_iter_hyb_block_dataframes(hyb_filepath, compact, engine,
+                                                                      usecols = usecols))))
+
+    if usecols is not None:
+        kwargs['usecols'] = usecols
+
+    if compact:
+        kwargs['dtype'] = {i: _parse_dtypes[column] for i, column in enumerate(hyb_df_columns)
+                           if column in _parse_dtypes}
+
+    return(pd.read_csv(hyb_filepath, sep = '\t', header = None, comment = '#', skip_blank_lines=True, **kwargs))
+
+
+def _iter_hyb_block_dataframes(hyb_filepath, compact, engine, chunksize=None, usecols=None):
+    """Parse the blocks of a hyb file in a pool of threads, and yield the parsed blocks in file order.
+
+    Each parsed block is split into dataframes of at most chunksize rows if chunksize is given. Only twice as many
+    blocks as there are threads are read ahead, so memory use does not depend on the size of the file.
+    """
+
+    if engine == 'pyarrow':
+        _import_pyarrow_csv()
+
+    parse_block = _parse_hyb_block_with_pyarrow if engine == 'pyarrow' else _parse_hyb_block
+    n_threads = os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers = n_threads) as executor:
+        futures = collections.deque()
+        for block in _iter_hyb_blocks(hyb_filepath):
+            futures.append(executor.submit(parse_block, block, compact, usecols))
+            while len(futures) > 2 * n_threads or (futures and futures[0].done()):
+                for hyb_df in _split_hyb_dataframe(futures.popleft().result(), chunksize):
+                    yield hyb_df
+        while futures:
+            for hyb_df in _split_hyb_dataframe(futures.popleft().result(), chunksize):
+                yield hyb_df
+
+
+def _iter_hyb_blocks(hyb_filepath):
+    """Yield successive blocks of about BLOCK_SIZE bytes of a hyb file, each ending at a line end."""
+
+    hyb_file = open(hyb_filepath, 'rb') if isinstance(hyb_filepath, str) else hyb_filepath
+
+    try:
+        remainder = b''
+        while True:
+            data = hyb_file.read(BLOCK_SIZE)
+            if not data:
+                break
+            block = remainder + data
+            end = block.rfind(b'\n') + 1
+            remainder = block[end:]
+            if end > 0:
+                yield block[:end]
+
+        if remainder:
+            yield remainder
+    finally:
+        if hyb_file is not hyb_filepath:
+            hyb_file.close()
+
+
+def _parse_hyb_block(block, compact, usecols=None):
+    """Parse a block of hyb file lines with pandas.read_csv, or return None if it has no hyb lines."""
+
+    try:
+        return(_read_hyb_csv(io.BytesIO(block), compact, usecols = usecols))
+    except EmptyDataError:
+        return(None)
+
+
+def _parse_hyb_block_with_pyarrow(block, compact, usecols=None):
+    """Parse a block of hyb file lines with pyarrow.csv into the dataframe pandas.read_csv would give.
+
+    Comment lines are removed before parsing, wherever they are in the block, as a commented-out hyb line has as
+    many fields as any other. Columns that pandas would parse as floats, such as those left empty by a tab at the
+    end of each line, are converted to floats.
+    """
+
+    pyarrow = _import_pyarrow_csv()
+
+    if block.startswith(b'#') or b'\n#' in block:
+        block = b''.join(line for line in block.splitlines(True) if not line.startswith(b'#'))
+
+    if not block.strip():
+        return(None)
+
+    table = pyarrow.csv.read_csv(
+        io.BytesIO(block),
+        read_options = pyarrow.csv.ReadOptions(autogenerate_column_names = True, use_threads = False,
+                                               block_size = len(block) + 1),
+        parse_options = pyarrow.csv.ParseOptions(delimiter = '\t'),
+        convert_options = pyarrow.csv.ConvertOptions(
+            strings_can_be_null = True,
+            include_columns = ['f%d' % position for position in usecols] if usecols is not None else None))
+
+    hyb_df = table.to_pandas()
+    hyb_df.columns = usecols if usecols is not None else range(len(hyb_df.columns))
+
+    for column, field in zip(hyb_df.columns, table.schema):
+        if pyarrow.types.is_null(field.type):
+            hyb_df[column] = hyb_df[column].astype('float64')
+        elif compact and column < len(hyb_df_columns) and hyb_df_columns[column] in _parse_dtypes:
+            hyb_df[column] = hyb_df[column].astype(_parse_dtypes[hyb_df_columns[column]])
+
+    return(hyb_df)
+
+
+def _import_pyarrow_csv():
+    """Import pyarrow with its csv module, which the pyarrow engine requires."""
+
+    try:
+        import pyarrow
+        import pyarrow.csv
+    except ImportError:
+        raise ImportError('The pyarrow engine requires the pyarrow package')
+
+    return(pyarrow)
+
+
+def _split_hyb_dataframe(hyb_df, chunksize):
+    """Split a parsed block into dataframes of at most chunksize rows, numbered from 0."""
+
+    if hyb_df is None:
+        return
+
+    if chunksize is None:
+        yield hyb_df
+        return
+
+    for start in range(0, len(hyb_df), chunksize):
+        yield hyb_df.iloc[start:start + chunksize].reset_index(drop = True)
+
+
+def _concat_hyb_dataframes(hyb_dfs):
+    """Concatenate parsed blocks into the dataframe that parsing the whole file at once would give.
+
+    The categorical columns of compact blocks are given the sorted union of their categories first, so that they
+    stay categorical.
+    """
+
+    hyb_dfs = [hyb_df for hyb_df in hyb_dfs if hyb_df is not None]
+
+    if not hyb_dfs:
+        raise EmptyDataError('No columns to parse from file')
+
+    if len(hyb_dfs) == 1:
+        return(hyb_dfs[0])
+
+    for column in hyb_dfs[0].columns:
+        if all(column in hyb_df and hyb_df[column].dtype.name == 'category' for hyb_df in hyb_dfs):
+            categories = sorted(set().union(*[hyb_df[column].cat.categories for hyb_df in hyb_dfs]))
+            for hyb_df in hyb_dfs:
+                hyb_df[column] = hyb_df[column].cat.set_categories(categories)
+
+    return(pd.concat(hyb_dfs, ignore_index = True))
+
+
+def _get_usecols(columns):
+    """Get the sorted positions of a list of hyb dataframe columns, or None if they include an optional column."""
+
+    if columns is None:
+        return(None)
+
+    unknown_columns = [column for column in columns if column not in hyb_df_columns]
+    if unknown_columns:
+        raise ValueError('Unknown hyb columns %s' % ', '.join(unknown_columns))
+
+    positions = sorted(set(hyb_df_columns.index(column) for column in columns))
+
+    return(positions if positions and positions[-1] < 15 else None)
+
+
+def _prepare_hyb_dataframe(hyb_df, compact, columns=None):
+    """Check the number of columns in a freshly parsed hyb dataframe, give them their names and compact them.
 
-def load_hyb_dataframe(hyb_filepath):
-    """Import a hyb file as a dataframe."""
+    If columns is given, the dataframe is cut down to those columns, and optional columns missing from the file are
+    filled with NaN. Dataframes parsed with the usecols given by _get_usecols only have the requested columns,
+    labelled with their positions, so their number cannot be checked.
+    """
 
-    if(hyb_filepath == "-"):
-        hyb_filepath = sys.stdin
+    if columns is not None and _get_usecols(columns) is not None:
+        hyb_df.columns = [hyb_df_columns[position] for position in hyb_df.columns]
+    else:
+        assert 15 <= len(hyb_df.columns) <= 17, \
+            "Input hyb file must have between 15 and 17 columns. This file has %d columns" % len(hyb_df.columns)
 
-    hyb_df = pd.read_csv(hyb_filepath, sep = '\t', header = None, comment = '#', skip_blank_lines=True)
+        hyb_df.columns = hyb_df_columns[0:len(hyb_df.columns)]
 
-    assert 15 <= len(hyb_df.columns) <= 17, \
-        "Input hyb file must have between 15 and 17 columns. This file has %d columns" % len(hyb_df.columns)
+    if columns is not None:
+        hyb_df = hyb_df.reindex(columns = columns)
 
-    hyb_df.columns = hyb_df_columns[0:len(hyb_df.columns)]
+    if compact:
+        for column in hyb_df.columns:
+            if hyb_df_dtypes.get(column) == 'int32':
+                hyb_df[column] = pd.to_numeric(hyb_df[column], downcast = 'integer')
 
     return(hyb_df)
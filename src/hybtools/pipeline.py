@@ -0,0 +1,263 @@
+"""pipeline.py: Several analyses of a hyb file in a single pass."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import collections
+import io
+import itertools
+import numpy as np
+import pandas as pd
+
+from hybtools.compression import open_file
+from hybtools.hyb_io import _prepare_hyb_dataframe, _read_hyb_csv, hyb_df_columns, hyb_df_dtypes, load_hyb_dataframe
+from hybtools.profiling import iterate, stage
+from hybtools.summarise import _factorize_descriptions, _share_codes, count_hybrids, merge_hybrid_counts, \
+    summarise_hybrid_counts
+
+
+class Pipeline(object):
+    """A set of analyses fed from one pass over a hyb file.
+
+    Analyses are added with add, under a name, and run together with run. Each chunk of the hyb file is parsed
+    once and passed to the update method of every analysis, so running several analyses costs about as much as
+    reading the file once. An analysis is any object with these methods:
+
+    * update(hyb_df, lines), called with each chunk in file order. lines is the list of the raw lines of the
+      chunk, as bytes, if the analysis has a true needs_lines attribute, and None otherwise. It has the data lines
+      of hyb_df in order, and the comment lines among them, but not blank lines.
+    * result(), called once the whole file has been read.
+    """
+
+    def __init__(self):
+        self.analyses = collections.OrderedDict()
+
+    def add(self, name, analysis):
+        """Add an analysis to the pipeline, and return the pipeline."""
+
+        if name in self.analyses:
+            raise ValueError('The pipeline already has an analysis named %r' % name)
+
+        self.analyses[name] = analysis
+
+        return(self)
+
+    def run(self, hyb_filepath, chunksize=1000000, profiler=None):
+        """Feed a hyb file, or stdin if hyb_filepath is '-', to every analysis, chunksize lines at a time.
+
+        Returns an OrderedDict of the result of each analysis by name. If profiler is a profiling.Profiler, the
+        read stage and the stage of each analysis are timed with it.
+        """
+
+        if any(getattr(analysis, 'needs_lines', False) for analysis in self.analyses.values()):
+            chunks = _iter_hyb_line_chunks(hyb_filepath, chunksize)
+        else:
+            chunks = (_Chunk(hyb_df, None) for hyb_df in load_hyb_dataframe(hyb_filepath, chunksize = chunksize,
+                                                                             compact = True))
+
+        for chunk in iterate(profiler, chunks, 'read'):
+            for name, analysis in self.analyses.items():
+                with stage(profiler, name, rows = len(chunk)):
+                    analysis.update(chunk.hyb_df, chunk.lines if getattr(analysis, 'needs_lines', False) else None)
+
+        results = collections.OrderedDict()
+        for name, analysis in self.analyses.items():
+            with stage(profiler, name):
+                results[name] = analysis.result()
+
+        return(results)
+
+
+class HybridSummary(object):
+    """The summary of the hybrids in a hyb file, as given by summarise.create_summary_dataframe."""
+
+    def __init__(self, unordered=False, orientations=False, level='transcript'):
+        self.count_options = {'unordered': unordered, 'orientations': orientations, 'level': level}
+        self.hybrid_counts = None
+
+    def update(self, hyb_df, lines=None):
+        self.hybrid_counts = merge_hybrid_counts([self.hybrid_counts, count_hybrids(hyb_df, **self.count_options)])
+
+    def result(self):
+        if self.hybrid_counts is None:
+            self.update(pd.DataFrame({'bit1-description': [], 'bit2-description': []}))
+
+        return(summarise_hybrid_counts(self.hybrid_counts))
+
+
+class DescriptionCounts(object):
+    """The number of reads with each description in one bit, with the columns bitN-description and count.
+
+    Descriptions are in order of decreasing count, and in description order for equal counts. With level 'gene'
+    or 'biotype', the reads are counted by the gene or biotype of the description instead.
+    """
+
+    def __init__(self, bit=1, level='transcript'):
+        self.column = 'bit%d-description' % bit
+        self.level = level
+        self.counts = None
+
+    def update(self, hyb_df, lines=None):
+        codes, descriptions = _factorize_descriptions(hyb_df[self.column], self.level)
+        counts = pd.Series(np.bincount(codes[codes >= 0], minlength = len(descriptions)), index = descriptions)
+        self.counts = counts if self.counts is None else self.counts.add(counts, fill_value = 0)
+
+    def result(self):
+        counts = self.counts if self.counts is not None else pd.Series([], dtype='int64')
+        counts_df = counts[counts > 0].astype('int64').sort_index().rename_axis(self.column).reset_index(name = 'count')
+
+        return(counts_df.sort_values('count', ascending = False, kind = 'mergesort').reset_index(drop = True))
+
+
+class EnergyStatistics(object):
+    """The number of reads and the mean, minimum and maximum predicted binding energy of each hybrid.
+
+    The result has the columns hybrid-description, hybrid-count, energy-mean, energy-min and energy-max, with the
+    hybrids in the order of summarise.summarise_hybrid_counts. Reads missing an energy are counted, but left out of
+    the energy statistics. The statistics are computed in double precision, and given in the dtype of the
+    energies, which is float32 for compact dataframes. The unordered and level arguments are as for
+    summarise.create_summary_dataframe.
+    """
+
+    columns = ['hybrid-description', 'hybrid-count', 'energy-mean', 'energy-min', 'energy-max']
+
+    def __init__(self, unordered=False, level='transcript'):
+        self.unordered = unordered
+        self.level = level
+        self.statistics = None
+        self.dtype = np.dtype('float64')
+
+    def update(self, hyb_df, lines=None):
+        bit1_codes, bit1_descriptions = _factorize_descriptions(hyb_df['bit1-description'], self.level)
+        bit2_codes, bit2_descriptions = _factorize_descriptions(hyb_df['bit2-description'], self.level)
+
+        if self.unordered:
+            bit1_codes, bit2_codes, bit1_descriptions = _share_codes(bit1_codes, bit1_descriptions,
+                                                                     bit2_codes, bit2_descriptions)
+            bit2_descriptions = bit1_descriptions
+            bit1_codes, bit2_codes = np.minimum(bit1_codes, bit2_codes), np.maximum(bit1_codes, bit2_codes)
+
+        present = (bit1_codes >= 0) & (bit2_codes >= 0)
+        n_bit2_descriptions = max(len(bit2_descriptions), 1)
+        pair_codes = bit1_codes[present].astype('int64') * n_bit2_descriptions + bit2_codes[present]
+        energies = hyb_df['predicted_binding_energy'].values[present].astype('float64')
+        self.dtype = hyb_df['predicted_binding_energy'].dtype
+
+        statistics = pd.DataFrame({'pair': pair_codes, 'energy': energies}).groupby('pair')['energy'] \
+            .agg(['size', 'count', 'sum', 'min', 'max'])
+        statistics.index = bit1_descriptions[statistics.index.values // n_bit2_descriptions] + ':::' + \
+            bit2_descriptions[statistics.index.values % n_bit2_descriptions]
+
+        if self.statistics is not None:
+            statistics = pd.concat([self.statistics, statistics]).groupby(level = 0) \
+                .agg({'size': 'sum', 'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'})
+
+        self.statistics = statistics[['size', 'count', 'sum', 'min', 'max']]
+
+    def result(self):
+        if self.statistics is None:
+            return(pd.DataFrame({column: [] for column in self.columns}, columns = self.columns))
+
+        statistics = self.statistics
+        summary_df = summarise_hybrid_counts(statistics['size'].astype('int64'))
+        summary_df = summary_df.join(statistics[['sum', 'min', 'max']], on = 'hybrid-description')
+        # The mean is over the reads that have an energy, which may be fewer than hybrid-count.
+        summary_df['sum'] /= statistics['count'].reindex(summary_df['hybrid-description']).values
+
+        summary_df.columns = self.columns
+        for column in self.columns[2:]:
+            summary_df[column] = summary_df[column].astype(self.dtype)
+
+        return(summary_df)
+
+
+class FilteredLines(object):
+    """Write the lines of a hyb file that pass a hyb_filter.HybFilter, unchanged, to a binary file object.
+
+    Comment lines are kept, as by hyb_filter.filter_hyb_lines. The result is the number of data lines written.
+    """
+
+    needs_lines = True
+
+    def __init__(self, hyb_filter, output_file):
+        self.hyb_filter = hyb_filter
+        self.output_file = output_file
+        self.n_lines = 0
+
+    def update(self, hyb_df, lines):
+        mask = self.hyb_filter.mask(hyb_df)
+        data_mask = iter(mask)
+        keep = [line.startswith(b'#') or next(data_mask) for line in lines]
+        self.output_file.write(b''.join(itertools.compress(lines, keep)))
+        self.n_lines += int(mask.sum())
+
+    def result(self):
+        return(self.n_lines)
+
+
+class _Chunk(object):
+    """A chunk of a hyb file as a compact dataframe, and its raw lines if they were kept."""
+
+    def __init__(self, hyb_df, lines):
+        self.hyb_df = hyb_df
+        self.lines = lines
+
+    def __len__(self):
+        return(len(self.hyb_df))
+
+
+def _iter_hyb_line_chunks(hyb_filepath, chunksize):
+    """Yield the chunks of a hyb file, keeping the raw data and comment lines of each chunk.
+
+    A chunk of only comment lines has an empty dataframe.
+    """
+
+    with open_file(hyb_filepath) as hyb_file:
+        while True:
+            lines = list(itertools.islice(hyb_file, chunksize))
+            if not lines:
+                return
+
+            lines = [line if line.endswith(b'\n') else line + b'\n' for line in lines if line.strip()]
+            if not lines:
+                continue
+
+            data_lines = [line for line in lines if not line.startswith(b'#')]
+            if not data_lines:
+                yield _Chunk(_get_empty_hyb_dataframe(), lines)
+                continue
+
+            hyb_df = _prepare_hyb_dataframe(_read_hyb_csv(io.BytesIO(b''.join(data_lines)), True), True)
+
+            assert len(hyb_df) == len(data_lines), \
+                "Could not parse the hyb file: read %d rows from %d lines" % (len(hyb_df), len(data_lines))
+
+            yield _Chunk(hyb_df, lines)
+
+
+def _get_empty_hyb_dataframe():
+    """Get a compact hyb dataframe with no rows."""
+
+    columns = hyb_df_columns[:15]
+
+    return(pd.DataFrame({column: pd.Series([], dtype = hyb_df_dtypes.get(column, object)) for column in columns},
+                        columns = columns))
@@ -0,0 +1,191 @@
+"""profiling.py: Timing and memory use of the stages of a command."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import collections
+import contextlib
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class Profiler(object):
+    """Record the wall time, CPU time, row count and peak memory of each stage of a command.
+
+    Stages are timed with the stage context manager, or with iterate for the time spent producing the items of an
+    iterator, such as the chunks of a hyb file. Stages may be nested, and the time of a stage excludes that of the
+    stages nested in it, so the stage times add up to the total time. Timing the same stage several times adds up
+    its time and rows. The peak memory of a stage is the peak resident set size of the process, or of its largest
+    worker process, by the end of the stage.
+    """
+
+    def __init__(self):
+        self.stages = collections.OrderedDict()
+        self._stack = []
+        self._start = _get_times()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        """Time the enclosed block as the stage name, processing the given number of rows."""
+
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit(name, rows)
+
+    def add_rows(self, name, rows):
+        """Add rows to a stage, for stages whose row count is only known once they have finished."""
+
+        self._get_stage(name)['rows'] += rows
+
+    def iterate(self, items, name):
+        """Yield the items of an iterator, timing the production of each item as the stage name.
+
+        If the items have a length, such as dataframe chunks, their lengths are counted as the rows of the stage.
+        """
+
+        items = iter(items)
+
+        while True:
+            self._enter(name)
+            try:
+                item = next(items)
+            except StopIteration:
+                self._exit(name, None)
+                return
+            self._exit(name, len(item) if hasattr(item, '__len__') else None)
+            yield item
+
+    def to_dict(self):
+        """Get the recorded stages, and the totals for the whole command, as a dict that can be written as JSON."""
+
+        wall_time, cpu_time = [now - start for now, start in zip(_get_times(), self._start)]
+
+        stages = []
+        for name, stage in self.stages.items():
+            stages.append({
+                'stage': name,
+                'wall_seconds': stage['wall_seconds'],
+                'cpu_seconds': stage['cpu_seconds'],
+                'rows': stage['rows'],
+                'rows_per_second': stage['rows'] / stage['wall_seconds'] if stage['wall_seconds'] > 0 else None,
+                'peak_rss_bytes': stage['peak_rss_bytes'],
+            })
+
+        return({'stages': stages, 'wall_seconds': wall_time, 'cpu_seconds': cpu_time,
+                'peak_rss_bytes': _get_peak_rss()})
+
+    def write_json(self, output):
+        """Write the recorded stages as JSON to a file."""
+
+        with open(output, 'w') as f:
+            json.dump(self.to_dict(), f, indent = 2)
+            f.write('\n')
+
+    def write_summary(self, file=None):
+        """Write a table of the recorded stages to a text file, by default stderr."""
+
+        file = file or sys.stderr
+        profile = self.to_dict()
+
+        file.write('%-12s %10s %10s %12s %12s %12s\n' % ('stage', 'wall (s)', 'cpu (s)', 'rows', 'rows/s',
+                                                       'peak MiB'))
+        for stage in profile['stages'] + [dict(profile, stage = 'total', rows = 0, rows_per_second = None)]:
+            file.write('%-12s %10.3f %10.3f %12s %12s %12s\n' % (
+                stage['stage'], stage['wall_seconds'], stage['cpu_seconds'], stage['rows'] or '',
+                '%.0f' % stage['rows_per_second'] if stage['rows_per_second'] else '',
+                '%.1f' % (stage['peak_rss_bytes'] / 2 ** 20) if stage['peak_rss_bytes'] is not None else ''))
+
+    def _get_stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': 0, 'peak_rss_bytes': None}
+        return(self.stages[name])
+
+    def _enter(self, name):
+        self._stack.append([name, _get_times(), 0.0, 0.0])
+
+    def _exit(self, name, rows):
+        entered_name, start_times, child_wall_time, child_cpu_time = self._stack.pop()
+        assert entered_name == name, 'Profiler stage %s ended inside stage %s' % (entered_name, name)
+
+        wall_time, cpu_time = [now - start for now, start in zip(_get_times(), start_times)]
+
+        stage = self._get_stage(name)
+        stage['wall_seconds'] += wall_time - child_wall_time
+        stage['cpu_seconds'] += cpu_time - child_cpu_time
+        stage['rows'] += rows or 0
+        stage['peak_rss_bytes'] = _get_peak_rss()
+
+        if self._stack:
+            self._stack[-1][2] += wall_time
+            self._stack[-1][3] += cpu_time
+
+
+@contextlib.contextmanager
+def stage(profiler, name, rows=None):
+    """Time a stage with a profiler, or do nothing if profiler is None."""
+
+    if profiler is None:
+        yield
+    else:
+        with profiler.stage(name, rows):
+            yield
+
+
+def iterate(profiler, items, name):
+    """Time the production of the items of an iterator with a profiler, or return them unchanged if it is None."""
+
+    if profiler is None:
+        return(items)
+
+    return(profiler.iterate(items, name))
+
+
+def _get_times():
+    """Get the wall time and the CPU time of this process and its finished worker processes."""
+
+    cpu_time = time.process_time()
+
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_time += children.ru_utime + children.ru_stime
+
+    return(time.perf_counter(), cpu_time)
+
+
+def _get_peak_rss():
+    """Get the peak resident set size in bytes of this process or its largest finished worker process."""
+
+    if resource is None:
+        return(None)
+
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return(peak_rss if sys.platform == 'darwin' else peak_rss * 1024)
@@ -0,0 +1,222 @@
+"""sampling.py: Seeded random samples of the reads of hyb files."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import io
+import itertools
+import numpy as np
+import pandas as pd
+
+from hybtools.compression import open_file
+from hybtools.hyb_filter import _read_hyb_columns
+from hybtools.hyb_io import _HybFileRange, hyb_df_columns
+
+
+def get_sample_keys(hyb_df, seed=0):
+    """Get a uniformly distributed random uint64 key for each read of a hyb dataframe.
+
+    The keys are SipHash digests of the unique_sequence_id of each read, keyed with the seed. A read therefore
+    has the same key whichever chunk or worker process it is read in, and samples of a file with the same seed
+    are identical however the file is split up. Reads that share a unique_sequence_id share a key.
+    """
+
+    return(pd.util.hash_pandas_object(hyb_df['unique_sequence_id'].astype(str), index = False,
+                                      hash_key = '%016x' % (seed % (1 << 64))).values)
+
+
+class BernoulliSampler(object):
+    """Keep each read of a hyb file independently with probability fraction, using the keys of get_sample_keys.
+
+    The sampler can be passed to hyb_filter.filter_hyb_lines in place of a hyb_filter.HybFilter, to stream a
+    sample of a file with memory use that does not depend on its size. n_reads and n_sampled are the numbers of
+    reads seen and kept so far.
+    """
+
+    columns = ['unique_sequence_id']
+
+    def __init__(self, fraction, seed=0):
+        if not 0 <= fraction <= 1:
+            raise ValueError('The fraction of reads to sample must be between 0 and 1, not %r' % fraction)
+
+        self.fraction = fraction
+        self.seed = seed
+        self.n_reads = 0
+        self.n_sampled = 0
+
+    def mask(self, hyb_df):
+        """Get a boolean array that is True for the sampled rows of a hyb dataframe with the columns in columns."""
+
+        # The top 53 bits of each key give a uniform float in [0, 1) without rounding up to 1.
+        uniforms = (get_sample_keys(hyb_df, self.seed) >> np.uint64(11)) * 2.0 ** -53
+        mask = uniforms < self.fraction
+
+        self.n_reads += len(mask)
+        self.n_sampled += int(mask.sum())
+
+        return(mask)
+
+
+class ReservoirSampler(object):
+    """A uniform random sample of at most size of the reads in a stream, without replacement.
+
+    The sample is the size reads with the smallest keys, as given by get_sample_keys, which is a uniform sample
+    however the reads are ordered. If per_hybrid is True, the sample is stratified instead, with at most size of
+    the reads of each hybrid-description, so that rare hybrids are kept alongside common ones. With unordered,
+    hybrids A:::B and B:::A are sampled together.
+
+    Only the sampled reads are kept, so memory use is proportional to size, or to size times the number of
+    hybrids if per_hybrid is True, plus one chunk. Samplers of different parts of a file with the same options can
+    be combined with merge, giving the same sample as a single sampler of the whole file.
+    """
+
+    def __init__(self, size, seed=0, per_hybrid=False, unordered=False):
+        self.size = size
+        self.seed = seed
+        self.per_hybrid = per_hybrid
+        self.unordered = unordered
+        self.n_reads = 0
+        self.keys = np.zeros(0, dtype='uint64')
+        self.offsets = np.zeros(0, dtype='int64')
+        self.hybrids = np.zeros(0, dtype=object)
+        self.lines = np.zeros(0, dtype=object)
+
+    @property
+    def columns(self):
+        """The names of the hyb dataframe columns that update needs."""
+
+        if self.per_hybrid:
+            return(['unique_sequence_id', 'bit1-description', 'bit2-description'])
+
+        return(['unique_sequence_id'])
+
+    def update(self, hyb_df, lines, offsets):
+        """Add a chunk of reads to the sample.
+
+        The chunk is given as a hyb dataframe with the columns in columns, the raw lines of its reads as bytes,
+        and the byte offsets of those lines in the file, which give the order of the sample.
+        """
+
+        self.n_reads += len(hyb_df)
+        keys = get_sample_keys(hyb_df, self.seed)
+
+        # Once the sample is full, only reads with smaller keys than the largest sampled key can join it.
+        if not self.per_hybrid and len(self.keys) >= self.size:
+            candidates = keys <= self.keys.max() if len(self.keys) else np.zeros(len(keys), dtype=bool)
+        else:
+            candidates = np.ones(len(keys), dtype=bool)
+
+        if self.per_hybrid:
+            # Reads missing either description belong to no hybrid, so they are left out of the sample.
+            candidates &= hyb_df['bit1-description'].notnull().values & hyb_df['bit2-description'].notnull().values
+            hybrids = _get_hybrid_descriptions(hyb_df[candidates], self.unordered)
+        else:
+            hybrids = np.empty(int(candidates.sum()), dtype=object)
+
+        candidate_lines = np.empty(len(hybrids), dtype=object)
+        candidate_lines[:] = list(itertools.compress(lines, candidates))
+
+        self._add(keys[candidates], np.asarray(offsets, dtype='int64')[candidates], hybrids, candidate_lines)
+
+    def merge(self, other):
+        """Merge a sampler of another part of the same file, with the same options, into this one."""
+
+        self.n_reads += other.n_reads
+        self._add(other.keys, other.offsets, other.hybrids, other.lines)
+
+    def get_lines(self):
+        """Get the lines of the sampled reads, in file order."""
+
+        return(list(self.lines[np.argsort(self.offsets, kind = 'mergesort')]))
+
+    def _add(self, keys, offsets, hybrids, lines):
+        """Add candidate reads to the sample, and keep the reads with the smallest keys."""
+
+        keys = np.concatenate([self.keys, keys])
+        offsets = np.concatenate([self.offsets, offsets])
+        hybrids = np.concatenate([self.hybrids, hybrids])
+        lines = np.concatenate([self.lines, lines])
+
+        # Reads with equal keys are kept in file order.
+        if self.per_hybrid:
+            hybrid_codes = pd.factorize(hybrids)[0]
+            order = np.lexsort((offsets, keys, hybrid_codes))
+            is_first = np.ones(len(order), dtype=bool)
+            is_first[1:] = hybrid_codes[order][1:] != hybrid_codes[order][:-1]
+            first_positions = np.flatnonzero(is_first)
+            ranks = np.arange(len(order)) - np.repeat(first_positions, np.diff(np.append(first_positions, len(order))))
+            keep = order[ranks < self.size]
+        else:
+            keep = np.lexsort((offsets, keys))[:self.size]
+
+        self.keys = keys[keep]
+        self.offsets = offsets[keep]
+        self.hybrids = hybrids[keep]
+        self.lines = lines[keep]
+
+
+def sample_hyb_lines(hyb_filepath, sampler, chunksize=100000, start=0, stop=None):
+    """Feed the reads of a hyb file, or stdin if hyb_filepath is '-', to a ReservoirSampler, and return the sampler.
+
+    If stop is given, only the lines between the byte offsets start and stop of an uncompressed file are read,
+    as for hyb_io.load_hyb_dataframe_range. The file is read chunksize lines at a time, and only the columns
+    that the sampler needs are parsed. Comment lines and blank lines are skipped.
+    """
+
+    column_positions = [hyb_df_columns.index(column) for column in sampler.columns]
+    hyb_file = open_file(hyb_filepath) if stop is None else io.BufferedReader(_HybFileRange(hyb_filepath, start, stop))
+    offset = start
+
+    with hyb_file:
+        while True:
+            lines = list(itertools.islice(hyb_file, chunksize))
+            if not lines:
+                return(sampler)
+
+            line_offsets = offset + np.cumsum([0] + [len(line) for line in lines[:-1]])
+            offset = int(line_offsets[-1]) + len(lines[-1])
+
+            is_data = np.array([bool(line.strip()) and not line.startswith(b'#') for line in lines], dtype=bool)
+            data_lines = [line if line.endswith(b'\n') else line + b'\n' for line in itertools.compress(lines, is_data)]
+
+            if data_lines:
+                sampler.update(_read_hyb_columns(data_lines, sampler.columns, column_positions), data_lines,
+                               line_offsets[is_data])
+
+
+def _get_hybrid_descriptions(hyb_df, unordered):
+    """Get the hybrid-description of each read of a hyb dataframe, as counted by summarise.count_hybrids.
+
+    hyb_df must not have reads missing either description, which count_hybrids does not count.
+    """
+
+    bit1_descriptions = np.asarray(hyb_df['bit1-description'], dtype=object).astype(str).astype(object)
+    bit2_descriptions = np.asarray(hyb_df['bit2-description'], dtype=object).astype(str).astype(object)
+
+    # Order the descriptions rather than the joined hybrids, as count_hybrids does, since the two orders differ
+    # when one description is a prefix of the other.
+    if unordered:
+        in_order = bit1_descriptions <= bit2_descriptions
+        bit1_descriptions, bit2_descriptions = (np.where(in_order, bit1_descriptions, bit2_descriptions),
+                                                np.where(in_order, bit2_descriptions, bit1_descriptions))
+
+    return(bit1_descriptions + ':::' + bit2_descriptions)
@@ -0,0 +1,165 @@
+"""server.py: A daemon keeping parsed hyb files in memory between commands."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import asyncio
+import io
+import json
+import os
+import stat
+
+from concurrent.futures import ThreadPoolExecutor
+
+from hybtools import commands, writers
+from hybtools.client import PROTOCOL_VERSION, ServerError, check_socket_owner, send_request
+from hybtools.hyb_cache import MemoryHybCache
+
+
+def serve(socket_path, memory_budget):
+    """Serve requests from hybtools commands on a Unix socket until a shutdown request is received.
+
+    Parsed hyb files, and the output of the requests made on them, are kept in a MemoryHybCache of memory_budget
+    bytes, so repeating a command on a file that has not changed does not parse or count the file again. Requests
+    are read concurrently, but handled one at a time by a worker thread.
+
+    Each request is a line of JSON, as sent by client.send_request. The response is a line of JSON with the status
+    of the request, followed by the output of the command.
+    """
+
+    _make_socket_directory(os.path.dirname(os.path.abspath(socket_path)))
+    if os.path.exists(socket_path):
+        try:
+            check_socket_owner(socket_path)
+        except ServerError as error:
+            raise ValueError(str(error))
+    if send_request(socket_path, 'status') is not None:
+        raise ValueError('A hybtools daemon is already listening on %s' % socket_path)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    cache = MemoryHybCache(memory_budget)
+    executor = ThreadPoolExecutor(max_workers = 1)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    shutdown = loop.create_future()
+
+    async def handle_connection(reader, writer):
+        try:
+            request = json.loads((await reader.readline()).decode('utf-8'))
+            if request.get('version') != PROTOCOL_VERSION:
+                raise ValueError('The daemon uses protocol version %d, not %r' % (PROTOCOL_VERSION,
+                                                                                  request.get('version')))
+            if request['command'] == 'shutdown':
+                output = b''
+                if not shutdown.done():
+                    shutdown.set_result(None)
+            else:
+                output = await loop.run_in_executor(executor, handle_request, cache, request['command'],
+                                                    request.get('options', {}))
+            header = {'status': 'ok'}
+        except Exception as error:
+            output = b''
+            header = {'status': 'error', 'message': str(error) or error.__class__.__name__}
+
+        writer.write(json.dumps(header).encode('utf-8') + b'\n' + output)
+        await writer.drain()
+        writer.close()
+
+    # Bind the socket with mode 0600, so that it is never open to other users, even briefly.
+    umask = os.umask(0o177)
+    try:
+        server = loop.run_until_complete(asyncio.start_unix_server(handle_connection, path = socket_path))
+    finally:
+        os.umask(umask)
+    os.chmod(socket_path, 0o600)
+
+    try:
+        loop.run_until_complete(shutdown)
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        executor.shutdown()
+        loop.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def handle_request(cache, command, options):
+    """Run a command sent to the daemon, and return its output as bytes."""
+
+    if command == 'status':
+        return(json.dumps({'pid': os.getpid(), 'entries': len(cache), 'nbytes': cache.nbytes,
+                           'memory_budget': cache.memory_budget}).encode('utf-8') + b'\n')
+
+    if command == 'summarise':
+        return(_summarise(cache, **options))
+
+    raise ValueError('Unknown command %r' % command)
+
+
+def _summarise(cache, hyb_filepath, output_format='tsv', top=None, approximate=False, sketch_size=None,
+               input_format='auto', unordered=False, orientations=False, level='transcript', dedup_options=None):
+    """Summarise a hyb file loaded through the cache, as the summarise command does, and render the summary.
+
+    The rendered summary is cached too, so repeating the request on an unchanged file only checks its fingerprint.
+    """
+
+    key = ('summarise', json.dumps([output_format, top, approximate, sketch_size, input_format, unordered,
+                                    orientations, level, dedup_options], sort_keys = True))
+
+    output = cache.get(key, hyb_filepath)
+    if output is not None:
+        return(output)
+
+    if top is not None:
+        summary_df = commands.summarise_top(hyb_filepath, top, approximate = approximate, capacity = sketch_size,
+                                            cache = cache, unordered = unordered, input_format = input_format,
+                                            level = level)
+    else:
+        summary_df = commands.summarise(hyb_filepath, cache = cache, unordered = unordered,
+                                        orientations = orientations, input_format = input_format, level = level,
+                                        dedup_options = dedup_options)
+
+    output_file = io.BytesIO()
+    writers.write_dataframe(summary_df, output = output_file, output_format = output_format)
+    output = output_file.getvalue()
+
+    cache.put(key, hyb_filepath, output, len(output))
+
+    return(output)
+
+
+def _make_socket_directory(socket_dir):
+    """Create the directory of the daemon's socket with mode 0700 if it does not exist, and check that it is safe.
+
+    Raises ValueError if another user owns the directory, or could replace the socket in it.
+    """
+
+    if not os.path.isdir(socket_dir):
+        os.makedirs(socket_dir, mode = 0o700)
+
+    socket_dir_stat = os.stat(socket_dir)
+    if socket_dir_stat.st_uid not in (os.getuid(), 0):
+        raise ValueError('%s belongs to another user, so the socket cannot be created there' % socket_dir)
+    if socket_dir_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH) and not socket_dir_stat.st_mode & stat.S_ISVTX:
+        raise ValueError('%s is writable by other users, so the socket cannot be created there' % socket_dir)
@@ -0,0 +1,98 @@
+"""sketches.py: Fixed-size summaries of streams of counts."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import numpy as np
+import pandas as pd
+
+
+class SpaceSaving(object):
+    """Space-Saving sketch of the most frequent items in a stream, monitoring at most capacity items.
+
+    The stream is fed in batches of (item, count) pairs, such as the hybrid counts of one chunk of a hyb file.
+    Each monitored item has an estimated count and an error, such that its true count is between count - error
+    and count. Any item that is not monitored has a true count of at most min_count. The sketch uses memory
+    proportional to capacity plus the size of one batch, however long the stream.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0
+        self.table = pd.DataFrame({'count': np.zeros(0, dtype='int64'), 'error': np.zeros(0, dtype='int64')},
+                                  columns = ['count', 'error'])
+
+    @property
+    def min_count(self):
+        """Upper bound on the true count of any item that is not monitored."""
+
+        if len(self.table) < self.capacity:
+            return(0)
+
+        return(int(self.table['count'].min()))
+
+    def update(self, item_counts):
+        """Add a series of counts indexed by item to the sketch."""
+
+        item_counts = item_counts[item_counts > 0]
+        self.total += int(item_counts.sum())
+
+        # Items that are not monitored may already have been seen up to min_count times, so they start from there.
+        floor = self.min_count
+
+        monitored = item_counts.index.isin(self.table.index)
+        monitored_counts = item_counts[monitored]
+        new_counts = item_counts[~monitored]
+
+        table = self.table.copy()
+        table.loc[monitored_counts.index, 'count'] += monitored_counts.values
+
+        new_table = pd.DataFrame({'count': new_counts.values.astype('int64') + floor,
+                                  'error': np.full(len(new_counts), floor, dtype='int64')},
+                                 index = new_counts.index, columns = ['count', 'error'])
+        table = pd.concat([table, new_table])
+
+        if len(table) > self.capacity:
+            keep = np.argpartition(-table['count'].values, self.capacity - 1)[:self.capacity]
+            table = table.iloc[np.sort(keep)]
+
+        self.table = table
+
+    def merge(self, other):
+        """Merge another sketch with the same capacity into this one."""
+
+        floor = self.min_count
+        other_floor = other.min_count
+
+        table = self.table.add(other.table, fill_value = 0)
+        # Items missing from either sketch may have been seen up to that sketch's min_count times.
+        table = table.add(pd.DataFrame({'count': other_floor, 'error': other_floor},
+                                       index = self.table.index.difference(other.table.index)), fill_value = 0)
+        table = table.add(pd.DataFrame({'count': floor, 'error': floor},
+                                       index = other.table.index.difference(self.table.index)), fill_value = 0)
+        table = table.astype('int64')
+
+        if len(table) > self.capacity:
+            keep = np.argpartition(-table['count'].values, self.capacity - 1)[:self.capacity]
+            table = table.iloc[np.sort(keep)]
+
+        self.table = table
+        self.total += other.total
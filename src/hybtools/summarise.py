@@ -21,20 +21,283 @@
 # ______________________________________________________________________________
 
 
-def create_summary_dataframe(hyb_df):
-    """Create a summary dataframe given a hyb dataframe as input."""
+import numpy as np
+import pandas as pd
 
-    hyb_df['hybrid-description'] = hyb_df['bit1-description'].str.cat(hyb_df['bit2-description'], sep =':::')
+from hybtools.descriptions import get_description_levels
+from hybtools.sketches import SpaceSaving
 
-    query_column = 'hybrid-description'
 
-    summary_df = hyb_df[[query_column]].groupby(hyb_df[query_column]).count()
+def create_summary_dataframe(hyb_df, unordered=False, orientations=False, level='transcript'):
+    """Create a summary dataframe given a hyb dataframe as input.
+
+    If unordered is True, hybrids A:::B and B:::A are counted together, under whichever of the two
+    hybrid-descriptions comes first in sort order. If orientations is also True, the summary has two extra
+    columns, hybrid-count-forward and hybrid-count-reverse, counting the reads in which the bits appear in that
+    order and in the opposite order.
+
+    If level is 'gene' or 'biotype', hybrids are counted by the genes or biotypes of their bits, as parsed by
+    descriptions.parse_description, instead of by their full bit descriptions.
+    """
+
+    hybrid_counts = count_hybrids(hyb_df, unordered = unordered, orientations = orientations, level = level)
+
+    summary_df = summarise_hybrid_counts(hybrid_counts)
+
+    return(summary_df)
+
+
+def create_summary_dataframe_from_chunks(hyb_df_chunks, unordered=False, orientations=False, level='transcript'):
+    """Create a summary dataframe given an iterable of hyb dataframe chunks as input.
+
+    Only the counts for each distinct hybrid are kept between chunks, so memory use depends on the number of
+    distinct hybrids rather than on the number of reads. The result is identical to that of
+    create_summary_dataframe applied to the concatenated chunks.
+    """
+
+    hybrid_counts = count_hybrids_in_chunks(hyb_df_chunks, unordered = unordered, orientations = orientations,
+                                            level = level)
+
+    return(summarise_hybrid_counts(hybrid_counts))
+
+
+def count_hybrids_in_chunks(hyb_df_chunks, unordered=False, orientations=False, level='transcript',
+                            deduplicator=None):
+    """Count the number of reads for each hybrid-description in an iterable of hyb dataframe chunks.
+
+    If deduplicator is a dedup.ReadDeduplicator, a dataframe is returned instead, with the columns hybrid-count
+    and hybrid-count-unique, the second counting only the first occurrence of each read. It cannot be used with
+    orientations.
+    """
+
+    hybrid_counts = None
+
+    for hyb_df in hyb_df_chunks:
+        chunk_hybrid_counts = count_hybrids(hyb_df, unordered = unordered, orientations = orientations,
+                                            level = level)
+        if deduplicator is not None:
+            chunk_hybrid_counts = _add_unique_counts(chunk_hybrid_counts,
+                                                     count_hybrids(hyb_df[deduplicator.mask(hyb_df)],
+                                                                   unordered = unordered, level = level))
+        hybrid_counts = merge_hybrid_counts([hybrid_counts, chunk_hybrid_counts])
+
+    if hybrid_counts is None:
+        hybrid_counts = count_hybrids(pd.DataFrame({'bit1-description': [], 'bit2-description': []}),
+                                      unordered = unordered, orientations = orientations, level = level)
+        if deduplicator is not None:
+            hybrid_counts = _add_unique_counts(hybrid_counts, hybrid_counts)
+
+    return(hybrid_counts)
+
+
+def _add_unique_counts(hybrid_counts, unique_hybrid_counts):
+    """Combine the counts of all reads and of unique reads into a dataframe with one row per hybrid."""
+
+    return(pd.DataFrame({'hybrid-count': hybrid_counts,
+                         'hybrid-count-unique': unique_hybrid_counts.reindex(hybrid_counts.index, fill_value = 0)},
+                        columns = ['hybrid-count', 'hybrid-count-unique']))
+
+
+def create_top_summary_dataframe_from_chunks(hyb_df_chunks, top, capacity=None, unordered=False, level='transcript'):
+    """Create an approximate summary of the top hybrids given an iterable of hyb dataframe chunks as input.
+
+    The hybrid counts of each chunk are fed to a Space-Saving sketch monitoring capacity hybrids (by default ten
+    times top), so memory use is fixed however many distinct hybrids there are. The summary has the top hybrids
+    by estimated count, with a hybrid-count-error column: the true count of each hybrid is between hybrid-count
+    minus hybrid-count-error and hybrid-count. The unordered and level arguments are as for
+    create_summary_dataframe.
+    """
+
+    sketch = count_top_hybrids_in_chunks(hyb_df_chunks, capacity or 10 * top, unordered = unordered, level = level)
+
+    return(summarise_top_hybrids(sketch, top))
+
+
+def count_top_hybrids_in_chunks(hyb_df_chunks, capacity, unordered=False, level='transcript'):
+    """Count the most frequent hybrids in an iterable of hyb dataframe chunks with a Space-Saving sketch."""
+
+    sketch = SpaceSaving(capacity)
+
+    for hyb_df in hyb_df_chunks:
+        sketch.update(count_hybrids(hyb_df, unordered = unordered, level = level))
+
+    return(sketch)
+
+
+def summarise_top_hybrids(sketch, top):
+    """Create a summary dataframe of the top hybrids in a Space-Saving sketch of hybrid counts."""
+
+    hybrid_counts = sketch.table.rename(columns = {'count': 'hybrid-count', 'error': 'hybrid-count-error'})
+
+    summary_df = summarise_hybrid_counts(hybrid_counts).iloc[:top]
+
+    return(summary_df)
+
+
+def count_hybrids(hyb_df, unordered=False, orientations=False, level='transcript'):
+    """Count the number of reads for each hybrid-description in a hyb dataframe.
+
+    Returns a series of counts indexed by hybrid-description, in no particular order. The bit descriptions are
+    factorized into integer codes and the pairs of codes are counted, so hybrid-description strings are only built
+    for the distinct hybrids. Reads missing either description are not counted, and hyb_df is not modified.
+
+    If unordered is True, both bits share one set of codes in description order, and each pair of codes is put
+    in ascending order before counting. If orientations is also True, a dataframe is returned instead, with the
+    columns hybrid-count, hybrid-count-forward and hybrid-count-reverse.
+
+    If level is 'gene' or 'biotype', each distinct description is mapped to its gene or biotype, and the codes of
+    the descriptions are mapped to codes of those, so hybrids are still counted on integer codes.
+    """
+
+    bit1_codes, bit1_descriptions = _factorize_descriptions(hyb_df['bit1-description'], level)
+    bit2_codes, bit2_descriptions = _factorize_descriptions(hyb_df['bit2-description'], level)
+
+    if unordered:
+        bit1_codes, bit2_codes, bit1_descriptions = _share_codes(bit1_codes, bit1_descriptions,
+                                                                 bit2_codes, bit2_descriptions)
+        bit2_descriptions = bit1_descriptions
+        reverse = bit1_codes > bit2_codes
+        bit1_codes, bit2_codes = np.minimum(bit1_codes, bit2_codes), np.maximum(bit1_codes, bit2_codes)
+
+    pair_codes, pair_counts = _count_code_pairs(bit1_codes, bit2_codes, len(bit2_descriptions))
+
+    hybrid_descriptions = bit1_descriptions[pair_codes // max(len(bit2_descriptions), 1)] + ':::' + \
+        bit2_descriptions[pair_codes % max(len(bit2_descriptions), 1)]
+
+    if unordered and orientations:
+        reverse_pair_codes, reverse_pair_counts = _count_code_pairs(bit1_codes[reverse], bit2_codes[reverse],
+                                                                    len(bit2_descriptions))
+        pair_reverse_counts = np.zeros(len(pair_codes), dtype='int64')
+        pair_reverse_counts[np.searchsorted(pair_codes, reverse_pair_codes)] = reverse_pair_counts
+        return(pd.DataFrame({'hybrid-count': pair_counts,
+                             'hybrid-count-forward': pair_counts - pair_reverse_counts,
+                             'hybrid-count-reverse': pair_reverse_counts},
+                            index = hybrid_descriptions,
+                            columns = ['hybrid-count', 'hybrid-count-forward', 'hybrid-count-reverse']))
+
+    hybrid_counts = pd.Series(pair_counts, index = hybrid_descriptions)
+
+    return(hybrid_counts)
+
+
+def _factorize_descriptions(descriptions, level='transcript'):
+    """Get integer codes for a series of descriptions, with -1 for missing values, and an array of the descriptions.
+
+    If level is 'gene' or 'biotype', the codes and descriptions are those of the genes or biotypes.
+    """
+
+    if descriptions.dtype.name == 'category':
+        codes = descriptions.cat.codes.values
+        unique_descriptions = np.asarray(descriptions.cat.categories, dtype=object)
+    else:
+        codes, unique_descriptions = pd.factorize(descriptions)
+        unique_descriptions = np.asarray(unique_descriptions, dtype=object)
+
+    if level != 'transcript':
+        level_codes, unique_descriptions = pd.factorize(get_description_levels(unique_descriptions, level))
+        unique_descriptions = np.asarray(unique_descriptions, dtype=object)
+        # Append -1 so that missing descriptions keep the code -1.
+        codes = np.append(level_codes, -1)[codes]
+
+    return(codes, unique_descriptions)
+
+
+def _share_codes(bit1_codes, bit1_descriptions, bit2_codes, bit2_descriptions):
+    """Recode the descriptions of both bits with one set of codes, numbered in description order."""
+
+    shared_codes, shared_descriptions = pd.factorize(np.concatenate([bit1_descriptions, bit2_descriptions]),
+                                                     sort = True)
+
+    # Append -1 so that missing descriptions keep the code -1.
+    bit1_recoding = np.append(shared_codes[:len(bit1_descriptions)], -1)
+    bit2_recoding = np.append(shared_codes[len(bit1_descriptions):], -1)
+
+    return(bit1_recoding[bit1_codes], bit2_recoding[bit2_codes], np.asarray(shared_descriptions, dtype=object))
+
+
+def _count_code_pairs(bit1_codes, bit2_codes, n_bit2_codes):
+    """Count the distinct pairs of codes, ignoring pairs with a missing code.
+
+    Returns the distinct pairs in ascending order, each encoded as bit1_code * n_bit2_codes + bit2_code, and their
+    counts.
+    """
+
+    present = (bit1_codes >= 0) & (bit2_codes >= 0)
+
+    pair_codes = bit1_codes.astype('int64') * max(n_bit2_codes, 1) + bit2_codes
+    pair_codes = pair_codes[present]
+
+    if pair_codes.size == 0:
+        return(np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64'))
+
+    # Counting with bincount is fastest, but needs an array as long as the largest pair code.
+    if pair_codes.max() < 4 * pair_codes.size + 1024:
+        pair_counts = np.bincount(pair_codes)
+        unique_pair_codes = np.flatnonzero(pair_counts)
+        return(unique_pair_codes, pair_counts[unique_pair_codes].astype('int64'))
+
+    unique_pair_codes, pair_counts = np.unique(pair_codes, return_counts=True)
+
+    return(unique_pair_codes, pair_counts.astype('int64'))
+
+
+def merge_hybrid_counts(hybrid_counts_list):
+    """Merge several series of hybrid counts, as returned by count_hybrids, into one. None entries are ignored."""
+
+    hybrid_counts_list = [hybrid_counts for hybrid_counts in hybrid_counts_list if hybrid_counts is not None]
+
+    if len(hybrid_counts_list) == 0:
+        return(pd.Series([], dtype='int64'))
+
+    if len(hybrid_counts_list) == 1:
+        return(hybrid_counts_list[0])
+
+    hybrid_counts = pd.concat(hybrid_counts_list).groupby(level=0).sum()
+
+    return(hybrid_counts)
+
+
+def summarise_hybrid_counts(hybrid_counts):
+    """Create a summary dataframe from counts indexed by hybrid-description, as returned by count_hybrids.
+
+    The hybrids are put in hybrid-description order before being sorted by count, so that hybrids with tied
+    counts appear in the same order as they would after grouping the full hyb dataframe.
+    """
+
+    if isinstance(hybrid_counts, pd.Series):
+        hybrid_counts = hybrid_counts.to_frame('hybrid-count')
+
+    summary_df = hybrid_counts.sort_index().astype('int64')
+    summary_df.index.name = 'hybrid-description'
 
-    summary_df.columns = ['hybrid-count']
     summary_df.sort_values(by='hybrid-count', ascending=False, inplace=True)
     summary_df.reset_index(0, inplace=True)
 
     return(summary_df)
 
 
+def create_summary_matrix(hybrid_counts_list, sample_names):
+    """Create a hybrid by sample count matrix given one series of hybrid counts per sample as input.
+
+    The hybrid-descriptions of all the samples are factorized into shared integer codes, and the counts of each
+    sample are placed in its column by code, so no join on the descriptions is needed. The hybrids are sorted by
+    their total count over all the samples, with tied hybrids in hybrid-description order.
+    """
+
+    hybrid_descriptions = np.concatenate([np.asarray(hybrid_counts.index, dtype=object)
+                                          for hybrid_counts in hybrid_counts_list])
+    hybrid_codes, unique_hybrid_descriptions = pd.factorize(hybrid_descriptions, sort=True)
+
+    counts = np.zeros((len(unique_hybrid_descriptions), len(hybrid_counts_list)), dtype='int64')
+
+    offset = 0
+    for i, hybrid_counts in enumerate(hybrid_counts_list):
+        counts[hybrid_codes[offset:offset + len(hybrid_counts)], i] = hybrid_counts.values
+        offset += len(hybrid_counts)
+
+    order = np.argsort(-counts.sum(axis=1), kind='mergesort')
+
+    summary_matrix_df = pd.DataFrame(counts[order], columns=list(sample_names))
+    summary_matrix_df.insert(0, 'hybrid-description', np.asarray(unique_hybrid_descriptions, dtype=object)[order])
 
+    return(summary_matrix_df)
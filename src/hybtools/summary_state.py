@@ -0,0 +1,126 @@
+"""summary_state.py: Saved hybrid counts of the processed prefix of a growing hyb file."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import hashlib
+import numpy as np
+import os
+import pandas as pd
+
+from hybtools.hyb_cache import FINGERPRINT_BLOCK_SIZE, _read_strings, _write_strings
+
+
+STATE_VERSION = 2
+
+# Size of the reads used to hash the processed prefix of a hyb file.
+READ_SIZE = 1 << 20
+
+
+def load_summary_state(state_filepath, hyb_filepath, unordered=False, orientations=False, level='transcript'):
+    """Load the hybrid counts and processed byte offset saved for a hyb file.
+
+    Returns (hybrid_counts, offset), or (None, 0) if there is no state file, if it was saved with other counting
+    options, or if the first offset bytes of the hyb file have changed since it was saved.
+    """
+
+    if not os.path.exists(state_filepath):
+        return(None, 0)
+
+    try:
+        with np.load(state_filepath, allow_pickle=False) as state:
+            offset = int(state['offset'])
+            if int(state['version']) != STATE_VERSION or bool(state['unordered']) != unordered or \
+                    bool(state['orientations']) != orientations or str(state['level']) != level or \
+                    offset > os.path.getsize(hyb_filepath) or str(state['fingerprint']) != fingerprint_hyb_prefix(hyb_filepath, offset):
+                return(None, 0)
+            hybrid_counts = pd.DataFrame(state['counts'], columns=list(_read_strings(state, 'columns')),
+                                         index=pd.Index(_read_strings(state, 'hybrid_descriptions'),
+                                                        name='hybrid-description'))
+    except (IOError, OSError, KeyError, ValueError):
+        return(None, 0)
+
+    if not orientations:
+        hybrid_counts = hybrid_counts['hybrid-count']
+
+    return(hybrid_counts, offset)
+
+
+def save_summary_state(state_filepath, hyb_filepath, hybrid_counts, offset, unordered=False, orientations=False,
+                       level='transcript'):
+    """Save the hybrid counts of the first offset bytes of a hyb file, with a fingerprint of those bytes."""
+
+    hybrid_counts = hybrid_counts.to_frame('hybrid-count') if hasattr(hybrid_counts, 'to_frame') else hybrid_counts
+
+    arrays = {
+        'version': np.array(STATE_VERSION),
+        'unordered': np.array(unordered),
+        'orientations': np.array(orientations),
+        'level': np.array(level),
+        'offset': np.array(offset),
+        'fingerprint': np.array(fingerprint_hyb_prefix(hyb_filepath, offset)),
+        'counts': hybrid_counts.values.astype('int64'),
+    }
+    _write_strings(arrays, 'hybrid_descriptions', hybrid_counts.index)
+    _write_strings(arrays, 'columns', hybrid_counts.columns)
+
+    temporary_filepath = '%s.%d.tmp' % (state_filepath, os.getpid())
+    with open(temporary_filepath, 'wb') as state_file:
+        np.savez(state_file, **arrays)
+    os.replace(temporary_filepath, state_filepath)
+
+
+def fingerprint_hyb_prefix(hyb_filepath, size):
+    """Hash the first size bytes of a hyb file.
+
+    The whole prefix is hashed, so the hash changes if any of it is truncated or rewritten, but not when lines are
+    appended after it. Reading the prefix sequentially is much cheaper than parsing it again.
+    """
+
+    fingerprint = hashlib.sha1(('%d' % size).encode('ascii'))
+
+    with open(hyb_filepath, 'rb') as hyb_file:
+        remaining = size
+        while remaining > 0:
+            data = hyb_file.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            fingerprint.update(data)
+            remaining -= len(data)
+
+    return(fingerprint.hexdigest())
+
+
+def find_last_line_end(hyb_filepath):
+    """Get the byte offset just after the last newline of a file, or 0 if it has none."""
+
+    with open(hyb_filepath, 'rb') as hyb_file:
+        position = hyb_file.seek(0, os.SEEK_END)
+        while position > 0:
+            block_start = max(position - FINGERPRINT_BLOCK_SIZE, 0)
+            hyb_file.seek(block_start)
+            block = hyb_file.read(position - block_start)
+            line_end = block.rfind(b'\n')
+            if line_end >= 0:
+                return(block_start + line_end + 1)
+            position = block_start
+
+    return(0)
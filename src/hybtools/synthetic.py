@@ -0,0 +1,155 @@
+"""synthetic.py: Generation of reproducible synthetic hyb files, for benchmarks and tests."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import functools
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+
+from hybtools.hyb_io import hyb_df_columns
+
+
+BIOTYPES = ['mRNA', 'rRNA', 'snoRNA', 'microRNA', 'tRNA', 'lncRNA', 'snRNA']
+
+# Files are generated this many rows at a time, each block from its own random state, so that the rows of a file
+# depend only on its size and settings.
+BLOCK_ROWS = 1 << 14
+
+
+def generate_transcript_names(n_transcripts, seed=0):
+    """Generate transcript descriptions in the style of the hyb pipeline, as gene_transcript_name_biotype."""
+
+    random_state = np.random.RandomState(seed)
+    biotypes = random_state.choice(BIOTYPES, size = n_transcripts)
+
+    return(['ENSG%011d_ENST%011d_GENE%d_%s' % (i, i, i, biotype) for i, biotype in enumerate(biotypes)])
+
+
+def generate_hyb_dataframe(n_rows, n_transcripts=10000, seed=0, skew=1.1, intramolecular_fraction=0.3,
+                           start_row=0):
+    """Generate a hyb dataframe of n_rows random hybrids.
+
+    Bit descriptions are drawn from n_transcripts transcript names with Zipf-like frequencies, in which the k-th
+    most common transcript has a frequency proportional to 1 / k ** skew. A fraction intramolecular_fraction of
+    the hybrids have the same transcript in both bits. Rows are generated in blocks of BLOCK_ROWS rows, each from a
+    random state seeded with seed and the block number, so the same arguments always give the same rows. If
+    start_row is given, the rows are those that would follow start_row rows of a larger dataframe.
+    """
+
+    transcript_names = np.array(generate_transcript_names(n_transcripts, seed), dtype = object)
+    frequencies = 1.0 / np.arange(1, n_transcripts + 1) ** skew
+    frequencies /= frequencies.sum()
+
+    blocks = []
+    for block in range(start_row // BLOCK_ROWS, (start_row + n_rows + BLOCK_ROWS - 1) // BLOCK_ROWS):
+        block_df = _generate_hyb_block(block, transcript_names, frequencies, seed, intramolecular_fraction)
+        block_start = block * BLOCK_ROWS
+        blocks.append(block_df.iloc[max(start_row - block_start, 0):start_row + n_rows - block_start])
+
+    if not blocks:
+        return(pd.DataFrame(columns = hyb_df_columns[:15]))
+
+    return(pd.concat(blocks))
+
+
+def write_hyb_file(hyb_filepath, n_rows, chunksize=BLOCK_ROWS, jobs=1, **options):
+    """Write n_rows random hybrids to a hyb file, chunksize rows at a time.
+
+    If jobs is greater than 1, chunks are generated in parallel by a pool of processes. The options are as for
+    generate_hyb_dataframe, and the file contents depend on neither chunksize nor jobs.
+    """
+
+    start_rows = range(0, n_rows, chunksize)
+    format_hyb_chunk = functools.partial(_format_hyb_chunk, n_rows = n_rows, chunksize = chunksize, options = options)
+
+    with open(hyb_filepath, 'w') as hyb_file:
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers = jobs) as executor:
+                hyb_file.writelines(executor.map(format_hyb_chunk, start_rows))
+        else:
+            hyb_file.writelines(map(format_hyb_chunk, start_rows))
+
+
+def _format_hyb_chunk(start_row, n_rows, chunksize, options):
+    """Generate a chunk of a synthetic hyb file as text. May run in a worker process."""
+
+    hyb_df = generate_hyb_dataframe(min(chunksize, n_rows - start_row), start_row = start_row, **options)
+    columns = [hyb_df[column].astype(str).tolist() for column in hyb_df.columns]
+
+    # Joining the columns directly is several times faster than DataFrame.to_csv, and gives the same text.
+    return(''.join(['\t'.join(fields) + '\t\n' for fields in zip(*columns)]))
+
+
+def _generate_hyb_block(block, transcript_names, frequencies, seed, intramolecular_fraction):
+    """Generate one block of BLOCK_ROWS rows of a synthetic hyb dataframe."""
+
+    random_state = np.random.RandomState([seed, block])
+    n_rows = BLOCK_ROWS
+    row_numbers = np.arange(block * n_rows, (block + 1) * n_rows)
+
+    bit1_codes = random_state.choice(len(transcript_names), size = n_rows, p = frequencies)
+    bit2_codes = random_state.choice(len(transcript_names), size = n_rows, p = frequencies)
+    intramolecular = random_state.random_sample(n_rows) < intramolecular_fraction
+    bit2_codes[intramolecular] = bit1_codes[intramolecular]
+
+    read_lengths = random_state.randint(30, 101, size = n_rows)
+    bit1_read_stops = (read_lengths * random_state.uniform(0.3, 0.7, size = n_rows)).astype('int64')
+    bit2_read_starts = bit1_read_stops + random_state.randint(-3, 4, size = n_rows)
+    bit1_transcript_starts = random_state.randint(1, 5000, size = n_rows)
+    bit2_transcript_starts = random_state.randint(1, 5000, size = n_rows)
+
+    bases = np.frombuffer(b'ACGT', dtype = 'uint8')[random_state.randint(0, 4, size = read_lengths.sum())]
+    bases = bases.tobytes().decode('ascii')
+    read_ends = np.cumsum(read_lengths)
+    read_sequences = [bases[end - length:end] for end, length in zip(read_ends, read_lengths)]
+
+    data = {
+        'unique_sequence_id': ['%d-%d_%d' % (row, count, count) for row, count in
+                               zip(row_numbers, random_state.geometric(0.7, size = n_rows))],
+        'read_sequence': read_sequences,
+        'predicted_binding_energy': np.round(random_state.uniform(-40, -1, size = n_rows), 1),
+        'bit1-description': transcript_names[bit1_codes],
+        'bit1-read_coordinates_start': 1,
+        'bit1-read_coordinates_stop': bit1_read_stops,
+        'bit1-transcript_coordinates_start': bit1_transcript_starts,
+        'bit1-transcript_coordinates_stop': bit1_transcript_starts + bit1_read_stops - 1,
+        'bit1-mapping_score': _generate_mapping_scores(random_state, n_rows),
+        'bit2-description': transcript_names[bit2_codes],
+        'bit2-read_coordinates_start': bit2_read_starts,
+        'bit2-read_coordinates_stop': read_lengths,
+        'bit2-transcript_coordinates_start': bit2_transcript_starts,
+        'bit2-transcript_coordinates_stop': bit2_transcript_starts + read_lengths - bit2_read_starts,
+        'bit2-mapping_score': _generate_mapping_scores(random_state, n_rows),
+    }
+
+    return(pd.DataFrame(data, columns = hyb_df_columns[:15], index = row_numbers))
+
+
+def _generate_mapping_scores(random_state, n_rows):
+    """Generate mapping scores in the style of the hyb pipeline, with one significant figure."""
+
+    mantissas = random_state.randint(1, 10, size = n_rows)
+    exponents = random_state.randint(3, 40, size = n_rows)
+
+    return(pd.Series(mantissas).astype(str).values + 'e-' + pd.Series(exponents).astype(str).str.zfill(2).values)
@@ -0,0 +1,141 @@
+"""viennad_io.py: viennad file I/O operations.
+
+A viennad file describes each hybrid with five lines:
+
+1. The unique sequence id of the read.
+2. The read sequence.
+3. The predicted fold in Vienna dot-bracket notation, followed by the predicted binding energy in brackets.
+4. The annotation of bit 1: the bit description and its transcript coordinates, as ``description_start-stop``,
+   placed under the part of the read that bit 1 covers and padded to the end of the bit with ``-``. The rest of
+   the line is filled with ``.``.
+5. The annotation of bit 2, in the same form.
+
+Blank lines between records and lines starting with ``#`` are ignored. Read coordinates are taken from the
+position of the annotation in the line, and viennad files do not record mapping scores, which are left missing.
+"""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import io
+import itertools
+import numpy as np
+import os
+import pandas as pd
+
+from hybtools.compression import open_file
+from hybtools.hyb_io import hyb_df_columns, hyb_df_dtypes
+
+
+VIENNAD_RECORD_LINES = 5
+VIENNAD_EXTENSIONS = ('.viennad', '.vienna')
+COMPRESSION_EXTENSIONS = ('.gz', '.bgz', '.zst')
+
+
+def is_viennad_filepath(filepath):
+    """Check whether a file path has a viennad extension, possibly followed by a compression extension."""
+
+    root, extension = os.path.splitext(filepath)
+    if extension in COMPRESSION_EXTENSIONS:
+        root, extension = os.path.splitext(root)
+
+    return(extension in VIENNAD_EXTENSIONS)
+
+
+def load_viennad_dataframe(viennad_filepath, chunksize=None, compact=False):
+    """Import a viennad file as a dataframe with the first 15 columns of a hyb dataframe.
+
+    The chunksize and compact arguments are as for hyb_io.load_hyb_dataframe, with chunksize counting records.
+    Compressed viennad files are decompressed as they are read.
+    """
+
+    hyb_df_chunks = _iter_viennad_dataframe_chunks(viennad_filepath, chunksize or 100000, compact)
+
+    if chunksize is not None:
+        return(hyb_df_chunks)
+
+    hyb_df_chunks = list(hyb_df_chunks)
+
+    if len(hyb_df_chunks) == 1:
+        return(hyb_df_chunks[0])
+
+    return(pd.concat(hyb_df_chunks, ignore_index = True))
+
+
+def _iter_viennad_dataframe_chunks(viennad_filepath, chunksize, compact):
+    """Yield successive chunks of records of a viennad file as dataframes."""
+
+    with io.TextIOWrapper(open_file(viennad_filepath), encoding = 'utf-8') as viennad_file:
+        lines = (line.rstrip('\r\n') for line in viennad_file)
+        lines = (line for line in lines if line.strip() and not line.startswith('#'))
+
+        n_records = 0
+        while True:
+            chunk_lines = list(itertools.islice(lines, chunksize * VIENNAD_RECORD_LINES))
+            if not chunk_lines and n_records > 0:
+                return
+            assert len(chunk_lines) % VIENNAD_RECORD_LINES == 0, \
+                "Input viennad file must have %d lines per record. The last record has %d lines" % \
+                (VIENNAD_RECORD_LINES, len(chunk_lines) % VIENNAD_RECORD_LINES)
+            hyb_df = _parse_viennad_lines(chunk_lines, compact)
+            hyb_df.index += n_records
+            n_records += len(hyb_df)
+            yield hyb_df
+            if len(chunk_lines) < chunksize * VIENNAD_RECORD_LINES:
+                return
+
+
+def _parse_viennad_lines(lines, compact):
+    """Parse the lines of whole viennad records into a hyb dataframe, a column at a time."""
+
+    energies = pd.Series(lines[2::VIENNAD_RECORD_LINES], dtype = object) \
+        .str.extract(r'\(\s*([-+]?[0-9.]+)\s*\)\s*$', expand = False)
+
+    data = {
+        'unique_sequence_id': pd.Series(lines[0::VIENNAD_RECORD_LINES], dtype = object).str.split(n = 1).str[0],
+        'read_sequence': pd.Series(lines[1::VIENNAD_RECORD_LINES], dtype = object).str.strip(),
+        'predicted_binding_energy': pd.to_numeric(energies),
+    }
+
+    for bit, offset in [('bit1', 3), ('bit2', 4)]:
+        annotations = pd.Series(lines[offset::VIENNAD_RECORD_LINES], dtype = object).str.rstrip()
+        stripped_annotations = annotations.str.lstrip('.')
+        read_start = annotations.str.len() - stripped_annotations.str.len() + 1
+        stripped_annotations = stripped_annotations.str.rstrip('.')
+        fields = stripped_annotations.str.rstrip('-').str.extract(r'^(.*)_([0-9]+)-([0-9]+)$', expand = True)
+        data[bit + '-description'] = fields[0]
+        data[bit + '-read_coordinates_start'] = read_start
+        data[bit + '-read_coordinates_stop'] = read_start + stripped_annotations.str.len() - 1
+        data[bit + '-transcript_coordinates_start'] = pd.to_numeric(fields[1])
+        data[bit + '-transcript_coordinates_stop'] = pd.to_numeric(fields[2])
+        data[bit + '-mapping_score'] = np.full(len(annotations), np.nan)
+
+    columns = hyb_df_columns[:15]
+    hyb_df = pd.DataFrame(data, columns = columns)
+
+    if compact:
+        for column in columns:
+            if hyb_df_dtypes.get(column) == 'int32':
+                hyb_df[column] = pd.to_numeric(hyb_df[column], downcast = 'integer')
+            elif column in hyb_df_dtypes:
+                hyb_df[column] = hyb_df[column].astype(hyb_df_dtypes[column])
+
+    return(hyb_df)
@@ -0,0 +1,108 @@
+"""writers.py: Writing of output dataframes in several formats."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import contextlib
+import io
+import sys
+
+
+OUTPUT_FORMATS = ['tsv', 'jsonl', 'parquet', 'arrow']
+
+DEFAULT_CHUNKSIZE = 100000
+
+
+def write_dataframe(df, output='-', output_format='tsv', header=False, chunksize=DEFAULT_CHUNKSIZE):
+    """Write a dataframe to a file, to stdout if output is '-', or to a binary file object, chunksize rows at a time.
+
+    The output formats are:
+
+    * tsv: tab separated values, with a header line only if header is True, followed by an empty line.
+    * jsonl: JSON lines, one object per row.
+    * parquet: Parquet, one row group per chunk.
+    * arrow: the Arrow IPC stream format, one record batch per chunk.
+
+    Writing Parquet or Arrow requires the pyarrow package.
+    """
+
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError('Unknown output format %r. Choose from %s' % (output_format, ', '.join(OUTPUT_FORMATS)))
+
+    chunks = (df.iloc[i:i + chunksize] for i in range(0, max(len(df), 1), chunksize))
+
+    if output_format == 'tsv':
+        with _open_output(output, 'w') as f:
+            for i, chunk in enumerate(chunks):
+                f.write(chunk.to_csv(sep='\t', header=header and i == 0, index=False))
+            f.write('\n')
+
+    elif output_format == 'jsonl':
+        with _open_output(output, 'w') as f:
+            for chunk in chunks:
+                if len(chunk):
+                    f.write(chunk.to_json(orient='records', lines=True).rstrip('\n') + '\n')
+
+    else:
+        _write_arrow_chunks(chunks, output, output_format)
+
+
+def _write_arrow_chunks(chunks, output, output_format):
+    """Write dataframe chunks as Parquet or as an Arrow IPC stream."""
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Writing %s output requires the pyarrow package' % output_format)
+
+    with _open_output(output, 'wb') as f:
+        writer = None
+        for chunk in chunks:
+            table = pyarrow.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                if output_format == 'parquet':
+                    writer = pyarrow.parquet.ParquetWriter(f, table.schema)
+                else:
+                    writer = pyarrow.RecordBatchStreamWriter(f, table.schema)
+            writer.write_table(table)
+        writer.close()
+
+
+@contextlib.contextmanager
+def _open_output(output, mode):
+    """Open a file for writing, or yield stdout if output is '-', or a binary file object as it is or as text."""
+
+    if output == '-':
+        stdout = sys.stdout.buffer if 'b' in mode else sys.stdout
+        yield stdout
+        stdout.flush()
+    elif hasattr(output, 'write'):
+        if 'b' in mode:
+            yield output
+        else:
+            text_output = io.TextIOWrapper(output, encoding='utf-8')
+            yield text_output
+            text_output.flush()
+            text_output.detach()
+    else:
+        with open(output, mode) as f:
+            yield f
@@ -22,7 +22,13 @@
 
 
 import click.testing
+import gzip
+import json
+import os
 import pytest
+import subprocess
+import sys
+import time
 from tests.testutils import get_test_filepath, load_test_file_as_text
 
 
@@ -37,18 +43,19 @@ def invoke_subcommand(
         input_filename,
         cli_runner,
         input_file_contents = None,
-        stdin_contents = None
+        stdin_contents = None,
+        options = ()
     ):
     '''Helper function to test a subcommand with input from either stdin or a file'''
     from hybtools.cli import main
 
     if input_filename == '-':
-        result = cli_runner.invoke(main, [subcommand, '-'], input = stdin_contents)
+        result = cli_runner.invoke(main, [subcommand, '-'] + list(options), input = stdin_contents)
     else:
         with cli_runner.isolated_filesystem():
             with open(input_filename, 'w') as f:
                 f.write(input_file_contents)
-            result = cli_runner.invoke(main, [subcommand, input_filename])
+            result = cli_runner.invoke(main, [subcommand, input_filename] + list(options))
 
     return result
 
@@ -61,6 +68,32 @@ def test_main(cli_runner):
     assert result.output.startswith('Usage')
 
 
+STARTUP_SCRIPT = '''
+import sys
+from hybtools.cli import main
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+print('imported:' + ','.join(module for module in ['numpy', 'pandas'] if module in sys.modules))
+'''
+
+
+@pytest.mark.parametrize('args', [['--help'], ['--version'], ['summarise', '--help']])
+def test_startup_does_not_import_pandas(args):
+    '''Test that the command line interface starts quickly, without importing numpy or pandas.'''
+
+    env = dict(os.environ, PYTHONPATH = os.pathsep.join(sys.path))
+
+    start = time.time()
+    output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT] + args, env = env,
+                                     universal_newlines = True)
+    elapsed = time.time() - start
+
+    assert output.rstrip('\n').split('\n')[-1] == 'imported:'
+    assert elapsed < 2
+
+
 def test_summarise_file(cli_runner):
     '''Test the effect of running the summarise command with a hyb file path given as input.'''
 
@@ -78,6 +111,7 @@ def test_summarise_file(cli_runner):
     )
     assert result.exit_code == 0
     assert result.output.rstrip() == test_data.rstrip()
+    assert result.output == test_data + '\n'
 
 
 def test_summarise_stdin(cli_runner):
@@ -98,3 +132,412 @@ def test_summarise_stdin(cli_runner):
 
     assert result.exit_code == 0
     assert result.output.rstrip() == test_data.rstrip()
+
+
+def test_summarise_stdin_in_chunks(cli_runner):
+    '''Test that the summarise command output is unchanged when the input is read a few lines at a time.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    input_data = load_test_file_as_text(input_fp)
+
+    test_fp = get_test_filepath('test_ua_dg.summarise_hyb_file.tab')
+    test_data = load_test_file_as_text(test_fp)
+
+    result = invoke_subcommand(
+        subcommand = 'summarise',
+        input_filename = '-',
+        stdin_contents = input_data,
+        cli_runner = cli_runner,
+        options = ['--chunksize', '7']
+    )
+
+    assert result.exit_code == 0
+    assert result.output.rstrip() == test_data.rstrip()
+
+
+def test_summarise_several_files(cli_runner):
+    '''Test the effect of running the summarise command with several hyb file paths given as input.'''
+    from hybtools.cli import main
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+
+    test_fp = get_test_filepath('test_ua_dg.summarise_hyb_file.tab')
+    test_data = load_test_file_as_text(test_fp)
+
+    result = cli_runner.invoke(main, ['summarise', input_fp, input_fp])
+
+    assert result.exit_code == 0
+
+    output_lines = result.output.rstrip().split('\n')
+    assert output_lines[0] == 'hybrid-description\t%s\t%s' % (input_fp, input_fp)
+    assert sorted(line.rsplit('\t', 1)[0] for line in output_lines[1:]) == sorted(test_data.rstrip().split('\n'))
+
+
+def test_summarise_file_with_cache(cli_runner, tmpdir):
+    '''Test that the summarise command output is unchanged when the hyb file is read through the cache.'''
+    from hybtools.cli import main
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+
+    test_fp = get_test_filepath('test_ua_dg.summarise_hyb_file.tab')
+    test_data = load_test_file_as_text(test_fp)
+
+    for i in range(2):
+        result = cli_runner.invoke(main, ['--cache', '--cache-dir', str(tmpdir), 'summarise', input_fp])
+        assert result.exit_code == 0
+        assert result.output.rstrip() == test_data.rstrip()
+
+    assert len(tmpdir.listdir()) == 1
+
+
+def test_summarise_gzip_stdin(cli_runner):
+    '''Test the effect of running the summarise command with gzip compressed input passed to stdin.'''
+    from hybtools.cli import main
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    input_data = load_test_file_as_text(input_fp)
+
+    test_fp = get_test_filepath('test_ua_dg.summarise_hyb_file.tab')
+    test_data = load_test_file_as_text(test_fp)
+
+    result = cli_runner.invoke(main, ['summarise', '-'], input = gzip.compress(input_data.encode('utf-8')))
+
+    assert result.exit_code == 0
+    assert result.output.rstrip() == test_data.rstrip()
+
+
+def test_summarise_unordered(cli_runner):
+    '''Test the effect of running the summarise command with hybrids counted regardless of bit order.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    input_data = load_test_file_as_text(input_fp)
+
+    result = invoke_subcommand(
+        subcommand = 'summarise',
+        input_filename = '-',
+        stdin_contents = input_data,
+        cli_runner = cli_runner,
+        options = ['--unordered', '--orientations']
+    )
+
+    assert result.exit_code == 0
+
+    output_lines = result.output.rstrip().split('\n')
+    assert output_lines[0] == 'snoID0273_UnsplicedGene_SNORD3A_snoRNA:::snoID0273_UnsplicedGene_SNORD3A_snoRNA\t42\t42\t0'
+    assert sum(int(line.split('\t')[1]) for line in output_lines) == 100
+
+    result = invoke_subcommand(
+        subcommand = 'summarise',
+        input_filename = '-',
+        stdin_contents = input_data,
+        cli_runner = cli_runner,
+        options = ['--orientations']
+    )
+
+    assert result.exit_code == 2
+
+
+def test_summarise_jsonl_output_file(cli_runner, tmpdir):
+    '''Test the effect of running the summarise command with JSON lines output written to a file.'''
+    from hybtools.cli import main
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    output_fp = str(tmpdir.join('summary.jsonl'))
+
+    result = cli_runner.invoke(main, ['summarise', input_fp, '--output-format', 'jsonl', '-o', output_fp])
+
+    assert result.exit_code == 0
+    assert result.output == ''
+
+    output_lines = load_test_file_as_text(output_fp).rstrip().split('\n')
+    assert len(output_lines) == 45
+    assert output_lines[0] == \
+        '{"hybrid-description":"snoID0273_UnsplicedGene_SNORD3A_snoRNA:::snoID0273_UnsplicedGene_SNORD3A_snoRNA",' \
+        '"hybrid-count":42}'
+
+
+def test_summarise_top_approximate(cli_runner):
+    '''Test the effect of running the summarise command for the approximate top hybrids.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    input_data = load_test_file_as_text(input_fp)
+
+    test_fp = get_test_filepath('test_ua_dg.summarise_hyb_file.tab')
+    test_data = load_test_file_as_text(test_fp)
+
+    result = invoke_subcommand(
+        subcommand = 'summarise',
+        input_filename = '-',
+        stdin_contents = input_data,
+        cli_runner = cli_runner,
+        options = ['--top', '2', '--approximate', '--chunksize', '10']
+    )
+
+    assert result.exit_code == 0
+    assert result.output.rstrip().split('\n') == [line + '\t0' for line in test_data.split('\n')[:2]]
+
+
+def test_summarise_viennad_stdin(cli_runner):
+    '''Test the effect of running the summarise command with a viennad file passed to stdin.'''
+
+    input_fp = get_test_filepath('test_ua_dg.viennad')
+    input_data = load_test_file_as_text(input_fp)
+
+    test_fp = get_test_filepath('test_ua_dg.summarise_hyb_file.tab')
+    test_data = load_test_file_as_text(test_fp)
+
+    result = invoke_subcommand(
+        subcommand = 'summarise',
+        input_filename = '-',
+        stdin_contents = input_data,
+        cli_runner = cli_runner,
+        options = ['--input-format', 'viennad']
+    )
+
+    assert result.exit_code == 0
+    assert result.output == test_data + '\n'
+
+
+def test_index_and_query(cli_runner, tmpdir):
+    '''Test the effect of indexing a hyb file and querying it by bit description.'''
+    from hybtools.cli import main
+
+    input_fp = str(tmpdir.join('test_ua_dg.hyb'))
+    input_data = load_test_file_as_text(get_test_filepath('test_ua_dg.hyb'))
+    with open(input_fp, 'w') as input_file:
+        input_file.write(input_data)
+
+    result = cli_runner.invoke(main, ['query', input_fp, '--description', 'missing'])
+    assert result.exit_code == 2
+
+    result = cli_runner.invoke(main, ['index', input_fp])
+    assert result.exit_code == 0
+
+    description = input_data.split('\n')[0].split('\t')[3]
+    result = cli_runner.invoke(main, ['query', input_fp, '--description', description, '--bit', '1'])
+    assert result.exit_code == 0
+    assert result.output == ''.join(line + '\n' for line in input_data.rstrip('\n').split('\n')
+                                    if line.split('\t')[3] == description)
+
+
+def test_summarise_profile_json(cli_runner, tmpdir):
+    '''Test that profiling the summarise command records each stage without changing its output.'''
+    from hybtools.cli import main
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    test_data = load_test_file_as_text(get_test_filepath('test_ua_dg.summarise_hyb_file.tab'))
+    profile_fp = str(tmpdir.join('profile.json'))
+
+    result = cli_runner.invoke(main, ['--profile-json', profile_fp, 'summarise', input_fp])
+
+    assert result.exit_code == 0
+    assert result.output == test_data + '\n'
+
+    with open(profile_fp) as profile_file:
+        profile = json.load(profile_file)
+    stages = {stage['stage']: stage for stage in profile['stages']}
+    assert list(stages) == ['read', 'count', 'summarise', 'write']
+    assert stages['read']['rows'] == 100
+
+
+def test_summarise_with_state(cli_runner, tmpdir):
+    '''Test the effect of running the summarise command twice with a state file, with lines appended in between.'''
+    from hybtools.cli import main
+
+    input_data = load_test_file_as_text(get_test_filepath('test_ua_dg.hyb'))
+    test_data = load_test_file_as_text(get_test_filepath('test_ua_dg.summarise_hyb_file.tab'))
+    lines = input_data.split('\n')
+
+    input_fp = str(tmpdir.join('growing.hyb'))
+    state_fp = str(tmpdir.join('growing.state.npz'))
+
+    with open(input_fp, 'w') as input_file:
+        input_file.write('\n'.join(lines[:50]))
+    result = cli_runner.invoke(main, ['summarise', '--state', state_fp, input_fp])
+    assert result.exit_code == 0
+
+    with open(input_fp, 'a') as input_file:
+        input_file.write('\n' + '\n'.join(lines[50:]))
+    result = cli_runner.invoke(main, ['summarise', '--state', state_fp, input_fp])
+    assert result.exit_code == 0
+    assert result.output == test_data + '\n'
+
+
+def test_summarise_with_state_errors(cli_runner, tmpdir):
+    '''Test that only unsupported inputs to --state are usage errors, and not errors reading the hyb file.'''
+    from hybtools.cli import main
+
+    state_fp = str(tmpdir.join('empty.state.npz'))
+
+    result = cli_runner.invoke(main, ['--no-daemon', 'summarise', '--state', state_fp, '-'], input = '')
+    assert result.exit_code == 2
+
+    input_fp = str(tmpdir.join('empty.hyb'))
+    open(input_fp, 'w').close()
+    result = cli_runner.invoke(main, ['--no-daemon', 'summarise', input_fp])
+    assert result.exit_code == 1
+    assert not result.output.startswith('Usage')
+
+
+def test_filter_stdin(cli_runner):
+    '''Test the effect of running the filter command with input passed to stdin.'''
+
+    input_data = load_test_file_as_text(get_test_filepath('test_ua_dg.hyb'))
+
+    result = invoke_subcommand(
+        subcommand = 'filter',
+        input_filename = '-',
+        stdin_contents = input_data,
+        cli_runner = cli_runner,
+        options = ['--description', 'SNORD3A', '--max-energy', '-20']
+    )
+
+    assert result.exit_code == 0
+    assert result.output == ''.join(line + '\n' for line in input_data.rstrip('\n').split('\n')
+                                    if 'SNORD3A' in line and float(line.split('\t')[2]) <= -20)
+
+
+def test_contacts(cli_runner, tmpdir):
+    '''Test the effect of running the contacts command with npz and tsv output.'''
+    import numpy as np
+    from hybtools.cli import main
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    output_fp = str(tmpdir.join('contacts.npz'))
+
+    result = cli_runner.invoke(main, ['contacts', input_fp, '--bin-size', '100', '-o', output_fp])
+    assert result.exit_code == 0
+
+    result = cli_runner.invoke(main, ['contacts', input_fp, '--bin-size', '100', '--output-format', 'tsv'])
+    assert result.exit_code == 0
+    lines = result.output.rstrip('\n').split('\n')
+    assert lines[0] == 'transcript\tbit1-bin\tbit2-bin\tcount'
+
+    with np.load(output_fp) as npz:
+        assert int(npz['bin_size']) == 100
+        assert list(npz['count']) == [int(line.split('\t')[3]) for line in lines[1:]]
+
+
+def test_dedup_and_summarise_dedup(cli_runner, tmpdir):
+    '''Test the effect of running the dedup command, and the summarise command with --dedup, on duplicated reads.'''
+    from hybtools.cli import main
+
+    with open(get_test_filepath('test_ua_dg.hyb')) as input_file:
+        input_data = input_file.read()
+    input_fp = str(tmpdir.join('duplicated.hyb'))
+    with open(input_fp, 'w') as input_file:
+        input_file.write(input_data + input_data)
+
+    result = cli_runner.invoke(main, ['dedup', input_fp, '--hash-bits', '128'])
+    assert result.exit_code == 0
+    assert result.output == input_data + '200 reads, 100 unique\n'
+
+    test_data = load_test_file_as_text(get_test_filepath('test_ua_dg.summarise_hyb_file.tab'))
+
+    result = cli_runner.invoke(main, ['summarise', input_fp, '--dedup', '--chunksize', '30'])
+    assert result.exit_code == 0
+    assert [line.split('\t') for line in result.output.rstrip('\n').split('\n')] == \
+        [[hybrid, str(2 * int(count)), count] for hybrid, count in
+         (line.split('\t') for line in test_data.rstrip('\n').split('\n'))]
+
+
+def test_summarise_threads_engine(cli_runner):
+    '''Test the effect of running the summarise command with the threads parser engine.'''
+    from hybtools.cli import main
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    test_data = load_test_file_as_text(get_test_filepath('test_ua_dg.summarise_hyb_file.tab'))
+
+    for options in [[], ['--chunksize', '10'], ['--jobs', '2']]:
+        result = cli_runner.invoke(main, ['summarise', input_fp, '--engine', 'threads'] + options)
+        assert result.exit_code == 0
+        assert result.output == test_data + '\n'
+
+
+def test_summarise_with_daemon(cli_runner, tmpdir):
+    '''Test that the summarise command sends its work to a running daemon, and the serve command options.'''
+    import threading
+    from hybtools import server
+    from hybtools.cli import main
+
+    socket_path = str(tmpdir.join('hybtools.sock'))
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    test_data = load_test_file_as_text(get_test_filepath('test_ua_dg.summarise_hyb_file.tab'))
+
+    result = cli_runner.invoke(main, ['--socket', socket_path, 'serve', '--status'])
+    assert result.exit_code == 1
+
+    thread = threading.Thread(target = server.serve, args = (socket_path, 1 << 30))
+    thread.start()
+    for _ in range(100):
+        result = cli_runner.invoke(main, ['--socket', socket_path, 'serve', '--status'])
+        if result.exit_code == 0:
+            break
+        time.sleep(0.05)
+
+    try:
+        for _ in range(2):
+            result = cli_runner.invoke(main, ['--socket', socket_path, 'summarise', input_fp])
+            assert result.exit_code == 0
+            assert result.output == test_data + '\n'
+        result = cli_runner.invoke(main, ['--socket', socket_path, 'serve', '--status'])
+        assert json.loads(result.output)['entries'] == 2
+    finally:
+        result = cli_runner.invoke(main, ['--socket', socket_path, 'serve', '--stop'])
+        thread.join()
+
+    assert result.exit_code == 0
+
+
+def test_run(cli_runner, tmpdir):
+    '''Test the effect of running the run command with several outputs.'''
+    from hybtools.cli import main
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    test_data = load_test_file_as_text(get_test_filepath('test_ua_dg.summarise_hyb_file.tab'))
+    counts_fp = str(tmpdir.join('bit2-counts.tsv'))
+    filtered_fp = str(tmpdir.join('filtered.hyb'))
+
+    result = cli_runner.invoke(main, ['run', input_fp, '--chunksize', '30', '--summary', '-',
+                                      '--bit2-counts', counts_fp, '--filtered', filtered_fp, '--max-energy', '-20'])
+    assert result.exit_code == 0
+    assert result.output == test_data + '\n'
+
+    with open(counts_fp) as counts_file:
+        assert counts_file.readline() == 'bit2-description\tcount\n'
+    with open(filtered_fp) as filtered_file, open(input_fp) as input_file:
+        assert filtered_file.read() == ''.join(line for line in input_file if float(line.split('\t')[2]) <= -20)
+
+    result = cli_runner.invoke(main, ['run', input_fp])
+    assert result.exit_code != 0
+
+
+def test_sample(cli_runner):
+    '''Test the effect of running the sample command by size, with several jobs, and by fraction.'''
+    from hybtools.cli import main
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    with open(input_fp) as input_file:
+        input_data = input_file.read()
+
+    result = cli_runner.invoke(main, ['sample', input_fp, '-n', '10', '--seed', '5'])
+    assert result.exit_code == 0
+    sample = result.output.split('\n')[:-2]
+    assert len(sample) == 10
+    assert result.output.endswith('100 reads, 10 sampled\n')
+    assert set(sample) <= set(input_data.split('\n'))
+
+    result = cli_runner.invoke(main, ['sample', '-', '-n', '10', '--seed', '5', '--chunksize', '7'], input = input_data)
+    assert result.exit_code == 0
+    assert result.output.split('\n')[:-2] == sample
+
+    result = cli_runner.invoke(main, ['sample', input_fp, '-n', '10', '--seed', '5', '--jobs', '2'])
+    assert result.exit_code == 0
+    assert result.output.split('\n')[:-2] == sample
+
+    result = cli_runner.invoke(main, ['sample', input_fp, '--fraction', '1'])
+    assert result.exit_code == 0
+    assert result.output == input_data + '100 reads, 100 sampled\n'
+
+    result = cli_runner.invoke(main, ['sample', input_fp, '-n', '10', '--fraction', '0.5'])
+    assert result.exit_code != 0
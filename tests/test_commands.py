@@ -39,3 +39,119 @@ def test_summarise_file():
     assert result.equals(test_hyb_df)
 
 
+def test_summarise_file_in_chunks():
+    '''Test the effect of running the summarise command on a hyb file read a few lines at a time.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    test_fp = get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz')
+
+    result = commands.summarise(hyb_filepath = input_fp, chunksize = 7)
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    assert result.equals(test_hyb_df)
+
+
+def test_summarise_file_in_parallel():
+    '''Test the effect of running the summarise command on a hyb file split between several processes.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    test_fp = get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz')
+
+    result = commands.summarise(hyb_filepath = input_fp, chunksize = 7, jobs = 3)
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    assert result.equals(test_hyb_df)
+
+
+@pytest.mark.parametrize('chunksize', [None, 7])
+def test_summarise_file_in_parallel_with_comment_ranges(chunksize, tmpdir):
+    '''Test that summarising in parallel copes with byte ranges that only hold comment lines.'''
+
+    with open(get_test_filepath('test_ua_dg.hyb')) as input_file:
+        input_data = input_file.read()
+    input_fp = str(tmpdir.join('comments.hyb'))
+    with open(input_fp, 'w') as input_file:
+        input_file.write(''.join('# header line %d\n' % i for i in range(1000)) + input_data)
+
+    result = commands.summarise(hyb_filepath = input_fp, chunksize = chunksize, jobs = 4)
+    test_hyb_df = load_test_dataframe(get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz'))
+
+    assert result.equals(test_hyb_df)
+
+
+def test_summarise_samples():
+    '''Test the effect of running the summarise_samples command on several hyb files.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    test_fp = get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz')
+
+    result = commands.summarise_samples(hyb_filepaths = [input_fp, input_fp], jobs = 2, sample_names = ['a', 'b'])
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    assert list(result.columns) == ['hybrid-description', 'a', 'b']
+    assert result['a'].equals(result['b'])
+    assert set(result['hybrid-description']) == set(test_hyb_df['hybrid-description'])
+    assert result.set_index('hybrid-description')['a'].sort_index().equals(
+        test_hyb_df.set_index('hybrid-description')['hybrid-count'].sort_index().rename('a'))
+
+
+def test_summarise_viennad_file():
+    '''Test the effect of running the summarise command with a viennad file path given as input.'''
+
+    input_fp = get_test_filepath('test_ua_dg.viennad')
+    test_fp = get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz')
+
+    result = commands.summarise(hyb_filepath = input_fp)
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    assert result.equals(test_hyb_df)
+
+
+def test_summarise_incrementally(tmpdir):
+    '''Test that summarising a growing hyb file with a state file gives the same result as a full summary.'''
+
+    with open(get_test_filepath('test_ua_dg.hyb'), 'rb') as input_file:
+        lines = input_file.readlines()
+
+    hyb_fp = str(tmpdir.join('growing.hyb'))
+    state_fp = str(tmpdir.join('growing.state.npz'))
+
+    for stop in [40, 70, 100]:
+        with open(hyb_fp, 'wb') as hyb_file:
+            hyb_file.writelines(lines[:stop])
+
+        result = commands.summarise(hyb_filepath = hyb_fp, state_filepath = state_fp, chunksize = 7)
+
+        assert result.equals(commands.summarise(hyb_filepath = hyb_fp))
+
+    test_hyb_df = load_test_dataframe(get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz'))
+    assert result.equals(test_hyb_df)
+
+    # Changing a line that has already been counted makes the next summary count the whole file again.
+    with open(hyb_fp, 'wb') as hyb_file:
+        hyb_file.writelines([lines[2]] + lines[1:])
+
+    result = commands.summarise(hyb_filepath = hyb_fp, state_filepath = state_fp)
+    assert result.equals(commands.summarise(hyb_filepath = hyb_fp))
+    assert not result.equals(test_hyb_df)
+
+
+def test_summarise_incrementally_partial_line(tmpdir):
+    '''Test that a partly written last line of a growing hyb file is left uncounted until it is complete.'''
+
+    with open(get_test_filepath('test_ua_dg.hyb'), 'rb') as input_file:
+        lines = input_file.readlines()
+
+    hyb_fp = str(tmpdir.join('growing.hyb'))
+    state_fp = str(tmpdir.join('growing.state.npz'))
+    complete_fp = str(tmpdir.join('complete.hyb'))
+
+    for last_line in [b'\t'.join(lines[40].split(b'\t')[:5]), lines[40].rstrip(b'\n'), lines[40]]:
+        with open(hyb_fp, 'wb') as hyb_file:
+            hyb_file.writelines(lines[:40] + [last_line])
+        with open(complete_fp, 'wb') as hyb_file:
+            hyb_file.writelines(lines[:40 if last_line.count(b'\t') < 14 else 41])
+
+        result = commands.summarise(hyb_filepath = hyb_fp, state_filepath = state_fp)
+
+        assert result.equals(commands.summarise(hyb_filepath = complete_fp))
@@ -0,0 +1,108 @@
+"""test_compression.py: Unit tests for the compression module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import gzip
+import pandas as pd
+import pytest
+
+from hybtools import compression, hyb_io
+from tests.testutils import get_test_filepath, load_test_dataframe, write_bgzf_file
+
+
+def load_test_file_as_bytes(fp):
+    with open(fp, 'rb') as f:
+        return f.read()
+
+
+def write_gzip_file(fp, data):
+    with gzip.open(fp, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    with gzip.open(fp, 'ab') as f:
+        f.write(data[len(data) // 2:])
+
+
+def write_zstd_file(fp, data):
+    zstandard = pytest.importorskip('zstandard')
+    with open(fp, 'wb') as f:
+        f.write(zstandard.ZstdCompressor().compress(data))
+
+
+@pytest.mark.parametrize('expected_compression, write_file', [
+    ('gzip', write_gzip_file),
+    ('bgzf', write_bgzf_file),
+    ('zstd', write_zstd_file),
+])
+def test_open_compressed_file(tmpdir, expected_compression, write_file):
+    '''Test that compressed files are detected and decompressed.'''
+
+    data = load_test_file_as_bytes(get_test_filepath('test_ua_dg.hyb'))
+    input_fp = str(tmpdir.join('test_ua_dg.hyb.compressed'))
+    write_file(input_fp, data)
+
+    assert compression.detect_compression(input_fp) == expected_compression
+
+    with compression.open_file(input_fp, threads = 3) as f:
+        assert f.read() == data
+
+
+@pytest.mark.parametrize('write_file', [write_gzip_file, write_bgzf_file])
+def test_load_compressed_hyb_dataframe(tmpdir, write_file):
+    '''Test the effect of loading a hyb dataframe from a compressed hyb file.'''
+
+    data = load_test_file_as_bytes(get_test_filepath('test_ua_dg.hyb'))
+    input_fp = str(tmpdir.join('test_ua_dg.hyb.gz'))
+    write_file(input_fp, data)
+
+    test_hyb_df = load_test_dataframe(get_test_filepath('test_ua_dg.hyb_df.pkl.gz'))
+
+    assert hyb_io.load_hyb_dataframe(hyb_filepath = input_fp).equals(test_hyb_df)
+    assert pd.concat(hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, chunksize = 7)).equals(test_hyb_df)
+
+
+@pytest.mark.parametrize('write_file', [write_gzip_file, write_bgzf_file])
+@pytest.mark.parametrize('kept_fraction', [0.1, 0.5, 0.99])
+def test_truncated_compressed_file(tmpdir, write_file, kept_fraction):
+    '''Test that reading a truncated compressed file raises an error rather than returning part of the data.'''
+
+    data = load_test_file_as_bytes(get_test_filepath('test_ua_dg.hyb'))
+    input_fp = str(tmpdir.join('test_ua_dg.hyb.gz'))
+    write_file(input_fp, data)
+
+    compressed_data = load_test_file_as_bytes(input_fp)
+    with open(input_fp, 'wb') as f:
+        f.write(compressed_data[:int(len(compressed_data) * kept_fraction)])
+
+    with pytest.raises(IOError):
+        with compression.open_file(input_fp) as f:
+            f.read()
+
+
+def test_uncompressed_file():
+    '''Test that uncompressed files are read unchanged.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+
+    assert compression.detect_compression(input_fp) is None
+
+    with compression.open_file(input_fp) as f:
+        assert f.read() == load_test_file_as_bytes(input_fp)
@@ -0,0 +1,102 @@
+"""test_contacts.py: Unit tests for the contacts module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import numpy as np
+import pandas as pd
+
+from hybtools import contacts, hyb_io
+from tests.testutils import get_test_filepath
+
+
+def test_count_contacts():
+    '''Test that the contacts of a hyb file match those counted naively from the midpoints of its bits.'''
+
+    hyb_df = hyb_io.load_hyb_dataframe(get_test_filepath('test_ua_dg.hyb'))
+    contacts_df = contacts.count_contacts(hyb_df, bin_size = 50)
+
+    intramolecular_df = hyb_df[hyb_df['bit1-description'] == hyb_df['bit2-description']]
+    expected_df = pd.DataFrame({
+        'transcript': intramolecular_df['bit1-description'].values,
+        'bit1-bin': ((intramolecular_df['bit1-transcript_coordinates_start'].values +
+                      intramolecular_df['bit1-transcript_coordinates_stop'].values) // 2 - 1) // 50,
+        'bit2-bin': ((intramolecular_df['bit2-transcript_coordinates_start'].values +
+                      intramolecular_df['bit2-transcript_coordinates_stop'].values) // 2 - 1) // 50,
+    })
+    expected_df = expected_df.groupby(contacts.contacts_df_columns[:3]).size().rename('count').reset_index()
+
+    assert len(contacts_df) > 0
+    assert contacts_df['count'].sum() == len(intramolecular_df)
+    assert contacts_df.values.tolist() == expected_df.values.tolist()
+
+
+def test_count_contacts_in_chunks():
+    '''Test that counting contacts a chunk at a time gives the same table as counting them all at once.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    hyb_df = hyb_io.load_hyb_dataframe(input_fp)
+
+    for span in [False, True]:
+        contacts_df = contacts.count_contacts(hyb_df, bin_size = 20, span = span)
+        chunks = hyb_io.load_hyb_dataframe(input_fp, chunksize = 3, compact = True)
+        chunked_contacts_df = contacts.count_contacts_in_chunks(chunks, bin_size = 20, span = span)
+        assert chunked_contacts_df.values.tolist() == contacts_df.values.tolist()
+
+    empty_contacts_df = contacts.count_contacts_in_chunks([])
+    assert list(empty_contacts_df.columns) == contacts.contacts_df_columns
+    assert len(empty_contacts_df) == 0
+
+
+def test_count_contacts_span():
+    '''Test that a hybrid is counted in every pair of bins that its bits cover with span.'''
+
+    hyb_df = hyb_io.load_hyb_dataframe(get_test_filepath('test_ua_dg.hyb'))
+    hyb_df = hyb_df[hyb_df['bit1-description'] == hyb_df['bit2-description']].iloc[:1].copy()
+    hyb_df['bit1-transcript_coordinates_start'] = 5
+    hyb_df['bit1-transcript_coordinates_stop'] = 25
+    hyb_df['bit2-transcript_coordinates_start'] = 41
+    hyb_df['bit2-transcript_coordinates_stop'] = 50
+
+    contacts_df = contacts.count_contacts(hyb_df, bin_size = 10, span = True)
+
+    assert contacts_df[['bit1-bin', 'bit2-bin', 'count']].values.tolist() == [[0, 4, 1], [1, 4, 1], [2, 4, 1]]
+
+    contacts_df = contacts.count_contacts(hyb_df, bin_size = 10, transcripts = ['missing'])
+    assert len(contacts_df) == 0
+
+
+def test_write_contacts_npz(tmpdir):
+    '''Test that a contact table written as npz can be loaded back.'''
+
+    hyb_df = hyb_io.load_hyb_dataframe(get_test_filepath('test_ua_dg.hyb'))
+    contacts_df = contacts.count_contacts(hyb_df, bin_size = 50)
+
+    output_fp = str(tmpdir.join('contacts'))
+    contacts.write_contacts_npz(contacts_df, output_fp, 50)
+
+    with np.load(output_fp) as npz:
+        assert int(npz['bin_size']) == 50
+        assert list(npz['transcripts'][npz['transcript']]) == list(contacts_df['transcript'])
+        assert list(npz['bit1_bin']) == list(contacts_df['bit1-bin'])
+        assert list(npz['bit2_bin']) == list(contacts_df['bit2-bin'])
+        assert list(npz['count']) == list(contacts_df['count'])
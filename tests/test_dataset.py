@@ -0,0 +1,86 @@
+"""test_dataset.py: Unit tests for the dataset module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import pandas as pd
+import pytest
+
+from hybtools import dataset, hyb_filter, hyb_io, summarise
+from tests.testutils import get_test_filepath
+
+
+def test_dataset_collect():
+    '''Test that collecting a filtered and selected dataset gives the same rows as filtering the loaded dataframe.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    hyb_df = hyb_io.load_hyb_dataframe(input_fp)
+
+    pd.testing.assert_frame_equal(dataset.HybDataset(input_fp, chunksize = 7).collect(), hyb_df)
+
+    test_dataset = dataset.HybDataset(input_fp, chunksize = 7) \
+        .filter(max_energy = -20) \
+        .select('predicted_binding_energy', 'bit1-description') \
+        .filter(hyb_filter.HybFilter(description = 'rRNA$', bit = 2))
+
+    assert test_dataset.columns == ['predicted_binding_energy', 'bit1-description', 'bit2-description']
+
+    mask = (hyb_df['predicted_binding_energy'] <= -20) & hyb_df['bit2-description'].str.endswith('rRNA')
+    assert 0 < mask.sum() < len(hyb_df)
+    pd.testing.assert_frame_equal(test_dataset.collect(),
+                                  hyb_df.loc[mask, ['predicted_binding_energy', 'bit1-description']]
+                                  .reset_index(drop = True))
+
+
+def test_dataset_count():
+    '''Test that counting a dataset gives the number of reads, or the hybrid summary if it is grouped by hybrid.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    hyb_df = hyb_io.load_hyb_dataframe(input_fp)
+
+    test_dataset = dataset.HybDataset(input_fp, chunksize = 7)
+
+    assert test_dataset.count().columns == ['predicted_binding_energy']
+    assert test_dataset.count().collect() == len(hyb_df)
+    assert test_dataset.filter(max_energy = -20).count().collect() == (hyb_df['predicted_binding_energy'] <= -20).sum()
+
+    grouped_dataset = test_dataset.group_by_hybrid(unordered = True).count()
+    assert 'read_sequence' not in grouped_dataset.columns
+    pd.testing.assert_frame_equal(grouped_dataset.collect(),
+                                  summarise.create_summary_dataframe(hyb_df, unordered = True))
+
+
+def test_dataset_invalid_plans():
+    '''Test that plans with steps in an invalid order raise a ValueError.'''
+
+    test_dataset = dataset.HybDataset(get_test_filepath('test_ua_dg.hyb'))
+
+    with pytest.raises(ValueError):
+        test_dataset.select('missing')
+    with pytest.raises(ValueError):
+        test_dataset.select('bit1-description').select('bit2-description')
+    with pytest.raises(ValueError):
+        test_dataset.group_by_hybrid().collect()
+    with pytest.raises(ValueError):
+        test_dataset.group_by_hybrid().filter(max_energy = -20)
+    with pytest.raises(ValueError):
+        test_dataset.count().count()
@@ -0,0 +1,106 @@
+"""test_dedup.py: Unit tests for the dedup module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from hybtools import dedup, hyb_filter, hyb_io
+from tests.testutils import get_test_filepath
+
+
+def load_duplicated_hyb_dataframe():
+    '''Load the test hyb file with its reads repeated in another order, some with shifted bit coordinates.'''
+
+    hyb_df = hyb_io.load_hyb_dataframe(get_test_filepath('test_ua_dg.hyb'))
+    hyb_df = pd.concat([hyb_df, hyb_df.sample(frac = 1, random_state = 1), hyb_df.iloc[:30]], ignore_index = True)
+    hyb_df.loc[hyb_df.index[-10:], 'bit1-transcript_coordinates_start'] += 1
+
+    return(hyb_df)
+
+
+@pytest.mark.parametrize('key', dedup.DEDUP_KEYS)
+@pytest.mark.parametrize('hash_bits', dedup.HASH_BITS)
+@pytest.mark.parametrize('max_hashes', [1 << 20, 3, 50])
+def test_read_deduplicator(key, hash_bits, max_hashes, tmpdir):
+    '''Test that the first occurrence of each read is kept, whether or not the hashes are spilled to disk.'''
+
+    hyb_df = load_duplicated_hyb_dataframe()
+    expected_mask = ~hyb_df.duplicated(dedup.dedup_columns[key]).values
+
+    with dedup.ReadDeduplicator(key, hash_bits, max_hashes = max_hashes, spill_dir = str(tmpdir),
+                                n_partitions = 7) as deduplicator:
+        mask = np.concatenate([deduplicator.mask(hyb_df.iloc[i:i + 9]) for i in range(0, len(hyb_df), 9)])
+        assert deduplicator.spilled == (max_hashes < expected_mask.sum())
+
+    assert mask.tolist() == expected_mask.tolist()
+    assert deduplicator.raw_count == len(hyb_df)
+    assert deduplicator.unique_count == expected_mask.sum()
+    assert tmpdir.listdir() == []
+
+
+def test_hash_reads_compact(tmpdir):
+    '''Test that reads have the same hashes whether or not the hyb file was loaded with compact dtypes.
+
+    One line is missing a transcript coordinate, which compact loading keeps as float NaN.
+    '''
+
+    lines = open(get_test_filepath('test_ua_dg.hyb'), 'rb').read().splitlines(True)
+    fields = lines[5].split(b'\t')
+    fields[6] = b''
+    lines[5] = b'\t'.join(fields)
+    input_fp = str(tmpdir.join('missing_coordinate.hyb'))
+    with open(input_fp, 'wb') as input_file:
+        input_file.write(b''.join(lines))
+
+    hyb_df = hyb_io.load_hyb_dataframe(input_fp)
+    compact_hyb_df = hyb_io.load_hyb_dataframe(input_fp, compact = True)
+
+    for hash_bits in dedup.HASH_BITS:
+        hashes = dedup.hash_reads(hyb_df, 'coordinates', hash_bits)
+        assert hashes.dtype.itemsize * 8 == hash_bits
+        assert len(np.unique(hashes)) == len(hyb_df)
+        assert (hashes == dedup.hash_reads(compact_hyb_df, 'coordinates', hash_bits)).all()
+
+
+def test_filter_hyb_lines_with_deduplicator(tmpdir):
+    '''Test that a deduplicator passed to filter_hyb_lines keeps the first line of each read.'''
+
+    lines = open(get_test_filepath('test_ua_dg.hyb'), 'rb').read().splitlines(True)
+    input_fp = str(tmpdir.join('duplicated.hyb'))
+    with open(input_fp, 'wb') as input_file:
+        input_file.write(b''.join(lines + lines[::-1]))
+
+    with dedup.ReadDeduplicator() as deduplicator:
+        output = b''.join(hyb_filter.filter_hyb_lines(input_fp, deduplicator, chunksize = 11))
+
+    assert output == b''.join(lines)
+    assert (deduplicator.raw_count, deduplicator.unique_count) == (2 * len(lines), len(lines))
+
+
+def test_read_deduplicator_arguments():
+    with pytest.raises(ValueError):
+        dedup.ReadDeduplicator(key = 'missing')
+    with pytest.raises(ValueError):
+        dedup.ReadDeduplicator(hash_bits = 32)
@@ -0,0 +1,55 @@
+"""test_descriptions.py: Unit tests for the descriptions module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import pytest
+
+from hybtools import descriptions
+
+
+def test_parse_description():
+    '''Test the splitting of bit descriptions into their fields.'''
+
+    result = descriptions.parse_description('snoID0273_UnsplicedGene_SNORD3A_snoRNA')
+    assert result == ('snoID0273', 'UnsplicedGene', 'SNORD3A', 'snoRNA')
+
+    result = descriptions.parse_description('ENSG00000XXXXXX_U13369_pre_47S_rRNA')
+    assert result.gene == 'pre_47S'
+    assert result.biotype == 'rRNA'
+
+    result = descriptions.parse_description('unannotated_region')
+    assert result.gene == 'unannotated_region'
+    assert result.biotype == 'region'
+
+
+def test_get_description_levels():
+    '''Test the mapping of descriptions to their transcripts, genes and biotypes.'''
+
+    input_descriptions = ['snoID0273_UnsplicedGene_SNORD3A_snoRNA', 'ENSG00000XXXXXX_U13369_pre47S_rRNA']
+
+    assert list(descriptions.get_description_levels(input_descriptions, 'transcript')) == input_descriptions
+    assert list(descriptions.get_description_levels(input_descriptions, 'gene')) == ['SNORD3A', 'pre47S']
+    assert list(descriptions.get_description_levels(input_descriptions, 'biotype')) == ['snoRNA', 'rRNA']
+
+    with pytest.raises(ValueError):
+        descriptions.get_description_levels(input_descriptions, 'exon')
@@ -0,0 +1,136 @@
+"""test_hyb_cache.py: Unit tests for the hyb_cache module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import numpy as np
+import os
+import pandas as pd
+import pytest
+import shutil
+
+from hybtools import hyb_cache, hyb_io
+from tests.testutils import get_test_filepath, load_test_dataframe
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_load_hyb_dataframe_through_cache(tmpdir, compact):
+    '''Test that a hyb dataframe loaded from the cache is the same as one parsed from the hyb file.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    cache = hyb_cache.HybCache(cache_dir = str(tmpdir))
+
+    assert cache.load(input_fp, compact) is None
+
+    parsed_hyb_df = hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, compact = compact, cache = cache)
+    assert os.path.exists(cache.get_cache_filepath(input_fp))
+
+    result = cache.load(input_fp, compact)
+
+    assert result.equals(parsed_hyb_df)
+    assert result.dtypes.equals(parsed_hyb_df.dtypes)
+    assert cache.load(input_fp, not compact) is None
+    assert hyb_cache.HybCache(cache_dir = str(tmpdir), rebuild = True).load(input_fp, compact) is None
+
+
+def test_cache_invalidated_by_change(tmpdir):
+    '''Test that the cache is not used once the hyb file has changed.'''
+
+    input_fp = str(tmpdir.join('test_ua_dg.hyb'))
+    shutil.copy(get_test_filepath('test_ua_dg.hyb'), input_fp)
+    test_hyb_df = load_test_dataframe(get_test_filepath('test_ua_dg.hyb_df.pkl.gz'))
+
+    cache = hyb_cache.HybCache()
+    hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, cache = cache)
+    assert cache.get_cache_filepath(input_fp) == input_fp + '.hybcache.npz'
+    assert cache.load(input_fp, False).equals(test_hyb_df)
+
+    with open(input_fp, 'r') as f:
+        lines = f.readlines()
+    with open(input_fp, 'w') as f:
+        f.writelines(lines[:50])
+
+    assert cache.load(input_fp, False) is None
+    assert hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, cache = cache).equals(test_hyb_df.iloc[:50])
+
+
+def test_cache_strings_without_pickle(tmpdir):
+    '''Test that string columns with missing and non-ASCII values are cached without pickled objects.'''
+
+    input_fp = str(tmpdir.join('strings.hyb'))
+    shutil.copy(get_test_filepath('test_ua_dg.hyb'), input_fp)
+    hyb_df = hyb_io.load_hyb_dataframe(input_fp)
+    hyb_df.loc[0, 'unique_sequence_id'] = 'r\u00e9ad'
+    hyb_df.loc[1, 'read_sequence'] = np.nan
+
+    cache = hyb_cache.HybCache()
+    cache.save(input_fp, False, hyb_df)
+
+    with np.load(cache.get_cache_filepath(input_fp), allow_pickle=False) as npz:
+        assert all(npz[name].dtype != object for name in npz.files)
+
+    pd.testing.assert_frame_equal(cache.load(input_fp, False), hyb_df)
+
+
+def test_cache_ignores_pickled_files(tmpdir):
+    '''Test that a cache file holding pickled objects is not loaded.'''
+
+    input_fp = str(tmpdir.join('pickled.hyb'))
+    shutil.copy(get_test_filepath('test_ua_dg.hyb'), input_fp)
+
+    cache = hyb_cache.HybCache()
+    with open(cache.get_cache_filepath(input_fp), 'wb') as cache_file:
+        np.savez(cache_file, version = np.array(hyb_cache.CACHE_VERSION), compact = np.array(False),
+                 fingerprint = np.array(hyb_cache.fingerprint_hyb_file(input_fp)),
+                 columns = np.array(['unique_sequence_id'], dtype=object))
+
+    assert cache.load(input_fp, False) is None
+
+
+def test_memory_cache(tmpdir):
+    '''Test that the memory cache evicts the least recently used entries and drops entries of changed files.'''
+
+    input_fps = [str(tmpdir.join('test_%d.hyb' % i)) for i in range(3)]
+    for input_fp in input_fps:
+        shutil.copy(get_test_filepath('test_ua_dg.hyb'), input_fp)
+
+    cache = hyb_cache.MemoryHybCache(memory_budget = 250)
+    for input_fp in input_fps[:2]:
+        cache.put('summary', input_fp, input_fp, 100)
+    assert cache.get('summary', input_fps[0]) == input_fps[0]
+
+    cache.put('summary', input_fps[2], input_fps[2], 100)
+    assert (len(cache), cache.nbytes) == (2, 200)
+    assert cache.get('summary', input_fps[1]) is None
+    assert cache.get('summary', input_fps[0]) == input_fps[0]
+
+    cache.put('summary', input_fps[1], input_fps[1], 300)
+    assert cache.get('summary', input_fps[1]) is None
+
+    with open(input_fps[0], 'a') as f:
+        f.write('\n')
+    assert cache.get('summary', input_fps[0]) is None
+    assert (len(cache), cache.nbytes) == (1, 100)
+
+    cache = hyb_cache.MemoryHybCache(memory_budget = 1 << 30)
+    hyb_df = hyb_io.load_hyb_dataframe(hyb_filepath = input_fps[2], compact = True, cache = cache)
+    assert cache.load(input_fps[2], True) is hyb_df
+    assert cache.load(input_fps[2], False) is None
@@ -0,0 +1,73 @@
+"""test_hyb_filter.py: Unit tests for the hyb_filter module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import gzip
+
+from hybtools import hyb_filter, hyb_io
+from tests.testutils import get_test_filepath
+
+
+def filter_test_file(hyb_filepath, chunksize=7, **filter_options):
+    return(b''.join(hyb_filter.filter_hyb_lines(hyb_filepath, hyb_filter.HybFilter(**filter_options),
+                                                chunksize = chunksize)))
+
+
+def test_filter_hyb_lines():
+    '''Test that filtering a hyb file keeps the same lines as masking the loaded dataframe.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    hyb_df = hyb_io.load_hyb_dataframe(input_fp)
+    with open(input_fp, 'rb') as input_file:
+        lines = input_file.readlines()
+
+    result = filter_test_file(input_fp, max_energy = -20, max_mapping_score = 1e-10)
+    mask = (hyb_df['predicted_binding_energy'] <= -20) & (hyb_df['bit1-mapping_score'] <= 1e-10) & \
+        (hyb_df['bit2-mapping_score'] <= 1e-10)
+    assert 0 < mask.sum() < len(hyb_df)
+    assert result == b''.join(line for line, keep in zip(lines, mask) if keep)
+
+    result = filter_test_file(input_fp, description = 'snoRNA$', bit = 2)
+    mask = hyb_df['bit2-description'].str.endswith('snoRNA')
+    assert result == b''.join(line for line, keep in zip(lines, mask) if keep)
+
+    result = filter_test_file(input_fp, regions = [('ENSG00000XXXXXX_U13369_pre47S_rRNA', 4100, 4200)])
+    assert result.split(b'\n')[0] == lines[0].rstrip(b'\n')
+
+    assert filter_test_file(input_fp) == b''.join(lines)
+
+
+def test_filter_hyb_lines_comments(tmpdir):
+    '''Test that filtering a gzip compressed hyb file keeps comment lines and drops blank lines.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    with open(input_fp, 'rb') as input_file:
+        lines = input_file.readlines()
+
+    gzip_fp = str(tmpdir.join('test_ua_dg.hyb.gz'))
+    with gzip.open(gzip_fp, 'wb') as gzip_file:
+        gzip_file.writelines([b'# header\n'] + lines[:5] + [b'\n'] + lines[5:])
+
+    result = filter_test_file(gzip_fp, chunksize = 3, min_energy = -1000)
+
+    assert result == b''.join([b'# header\n'] + lines)
@@ -0,0 +1,82 @@
+"""test_hyb_index.py: Unit tests for the hyb_index module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import os
+import pytest
+
+from hybtools import hyb_index, hyb_io
+from tests.testutils import get_test_filepath
+
+
+@pytest.fixture
+def hyb_filepath(tmpdir):
+    '''Copy the test hyb file, with a comment and a blank line added, to a temporary directory.'''
+
+    hyb_fp = str(tmpdir.join('test_ua_dg.hyb'))
+    with open(get_test_filepath('test_ua_dg.hyb'), 'rb') as input_file, open(hyb_fp, 'wb') as hyb_file:
+        lines = input_file.readlines()
+        hyb_file.writelines(lines[:10] + [b'# comment\n', b'\n'] + lines[10:])
+    return(hyb_fp)
+
+
+def test_build_hyb_index(hyb_filepath):
+    '''Test that looking up lines in a hyb file index finds the same lines as a full scan of the file.'''
+
+    index = hyb_index.build_hyb_index(hyb_filepath)
+    hyb_df = hyb_io.load_hyb_dataframe(hyb_filepath)
+
+    assert os.path.isdir(hyb_filepath + '.hybidx')
+    assert index.n_lines == len(hyb_df)
+
+    unique_sequence_ids = [hyb_df['unique_sequence_id'][i] for i in [0, 10, 99]]
+    rows = index.find_sequence_ids(unique_sequence_ids + ['missing'])
+    assert list(rows) == [0, 10, 99]
+    assert [line.split(b'\t')[0].decode() for line in index.read_lines(rows)] == unique_sequence_ids
+
+    description = hyb_df['bit1-description'][0]
+    rows = index.find_descriptions([description, 'missing'])
+    assert list(rows) == list(hyb_df.index[(hyb_df['bit1-description'] == description) |
+                                           (hyb_df['bit2-description'] == description)])
+    rows = index.find_descriptions([description], bit = 2)
+    assert list(rows) == list(hyb_df.index[hyb_df['bit2-description'] == description])
+
+    hybrid = '%s:::%s' % (hyb_df['bit1-description'][3], hyb_df['bit2-description'][3])
+    rows = index.find_hybrids([hybrid])
+    assert list(rows) == list(hyb_df.index[hyb_df['bit1-description'] + ':::' + hyb_df['bit2-description'] == hybrid])
+
+    # Descriptions longer than any in the index must not be truncated to match one of them.
+    longest_description = max(list(hyb_df['bit1-description']) + list(hyb_df['bit2-description']), key = len)
+    assert len(index.find_descriptions([longest_description + '_BOGUS'])) == 0
+    assert len(index.find_hybrids(['%s_BOGUS:::%s' % (longest_description, longest_description)])) == 0
+
+
+def test_stale_hyb_index(hyb_filepath):
+    '''Test that an index is rejected once its hyb file has changed.'''
+
+    hyb_index.build_hyb_index(hyb_filepath)
+
+    with open(hyb_filepath, 'ab') as hyb_file:
+        hyb_file.write(b'\n')
+
+    with pytest.raises(ValueError):
+        hyb_index.HybIndex(hyb_filepath)
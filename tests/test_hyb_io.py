@@ -21,6 +21,7 @@
 # ______________________________________________________________________________
 
 
+import pandas as pd
 import pytest
 
 from hybtools import hyb_io
@@ -37,3 +38,137 @@ def test_load_hyb_dataframe():
     test_hyb_df = load_test_dataframe(test_fp)
 
     assert result.equals(test_hyb_df)
+
+
+def test_load_hyb_dataframe_in_chunks():
+    '''Test the effect of loading a hyb dataframe a few lines at a time.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    test_fp = get_test_filepath('test_ua_dg.hyb_df.pkl.gz')
+
+    result = pd.concat(hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, chunksize = 7))
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    assert result.equals(test_hyb_df)
+
+
+def test_load_hyb_dataframe_compact():
+    '''Test that loading a hyb dataframe with compact dtypes preserves its values and reduces its memory use.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+
+    hyb_df = hyb_io.load_hyb_dataframe(hyb_filepath = input_fp)
+    result = hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, compact = True)
+
+    assert result['bit1-description'].dtype.name == 'category'
+    assert result['bit2-mapping_score'].dtype.name == 'float32'
+    assert result['bit1-read_coordinates_start'].dtype.itemsize < 8
+    assert result['bit1-description'].astype(object).equals(hyb_df['bit1-description'])
+    assert (result['bit2-transcript_coordinates_stop'] == hyb_df['bit2-transcript_coordinates_stop']).all()
+    assert result.memory_usage(deep = True).sum() < hyb_df.memory_usage(deep = True).sum()
+
+
+@pytest.mark.parametrize('engine', hyb_io.ENGINES)
+def test_load_hyb_dataframe_compact_missing_coordinates(engine, tmpdir):
+    '''Test that a missing coordinate is loaded as NaN with compact dtypes, rather than failing the parse.'''
+
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow.csv')
+
+    with open(get_test_filepath('test_ua_dg.hyb')) as input_file:
+        lines = input_file.readlines()
+    fields = lines[0].split('\t')
+    fields[6] = ''
+    input_fp = str(tmpdir.join('missing.hyb'))
+    with open(input_fp, 'w') as input_file:
+        input_file.write(''.join(['\t'.join(fields)] + lines[1:]))
+
+    result = hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, compact = True, engine = engine)
+
+    assert result['bit1-transcript_coordinates_start'].isnull().sum() == 1
+    assert result['bit1-transcript_coordinates_stop'].dtype.itemsize < 8
+    pd.testing.assert_series_equal(result['bit1-transcript_coordinates_start'],
+                                   hyb_io.load_hyb_dataframe(input_fp)['bit1-transcript_coordinates_start'])
+
+
+def test_load_hyb_dataframe_ranges():
+    '''Test that loading a hyb file in byte ranges gives the same dataframe as loading it all at once.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    test_fp = get_test_filepath('test_ua_dg.hyb_df.pkl.gz')
+
+    hyb_file_ranges = hyb_io.find_hyb_file_ranges(input_fp, 4)
+
+    assert len(hyb_file_ranges) == 4
+    assert hyb_file_ranges[0][0] == 0
+    assert all(stop == start for (_, stop), (start, _) in zip(hyb_file_ranges[:-1], hyb_file_ranges[1:]))
+
+    result = pd.concat([hyb_io.load_hyb_dataframe_range(input_fp, start, stop) for start, stop in hyb_file_ranges],
+                       ignore_index = True)
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    assert result.equals(test_hyb_df)
+
+
+@pytest.mark.parametrize('engine', ['threads', 'pyarrow'])
+@pytest.mark.parametrize('compact', [False, True])
+def test_load_hyb_dataframe_engines(engine, compact, tmpdir, monkeypatch):
+    '''Test that the block parsing engines give the same dataframe as the pandas engine, with comment lines.
+
+    The comment lines include a commented-out hyb line in the middle of the file, which has as many fields as the
+    other lines.
+    '''
+
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow.csv')
+
+    with open(get_test_filepath('test_ua_dg.hyb')) as input_file:
+        lines = input_file.readlines()
+    input_fp = str(tmpdir.join('comments.hyb'))
+    with open(input_fp, 'w') as input_file:
+        input_file.write(''.join(['# header\n'] + lines[:40] + ['\n', '# comment\n', '#' + lines[40]] + lines[40:]))
+
+    # Small blocks, so that the test file is parsed as several blocks by several threads.
+    monkeypatch.setattr(hyb_io, 'BLOCK_SIZE', 2000)
+
+    test_hyb_df = hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, compact = compact)
+    result = hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, compact = compact, engine = engine)
+
+    pd.testing.assert_frame_equal(result, test_hyb_df)
+
+    chunks = list(hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, chunksize = 7, compact = compact,
+                                            engine = engine))
+
+    assert max(len(chunk) for chunk in chunks) == 7
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index = True).astype(test_hyb_df.dtypes.to_dict()),
+                                  test_hyb_df)
+
+    with pytest.raises(ValueError):
+        hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, engine = 'missing')
+
+
+@pytest.mark.parametrize('engine', hyb_io.ENGINES)
+def test_load_hyb_dataframe_columns(engine):
+    '''Test that loading some columns of a hyb file gives those columns of the whole dataframe.'''
+
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow.csv')
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    test_hyb_df = hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, compact = True)
+    columns = ['bit2-description', 'predicted_binding_energy', 'bit1-transcript_coordinates_start']
+
+    result = hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, compact = True, engine = engine, columns = columns)
+    pd.testing.assert_frame_equal(result, test_hyb_df[columns])
+
+    chunks = list(hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, chunksize = 30, compact = True,
+                                            engine = engine, columns = columns))
+    assert [list(chunk.columns) for chunk in chunks] == [columns] * len(chunks)
+    assert sum(len(chunk) for chunk in chunks) == len(test_hyb_df)
+
+    result = hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, engine = engine, columns = ['comment', 'annotations'])
+    assert list(result.columns) == ['comment', 'annotations']
+    assert result['comment'].isnull().all()
+
+    with pytest.raises(ValueError):
+        hyb_io.load_hyb_dataframe(hyb_filepath = input_fp, columns = ['missing'])
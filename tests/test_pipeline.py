@@ -0,0 +1,142 @@
+"""test_pipeline.py: Unit tests for the pipeline module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import io
+import numpy as np
+import pandas as pd
+import pytest
+
+from hybtools import hyb_filter, hyb_io, pipeline, summarise
+from tests.testutils import get_test_filepath
+
+
+def run_test_pipeline(chunksize, output_file):
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+
+    test_pipeline = pipeline.Pipeline() \
+        .add('summary', pipeline.HybridSummary(unordered = True)) \
+        .add('bit1-counts', pipeline.DescriptionCounts(bit = 1)) \
+        .add('energy-stats', pipeline.EnergyStatistics()) \
+        .add('filtered', pipeline.FilteredLines(hyb_filter.HybFilter(max_energy = -20), output_file))
+
+    return(test_pipeline.run(input_fp, chunksize = chunksize))
+
+
+def test_pipeline():
+    '''Test that each analysis of a pipeline gives the same result as the equivalent whole-file analysis.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    hyb_df = hyb_io.load_hyb_dataframe(input_fp)
+    with open(input_fp, 'rb') as input_file:
+        lines = input_file.readlines()
+
+    output_file = io.BytesIO()
+    results = run_test_pipeline(1000, output_file)
+
+    pd.testing.assert_frame_equal(results['summary'],
+                                  summarise.create_summary_dataframe(hyb_df = hyb_df, unordered = True))
+
+    counts = hyb_df['bit1-description'].value_counts()
+    assert dict(zip(results['bit1-counts']['bit1-description'], results['bit1-counts']['count'])) == counts.to_dict()
+    assert list(results['bit1-counts']['count']) == sorted(counts, reverse = True)
+
+    energy_stats = results['energy-stats'].set_index('hybrid-description')
+    hybrid_descriptions = hyb_df['bit1-description'] + ':::' + hyb_df['bit2-description']
+    expected = hyb_df.groupby(hybrid_descriptions)['predicted_binding_energy'].agg(['count', 'mean', 'min', 'max'])
+    expected = expected.loc[energy_stats.index]
+    assert list(energy_stats['hybrid-count']) == list(expected['count'])
+    for statistic in ['mean', 'min', 'max']:
+        np.testing.assert_allclose(energy_stats['energy-' + statistic], expected[statistic], rtol = 1e-6)
+
+    mask = hyb_df['predicted_binding_energy'] <= -20
+    assert 0 < mask.sum() < len(hyb_df)
+    assert results['filtered'] == mask.sum()
+    assert output_file.getvalue() == b''.join(line for line, keep in zip(lines, mask) if keep)
+
+
+def test_pipeline_in_chunks():
+    '''Test that running a pipeline in chunks gives the same results as running it on the whole file.'''
+
+    whole_output_file, chunked_output_file = io.BytesIO(), io.BytesIO()
+    whole_results = run_test_pipeline(1000, whole_output_file)
+    chunked_results = run_test_pipeline(7, chunked_output_file)
+
+    for name in ['summary', 'bit1-counts']:
+        pd.testing.assert_frame_equal(chunked_results[name], whole_results[name])
+    pd.testing.assert_frame_equal(chunked_results['energy-stats'], whole_results['energy-stats'],
+                                  check_less_precise = True)
+    assert chunked_results['filtered'] == whole_results['filtered']
+    assert chunked_output_file.getvalue() == whole_output_file.getvalue()
+
+
+def test_pipeline_filtered_comments(tmpdir):
+    '''Test that filtered lines keep comment lines, as hyb_filter.filter_hyb_lines does.'''
+
+    with open(get_test_filepath('test_ua_dg.hyb'), 'rb') as input_file:
+        lines = input_file.readlines()
+    lines = [b'# header\n'] + lines[:20] + [b'# one\n', b'# two\n', b'# three\n'] + lines[20:] + [b'# end\n']
+    input_fp = str(tmpdir.join('comments.hyb'))
+    with open(input_fp, 'wb') as input_file:
+        input_file.write(b''.join(lines))
+
+    test_filter = hyb_filter.HybFilter(max_energy = -20)
+    expected = b''.join(hyb_filter.filter_hyb_lines(input_fp, test_filter))
+
+    for chunksize in [1000, 3]:
+        output_file = io.BytesIO()
+        results = pipeline.Pipeline() \
+            .add('summary', pipeline.HybridSummary()) \
+            .add('energy-stats', pipeline.EnergyStatistics()) \
+            .add('filtered', pipeline.FilteredLines(test_filter, output_file)) \
+            .run(input_fp, chunksize = chunksize)
+
+        assert output_file.getvalue() == expected
+        assert results['filtered'] == len([line for line in expected.splitlines() if not line.startswith(b'#')])
+        assert results['summary']['hybrid-count'].sum() == len(lines) - 5
+
+
+def test_energy_statistics_missing_energy():
+    '''Test that reads missing an energy are counted, but left out of the energy statistics.'''
+
+    hyb_df = pd.DataFrame({'bit1-description': ['gene1', 'gene1', 'gene1', 'gene2'],
+                           'bit2-description': ['gene2', 'gene2', 'gene2', 'gene2'],
+                           'predicted_binding_energy': [-10.0, np.nan, -20.0, np.nan]})
+
+    energy_statistics = pipeline.EnergyStatistics()
+    energy_statistics.update(hyb_df.iloc[:2])
+    energy_statistics.update(hyb_df.iloc[2:])
+    energy_stats = energy_statistics.result().set_index('hybrid-description')
+
+    assert energy_stats['hybrid-count'].to_dict() == {'gene1:::gene2': 3, 'gene2:::gene2': 1}
+    assert energy_stats.loc['gene1:::gene2', ['energy-mean', 'energy-min', 'energy-max']].tolist() == [-15, -20, -10]
+    assert energy_stats.loc['gene2:::gene2', ['energy-mean', 'energy-min', 'energy-max']].isnull().all()
+
+
+def test_pipeline_duplicate_name():
+    '''Test that adding two analyses with the same name to a pipeline raises a ValueError.'''
+
+    test_pipeline = pipeline.Pipeline().add('counts', pipeline.DescriptionCounts(bit = 1))
+
+    with pytest.raises(ValueError):
+        test_pipeline.add('counts', pipeline.DescriptionCounts(bit = 2))
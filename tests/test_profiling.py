@@ -0,0 +1,56 @@
+"""test_profiling.py: Unit tests for the profiling module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import time
+
+from hybtools import profiling
+
+
+def test_profiler_stages():
+    '''Test that nested stages are timed separately, and that iterated items are counted as rows.'''
+
+    profiler = profiling.Profiler()
+
+    with profiler.stage('count'):
+        for chunk in profiler.iterate([[1, 2], [3]], 'read'):
+            time.sleep(0.01)
+        time.sleep(0.01)
+
+    profile = profiler.to_dict()
+    stages = {stage['stage']: stage for stage in profile['stages']}
+
+    assert sorted(stages) == ['count', 'read']
+    assert stages['read']['rows'] == 3
+    assert stages['read']['wall_seconds'] < 0.01
+    assert stages['count']['wall_seconds'] >= 0.03
+    assert sum(stage['wall_seconds'] for stage in profile['stages']) <= profile['wall_seconds']
+
+
+def test_disabled_profiler():
+    '''Test that stages are not timed without a profiler.'''
+
+    with profiling.stage(None, 'count'):
+        items = profiling.iterate(None, [1, 2], 'read')
+
+    assert items == [1, 2]
@@ -0,0 +1,125 @@
+"""test_sampling.py: Unit tests for the sampling module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import collections
+import numpy as np
+import pandas as pd
+import pytest
+
+from hybtools import hyb_filter, hyb_io, sampling, summarise
+from tests.testutils import get_test_filepath
+
+
+def read_test_lines():
+    with open(get_test_filepath('test_ua_dg.hyb'), 'rb') as input_file:
+        return(input_file.readlines())
+
+
+def test_reservoir_sampler():
+    '''Test that reservoir samples are subsets of the file in file order, and do not depend on the chunksize.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    lines = read_test_lines()
+
+    sampler = sampling.sample_hyb_lines(input_fp, sampling.ReservoirSampler(10, seed = 1), chunksize = 100)
+    sample = sampler.get_lines()
+
+    assert sampler.n_reads == len(lines)
+    assert len(sample) == 10
+    assert sample == [line for line in lines if line in sample]
+
+    assert sampling.sample_hyb_lines(input_fp, sampling.ReservoirSampler(10, seed = 1), chunksize = 7) \
+        .get_lines() == sample
+    assert sampling.sample_hyb_lines(input_fp, sampling.ReservoirSampler(10, seed = 2), chunksize = 7) \
+        .get_lines() != sample
+    assert sampling.sample_hyb_lines(input_fp, sampling.ReservoirSampler(1000)).get_lines() == lines
+
+
+def test_reservoir_sampler_merge():
+    '''Test that merging the samples of the ranges of a file gives the sample of the whole file.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+
+    for per_hybrid in [False, True]:
+        sample = sampling.sample_hyb_lines(input_fp, sampling.ReservoirSampler(3, per_hybrid = per_hybrid)).get_lines()
+
+        samplers = [sampling.sample_hyb_lines(input_fp, sampling.ReservoirSampler(3, per_hybrid = per_hybrid),
+                                              chunksize = 5, start = start, stop = stop)
+                    for start, stop in hyb_io.find_hyb_file_ranges(input_fp, 4)]
+        for sampler in samplers[1:]:
+            samplers[0].merge(sampler)
+
+        assert samplers[0].n_reads == 100
+        assert samplers[0].get_lines() == sample
+
+
+def test_reservoir_sampler_per_hybrid():
+    '''Test that stratified samples keep up to size reads of every hybrid.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    hybrid_counts = summarise.count_hybrids(hyb_io.load_hyb_dataframe(input_fp), unordered = True)
+
+    sampler = sampling.ReservoirSampler(2, per_hybrid = True, unordered = True)
+    sample = sampling.sample_hyb_lines(input_fp, sampler, chunksize = 7).get_lines()
+
+    sample_counts = collections.Counter(min(fields[3] + ':::' + fields[9], fields[9] + ':::' + fields[3])
+                                        for fields in (line.decode().split('\t') for line in sample))
+    assert sample_counts == {hybrid: min(count, 2) for hybrid, count in hybrid_counts.items()}
+
+
+def test_reservoir_sampler_per_hybrid_descriptions():
+    '''Test that stratified samples group reads as count_hybrids does, including prefixed and missing descriptions.'''
+
+    hyb_df = pd.DataFrame({'unique_sequence_id': ['read%d' % i for i in range(5)],
+                           'bit1-description': ['gene1.2', 'gene1', 'gene1', np.nan, 'gene2'],
+                           'bit2-description': ['gene1', 'gene1.2', 'gene2', 'gene1', np.nan]})
+    hybrid_counts = summarise.count_hybrids(hyb_df, unordered = True)
+
+    sampler = sampling.ReservoirSampler(5, per_hybrid = True, unordered = True)
+    sampler.update(hyb_df, [b'line%d' % i for i in range(5)], list(range(5)))
+
+    assert sampler.n_reads == 5
+    assert collections.Counter(sampler.hybrids) == hybrid_counts.to_dict()
+
+
+def test_bernoulli_sampler():
+    '''Test that sampling by fraction keeps about that fraction of the reads, and none or all at the extremes.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb')
+    lines = read_test_lines()
+
+    def sample_fraction(fraction, seed=0):
+        sampler = sampling.BernoulliSampler(fraction, seed = seed)
+        sample = b''.join(hyb_filter.filter_hyb_lines(input_fp, sampler, chunksize = 7))
+        assert sampler.n_reads == len(lines)
+        assert sampler.n_sampled == sample.count(b'\n')
+        return(sample)
+
+    assert 10 < sample_fraction(0.3).count(b'\n') < 50
+    assert sample_fraction(0.3) != sample_fraction(0.3, seed = 1)
+    assert sample_fraction(0) == b''
+    assert sample_fraction(1) == b''.join(lines)
+
+    with pytest.raises(ValueError):
+        sampling.BernoulliSampler(1.5)
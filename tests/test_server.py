@@ -0,0 +1,125 @@
+"""test_server.py: Unit tests for the server and client modules."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+import os
+import shutil
+import stat
+import threading
+import time
+
+import pytest
+
+from hybtools import client, server
+from tests.testutils import get_test_filepath, load_test_file_as_text
+
+
+@pytest.fixture
+def socket_path(tmpdir):
+    '''Run a daemon on a socket in a temporary directory, and stop it after the test.'''
+
+    socket_path = str(tmpdir.join('hybtools.sock'))
+    thread = threading.Thread(target = server.serve, args = (socket_path, 1 << 30))
+    thread.start()
+
+    for _ in range(100):
+        if client.send_request(socket_path, 'status') is not None:
+            break
+        time.sleep(0.05)
+
+    yield socket_path
+
+    client.send_request(socket_path, 'shutdown')
+    thread.join()
+
+
+def test_summarise_with_daemon(socket_path, tmpdir):
+    '''Test that the daemon gives the same summary as summarising locally, and reloads changed files.'''
+
+    input_fp = str(tmpdir.join('test_ua_dg.hyb'))
+    shutil.copy(get_test_filepath('test_ua_dg.hyb'), input_fp)
+    test_data = load_test_file_as_text(get_test_filepath('test_ua_dg.summarise_hyb_file.tab'))
+
+    for _ in range(2):
+        assert client.send_request(socket_path, 'summarise', hyb_filepath = input_fp).decode() == test_data + '\n'
+
+    with open(input_fp, 'r') as f:
+        lines = f.readlines()
+    with open(input_fp, 'w') as f:
+        f.writelines(lines + lines)
+
+    assert client.send_request(socket_path, 'summarise', hyb_filepath = input_fp, top = 1).decode() == \
+        '%s\t%d\n\n' % (test_data.split('\t')[0], 2 * int(test_data.split('\n')[0].split('\t')[1]))
+
+    with pytest.raises(client.ServerError):
+        client.send_request(socket_path, 'summarise', hyb_filepath = str(tmpdir.join('missing.hyb')))
+    with pytest.raises(client.ServerError):
+        client.send_request(socket_path, 'missing')
+
+    with pytest.raises(ValueError):
+        server.serve(socket_path, 1 << 30)
+
+
+def test_send_request_without_daemon(tmpdir):
+    '''Test that requests return None when no daemon is listening.'''
+
+    assert client.send_request(str(tmpdir.join('missing.sock')), 'status') is None
+
+
+def test_socket_of_another_user(tmpdir, monkeypatch):
+    '''Test that a socket belonging to another user is neither connected to nor replaced.'''
+
+    socket_path = str(tmpdir.join('hybtools.sock'))
+    tmpdir.join('hybtools.sock').write('')
+    monkeypatch.setattr(client.os, 'getuid', lambda: os.stat(socket_path).st_uid + 1)
+
+    with pytest.raises(client.ServerError):
+        client.send_request(socket_path, 'status')
+    with pytest.raises(ValueError):
+        server.serve(socket_path, 1 << 30)
+    assert os.path.exists(socket_path)
+
+
+def test_default_socket_directory(tmpdir, monkeypatch):
+    '''Test that the default socket is in $XDG_RUNTIME_DIR, or else in a directory that only the user can open.'''
+
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmpdir))
+    assert client.get_socket_path() == str(tmpdir.join('hybtools.sock'))
+
+    monkeypatch.delenv('XDG_RUNTIME_DIR')
+    monkeypatch.setattr(client.tempfile, 'gettempdir', lambda: str(tmpdir))
+    socket_path = client.get_socket_path()
+    assert os.path.dirname(socket_path) == str(tmpdir.join('hybtools-%d' % os.getuid()))
+
+    thread = threading.Thread(target = server.serve, args = (socket_path, 1 << 30))
+    thread.start()
+    for _ in range(100):
+        if client.send_request(socket_path, 'status') is not None:
+            break
+        time.sleep(0.1)
+    try:
+        assert stat.S_IMODE(os.stat(os.path.dirname(socket_path)).st_mode) == 0o700
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+    finally:
+        client.send_request(socket_path, 'shutdown')
+        thread.join()
@@ -0,0 +1,82 @@
+"""test_sketches.py: Unit tests for the sketches module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from hybtools import sketches
+
+
+def make_batches(n_batches, n_items, seed):
+    '''Make batches of counts of items drawn from a skewed distribution.'''
+    random_state = np.random.RandomState(seed)
+    probabilities = 1.0 / np.arange(1, n_items + 1)
+    probabilities /= probabilities.sum()
+    items = np.array(['item%d' % i for i in range(n_items)], dtype=object)
+    return [pd.Series(items[random_state.choice(n_items, 500, p = probabilities)]).value_counts()
+            for i in range(n_batches)]
+
+
+def check_bounds(sketch, true_counts):
+    '''Check that a sketch brackets the true counts of the items it monitors, and bounds those it does not.'''
+    monitored_true_counts = true_counts.reindex(sketch.table.index).fillna(0).values
+    assert (sketch.table['count'].values >= monitored_true_counts).all()
+    assert (sketch.table['count'].values - sketch.table['error'].values <= monitored_true_counts).all()
+    assert true_counts[~true_counts.index.isin(sketch.table.index)].max() <= sketch.min_count
+
+
+@pytest.mark.parametrize('capacity', [10, 50])
+def test_space_saving(capacity):
+    '''Test that a Space-Saving sketch keeps to its capacity and bounds the true counts.'''
+
+    batches = make_batches(20, 200, seed = 0)
+    true_counts = pd.concat(batches).groupby(level = 0).sum()
+
+    sketch = sketches.SpaceSaving(capacity)
+    for batch in batches:
+        sketch.update(batch)
+
+    assert len(sketch.table) == capacity
+    assert sketch.total == 20 * 500
+    check_bounds(sketch, true_counts)
+    assert true_counts.idxmax() == sketch.table['count'].idxmax()
+
+
+def test_space_saving_merge():
+    '''Test that merging two Space-Saving sketches bounds the true counts of both streams together.'''
+
+    batches = make_batches(20, 200, seed = 1)
+    true_counts = pd.concat(batches).groupby(level = 0).sum()
+
+    sketch = sketches.SpaceSaving(30)
+    other_sketch = sketches.SpaceSaving(30)
+    for batch in batches[:8]:
+        sketch.update(batch)
+    for batch in batches[8:]:
+        other_sketch.update(batch)
+    sketch.merge(other_sketch)
+
+    assert len(sketch.table) == 30
+    assert sketch.total == 20 * 500
+    check_bounds(sketch, true_counts)
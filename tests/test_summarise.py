@@ -21,6 +21,7 @@
 # ______________________________________________________________________________
 
 
+import pandas as pd
 import pytest
 
 from hybtools import summarise
@@ -41,3 +42,148 @@ def test_create_summary_dataframe():
     assert result.equals(test_hyb_df)
 
 
+def test_create_summary_dataframe_from_chunks():
+    '''Test that summarising a hyb dataframe in chunks gives the same result as summarising it all at once.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb_df.pkl.gz')
+    test_fp = get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz')
+
+    hyb_df = load_test_dataframe(input_fp)
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    hyb_df_chunks = (hyb_df.iloc[i:i + 7] for i in range(0, len(hyb_df), 7))
+    result = summarise.create_summary_dataframe_from_chunks(hyb_df_chunks)
+
+    assert result.equals(test_hyb_df)
+
+
+def test_create_summary_matrix():
+    '''Test the create_summary_matrix function.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb_df.pkl.gz')
+    test_fp = get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz')
+
+    hyb_df = load_test_dataframe(input_fp)
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    hybrid_counts_list = [summarise.count_hybrids(hyb_df.iloc[:50]), summarise.count_hybrids(hyb_df.iloc[50:])]
+    result = summarise.create_summary_matrix(hybrid_counts_list, ['first', 'second'])
+
+    assert list(result.columns) == ['hybrid-description', 'first', 'second']
+    assert (result['first'] + result['second']).is_monotonic_decreasing
+    assert result['first'].sum() == 50 and result['second'].sum() == 50
+
+    totals = (result['first'] + result['second']).rename('hybrid-count')
+    assert totals.groupby(result['hybrid-description']).sum().equals(
+        test_hyb_df.set_index('hybrid-description')['hybrid-count'].sort_index())
+
+
+def test_create_summary_dataframe_leaves_input_unchanged():
+    '''Test that create_summary_dataframe does not modify its input, whether or not descriptions are categorical.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb_df.pkl.gz')
+    test_fp = get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz')
+
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    for categorical in [False, True]:
+        hyb_df = load_test_dataframe(input_fp)
+        if categorical:
+            hyb_df = hyb_df.astype({'bit1-description': 'category', 'bit2-description': 'category'})
+        original_hyb_df = hyb_df.copy()
+
+        result = summarise.create_summary_dataframe(hyb_df = hyb_df)
+
+        assert result.equals(test_hyb_df)
+        assert hyb_df.equals(original_hyb_df)
+
+
+def test_create_unordered_summary_dataframe():
+    '''Test the create_summary_dataframe function with hybrids counted regardless of the order of their bits.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb_df.pkl.gz')
+    test_fp = get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz')
+
+    hyb_df = load_test_dataframe(input_fp)
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    result = summarise.create_summary_dataframe(hyb_df = hyb_df, unordered = True, orientations = True)
+
+    assert list(result.columns) == ['hybrid-description', 'hybrid-count', 'hybrid-count-forward',
+                                    'hybrid-count-reverse']
+    assert result['hybrid-count'].sum() == test_hyb_df['hybrid-count'].sum()
+    assert (result['hybrid-count'] == result['hybrid-count-forward'] + result['hybrid-count-reverse']).all()
+
+    ordered_counts = test_hyb_df.set_index('hybrid-description')['hybrid-count']
+    for hybrid_description, forward_count, reverse_count in zip(result['hybrid-description'],
+                                                                result['hybrid-count-forward'],
+                                                                result['hybrid-count-reverse']):
+        bit1_description, bit2_description = hybrid_description.split(':::')
+        assert bit1_description <= bit2_description
+        assert ordered_counts.get(hybrid_description, 0) == forward_count
+        if bit1_description != bit2_description:
+            assert ordered_counts.get(bit2_description + ':::' + bit1_description, 0) == reverse_count
+
+    assert summarise.create_summary_dataframe(hyb_df = hyb_df, unordered = True).equals(result.iloc[:, :2])
+
+
+def test_create_top_summary_dataframe_from_chunks():
+    '''Test that the approximate summary of the top hybrids brackets the true counts.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb_df.pkl.gz')
+    test_fp = get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz')
+
+    hyb_df = load_test_dataframe(input_fp)
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    hyb_df_chunks = (hyb_df.iloc[i:i + 7] for i in range(0, len(hyb_df), 7))
+    result = summarise.create_top_summary_dataframe_from_chunks(hyb_df_chunks, top = 3, capacity = 20)
+
+    assert list(result.columns) == ['hybrid-description', 'hybrid-count', 'hybrid-count-error']
+    assert len(result) == 3
+    assert list(result['hybrid-description'][:2]) == list(test_hyb_df['hybrid-description'][:2])
+
+    true_counts = test_hyb_df.set_index('hybrid-description')['hybrid-count'][result['hybrid-description']].values
+    assert (result['hybrid-count'].values >= true_counts).all()
+    assert (result['hybrid-count'].values - result['hybrid-count-error'].values <= true_counts).all()
+
+
+@pytest.mark.parametrize('level', ['gene', 'biotype'])
+def test_create_summary_dataframe_by_level(level):
+    '''Test that summarising by gene or biotype matches summarising parsed descriptions.'''
+
+    input_fp = get_test_filepath('test_ua_dg.hyb_df.pkl.gz')
+    hyb_df = load_test_dataframe(input_fp)
+
+    field = {'gene': -2, 'biotype': -1}[level]
+    parsed_hyb_df = hyb_df.copy()
+    for column in ['bit1-description', 'bit2-description']:
+        parsed_hyb_df[column] = hyb_df[column].str.split('_').str[field]
+
+    result = summarise.create_summary_dataframe(hyb_df, level = level)
+    chunk_result = summarise.create_summary_dataframe_from_chunks(
+        [hyb_df.iloc[:30].astype({'bit1-description': 'category'}), hyb_df.iloc[30:]], level = level)
+    test_summary_df = summarise.create_summary_dataframe(parsed_hyb_df)
+
+    assert result.equals(test_summary_df)
+    assert chunk_result.equals(test_summary_df)
+
+
+def test_count_hybrids_in_chunks_with_deduplicator():
+    '''Test that unique counts only count the first occurrence of each read sequence.'''
+    from hybtools import dedup
+
+    hyb_df = load_test_dataframe(get_test_filepath('test_ua_dg.hyb_df.pkl.gz'))
+    duplicated_hyb_df = pd.concat([hyb_df, hyb_df.iloc[::3]], ignore_index = True)
+
+    with dedup.ReadDeduplicator() as deduplicator:
+        hybrid_counts = summarise.count_hybrids_in_chunks([duplicated_hyb_df.iloc[:70], duplicated_hyb_df.iloc[70:]],
+                                                          deduplicator = deduplicator)
+
+    summary_df = summarise.summarise_hybrid_counts(hybrid_counts)
+
+    assert list(summary_df.columns) == ['hybrid-description', 'hybrid-count', 'hybrid-count-unique']
+    assert summary_df['hybrid-count'].sum() == len(duplicated_hyb_df)
+    unique_counts = summarise.create_summary_dataframe(hyb_df).set_index('hybrid-description')['hybrid-count']
+    assert (summary_df.set_index('hybrid-description')['hybrid-count-unique'] ==
+            unique_counts.reindex(summary_df['hybrid-description']).values).all()
@@ -0,0 +1,51 @@
+"""test_summary_state.py: Unit tests for the summary_state module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+from hybtools import summary_state
+
+
+def test_fingerprint_hyb_prefix(tmpdir):
+    '''Test that the prefix fingerprint changes with any byte of the prefix, but not with bytes after it.'''
+
+    hyb_fp = str(tmpdir.join('large.hyb'))
+    data = bytearray(b'x' * (1 << 23))
+    with open(hyb_fp, 'wb') as hyb_file:
+        hyb_file.write(data)
+
+    fingerprint = summary_state.fingerprint_hyb_prefix(hyb_fp, 1 << 22)
+
+    data[100000] = ord('y')
+    with open(hyb_fp, 'wb') as hyb_file:
+        hyb_file.write(data)
+
+    assert summary_state.fingerprint_hyb_prefix(hyb_fp, 1 << 22) != fingerprint
+
+    with open(hyb_fp, 'ab') as hyb_file:
+        hyb_file.write(b'appended\n')
+
+    data[100000] = ord('x')
+    with open(hyb_fp, 'r+b') as hyb_file:
+        hyb_file.write(data)
+
+    assert summary_state.fingerprint_hyb_prefix(hyb_fp, 1 << 22) == fingerprint
@@ -0,0 +1,53 @@
+"""test_synthetic.py: Unit tests for the synthetic module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+
+from hybtools import hyb_io, synthetic
+
+
+def test_write_hyb_file(tmpdir):
+    '''Test that a synthetic hyb file can be loaded, and depends only on its size and settings.'''
+
+    hyb_fp = str(tmpdir.join('synthetic.hyb'))
+    synthetic.write_hyb_file(hyb_fp, 1000, chunksize = 300, n_transcripts = 50, seed = 1)
+
+    hyb_df = hyb_io.load_hyb_dataframe(hyb_fp)
+
+    assert len(hyb_df) == 1000
+    assert hyb_df['bit1-description'].nunique() <= 50
+    assert (hyb_df['bit1-read_coordinates_stop'] < hyb_df['read_sequence'].str.len()).all()
+
+    other_hyb_fp = str(tmpdir.join('other.hyb'))
+    synthetic.write_hyb_file(other_hyb_fp, 1000, n_transcripts = 50, seed = 1)
+    with open(hyb_fp) as hyb_file, open(other_hyb_fp) as other_hyb_file:
+        assert hyb_file.read() == other_hyb_file.read()
+
+
+def test_generate_hyb_dataframe_seed():
+    '''Test that different seeds give different hybrids.'''
+
+    hyb_df = synthetic.generate_hyb_dataframe(100, seed = 1)
+    other_hyb_df = synthetic.generate_hyb_dataframe(100, seed = 2)
+
+    assert len(hyb_df) == 100
+    assert not hyb_df['read_sequence'].equals(other_hyb_df['read_sequence'])
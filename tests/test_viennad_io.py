@@ -0,0 +1,75 @@
+"""test_viennad_io.py: Unit tests for the viennad_io module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import gzip
+import pandas as pd
+
+from hybtools import viennad_io
+from tests.testutils import get_test_filepath, load_test_dataframe
+
+
+MATCHING_COLUMNS = ['unique_sequence_id', 'read_sequence', 'predicted_binding_energy',
+                    'bit1-description', 'bit1-read_coordinates_start',
+                    'bit1-transcript_coordinates_start', 'bit1-transcript_coordinates_stop',
+                    'bit2-description', 'bit2-read_coordinates_start',
+                    'bit2-transcript_coordinates_start', 'bit2-transcript_coordinates_stop']
+
+
+def test_is_viennad_filepath():
+    '''Test the detection of viennad files from their extensions.'''
+
+    assert viennad_io.is_viennad_filepath('reads.viennad')
+    assert viennad_io.is_viennad_filepath('reads.vienna.gz')
+    assert not viennad_io.is_viennad_filepath('reads.hyb')
+    assert not viennad_io.is_viennad_filepath('reads.hyb.gz')
+
+
+def test_load_viennad_dataframe():
+    '''Test that loading a viennad file gives the same hybrids as the matching hyb file.'''
+
+    input_fp = get_test_filepath('test_ua_dg.viennad')
+    test_fp = get_test_filepath('test_ua_dg.hyb_df.pkl.gz')
+
+    result = viennad_io.load_viennad_dataframe(input_fp)
+    test_hyb_df = load_test_dataframe(test_fp)
+
+    assert len(result.columns) == 15
+    assert result['bit1-mapping_score'].isnull().all()
+    for column in MATCHING_COLUMNS:
+        assert (result[column].values == test_hyb_df[column].values).all(), column
+
+
+def test_load_viennad_dataframe_in_chunks(tmpdir):
+    '''Test the effect of loading a gzip compressed viennad file a few records at a time.'''
+
+    input_fp = get_test_filepath('test_ua_dg.viennad')
+    gzip_fp = str(tmpdir.join('test_ua_dg.viennad.gz'))
+    with open(input_fp, 'rb') as input_file, gzip.open(gzip_fp, 'wb') as gzip_file:
+        gzip_file.write(input_file.read())
+
+    result = pd.concat(viennad_io.load_viennad_dataframe(gzip_fp, chunksize = 7, compact = True))
+    test_hyb_df = viennad_io.load_viennad_dataframe(input_fp, compact = True)
+
+    assert list(result.index) == list(test_hyb_df.index)
+    for column in MATCHING_COLUMNS:
+        assert (result[column].values == test_hyb_df[column].values).all(), column
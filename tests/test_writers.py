@@ -0,0 +1,74 @@
+"""test_writers.py: Unit tests for the writers module."""
+
+# ______________________________________________________________________________
+#
+#     hybtools
+#     Copyright (C) 2017-2018  Hywel Dunn-Davies
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# ______________________________________________________________________________
+
+
+import pandas as pd
+import pytest
+
+from hybtools import writers
+from tests.testutils import get_test_filepath, load_test_dataframe, load_test_file_as_text
+
+
+@pytest.mark.parametrize('header', [False, True])
+def test_write_tsv(tmpdir, header):
+    '''Test that writing a dataframe as tsv in chunks gives the same output as writing it all at once.'''
+
+    summary_df = load_test_dataframe(get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz'))
+    output_fp = str(tmpdir.join('summary.tsv'))
+
+    writers.write_dataframe(summary_df, output = output_fp, header = header, chunksize = 7)
+
+    assert load_test_file_as_text(output_fp) == summary_df.to_csv(sep = '\t', header = header, index = False) + '\n'
+
+
+def test_write_jsonl(tmpdir):
+    '''Test the effect of writing a dataframe as JSON lines.'''
+
+    summary_df = load_test_dataframe(get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz'))
+    output_fp = str(tmpdir.join('summary.jsonl'))
+
+    writers.write_dataframe(summary_df, output = output_fp, output_format = 'jsonl', chunksize = 7)
+
+    result = pd.read_json(output_fp, lines = True)[summary_df.columns]
+
+    assert result.equals(summary_df)
+
+
+@pytest.mark.parametrize('output_format', ['parquet', 'arrow'])
+def test_write_arrow_formats(tmpdir, output_format):
+    '''Test the effect of writing a dataframe as Parquet or an Arrow IPC stream.'''
+
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+
+    summary_df = load_test_dataframe(get_test_filepath('test_ua_dg.summary_hyb_df.pkl.gz'))
+    output_fp = str(tmpdir.join('summary.' + output_format))
+
+    writers.write_dataframe(summary_df, output = output_fp, output_format = output_format, chunksize = 7)
+
+    if output_format == 'parquet':
+        table = pyarrow.parquet.read_table(output_fp)
+    else:
+        with open(output_fp, 'rb') as f:
+            table = pyarrow.ipc.open_stream(f).read_all()
+
+    assert table.to_pandas().equals(summary_df)
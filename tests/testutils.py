@@ -23,6 +23,8 @@
 
 import os
 import pandas as pd
+import struct
+import zlib
 
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testdata')
@@ -44,6 +46,20 @@ def load_test_dataframe(fp):
     return pd.read_pickle(fp, compression='gzip')
 
 
+def write_bgzf_file(fp, data, block_size=1000):
+    '''Write bytes to a BGZF compressed file, using small blocks so that short test files have several blocks.'''
+    with open(fp, 'wb') as f:
+        for i in range(0, len(data), block_size):
+            block = data[i:i + block_size]
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            deflated = compressor.compress(block) + compressor.flush()
+            f.write(b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00')
+            f.write(struct.pack('<H', len(deflated) + 25))
+            f.write(deflated)
+            f.write(struct.pack('<II', zlib.crc32(block) & 0xffffffff, len(block)))
+        f.write(bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000'))
+
+
 def get_test_data(prefix):
 
     input_fp = get_test_filepath(prefix + '_ua_dg.hyb')